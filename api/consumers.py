@@ -1,10 +1,84 @@
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from core.models import Chat, Message,MessageAttachment
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from core.models import Message, MessageAttachment
+from core.chat_access import get_chat_acl
+from api.core import presence
+from api.core.chat_reads import mark_chat_read
+from api.core.message_timeline import attachment_url_key, message_attachment_urls
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import asyncio
 import base64
+import logging
+import time
 import uuid
 
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = 50
+
+# Decoding, the Cloudinary upload and thumbnailing run here rather than on
+# the thread serving the socket; the pool bounds concurrent uploads per process.
+ATTACHMENT_WORKERS = getattr(settings, 'CHAT_ATTACHMENT_WORKERS', 4)
+_attachment_pool = ThreadPoolExecutor(
+    max_workers=ATTACHMENT_WORKERS, thread_name_prefix='chat-attachment')
+
+
+def _store_attachment(base64_data, message_id):
+    """Decodes and saves one attachment; returns its URL or None on failure."""
+    close_old_connections()
+    try:
+        file_format, encoded = base64_data.split(';base64,')
+        ext = file_format.split('/')[-1]
+        file = ContentFile(base64.b64decode(encoded), name=f"{uuid.uuid4()}.{ext}")
+        attachment = MessageAttachment.objects.create(message_id=message_id, file=file)
+        return attachment.file.url
+    except Exception as e:
+        logger.error(f"Attachment upload failed for message {message_id}: {e}")
+        return None
+    finally:
+        close_old_connections()
+
+
+# At most one typing broadcast per user and chat per window (seconds), and
+# a stopped_typing broadcast once no typing frame arrived for the timeout
+CHAT_TYPING_WINDOW = getattr(settings, 'CHAT_TYPING_WINDOW', 3.0)
+CHAT_TYPING_TIMEOUT = getattr(settings, 'CHAT_TYPING_TIMEOUT', 5.0)
+
+# Inbound frames per connection: sustained rate per second and burst size
+CHAT_FRAME_RATE = getattr(settings, 'CHAT_FRAME_RATE', 5.0)
+CHAT_FRAME_BURST = getattr(settings, 'CHAT_FRAME_BURST', 20)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def _message_id(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
 
 class ChatConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
@@ -15,36 +89,74 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.close()
             return
 
-        self.chat = await self.get_chat(self.chat_slug)
-        if not self.chat or not await self.is_participant(self.chat, self.user):
+        # Cached participants and active flag; no chat or profile rows loaded
+        acl = await self.get_chat_acl(self.chat_slug)
+        if not acl or not acl.active or not acl.allows(self.user):
             await self.close()
             return
+        self.chat_id = acl.chat_id
 
         self.group_name = f'chat_{self.chat_slug}'
+        await sync_to_async(presence.user_connected)(self.user.pk, self.chat_id)
+        self.attachment_tasks = set()
+        self.frame_bucket = TokenBucket(CHAT_FRAME_RATE, CHAT_FRAME_BURST)
+        self.typing_sent_at = None
+        self.typing_stop_task = None
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
-        # Send last 50 messages on connect
-        messages = await self.get_last_messages(self.chat, 50)
+        # Reconnecting clients pass ?since=<last message id> and only get what they missed
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        since = _message_id(query.get('since', [None])[0])
+        messages, has_more = await self.get_messages(self.chat_id, since=since)
         await self.send_json({
             "type": "history",
-            "messages": messages
+            "messages": messages,
+            "has_more": has_more
         })
 
     async def disconnect(self, close_code):
+        if not hasattr(self, 'group_name'):
+            return
+        if self.typing_stop_task:
+            await self.stop_typing()
+        await sync_to_async(presence.user_disconnected)(self.user.pk, self.chat_id)
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def receive_json(self, content):
+        if not self.frame_bucket.take():
+            await self.send_json({'error': 'Rate limit exceeded. Slow down.'})
+            return
+
         action = content.get("type", "message")
 
-        if action == "typing":
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type": "user_typing",
-                    "sender": self.user.username
-                }
-            )
+        if action == "heartbeat":
+            await sync_to_async(presence.heartbeat)(self.user.pk, self.chat_id)
+        elif action == "read":
+            # Read receipt up to a message id (default: everything)
+            up_to = _message_id(content.get("up_to"))
+            state = await database_sync_to_async(mark_chat_read)(
+                self.chat_id, self.chat_slug, self.user.pk, up_to)
+            await self.send_json({
+                "type": "read",
+                "unread_count": state.unread_count if state else 0,
+                "last_read_message_id": state.last_read_message_id if state else None
+            })
+        elif action == "history":
+            # Backfill: the page of older messages before the given id
+            before = _message_id(content.get("before"))
+            if before is None:
+                await self.send_json({'error': 'A numeric "before" message id is required.'})
+                return
+            messages, has_more = await self.get_messages(self.chat_id, before=before)
+            await self.send_json({
+                "type": "history",
+                "before": before,
+                "messages": messages,
+                "has_more": has_more
+            })
+        elif action == "typing":
+            await self.typing()
         elif action == "message":
             message_text = content.get("content", "").strip()
             attachments = content.get("attachments", [])
@@ -53,17 +165,14 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
                 await self.send_json({'error': 'Message content or attachment required.'})
                 return
 
-            # Save message
-            message = await self.save_message(self.chat, self.user, message_text)
+            # Sending ends the typing burst; the new message tells the others
+            await self.reset_typing()
 
-            # Save attachments
-            attachment_urls = []
-            for file_data in attachments:
-                file_url = await self.save_attachment(file_data, message)
-                if file_url:
-                    attachment_urls.append(file_url)
+            # Save message
+            message = await self.save_message(self.chat_id, self.user, message_text)
 
-            # Broadcast to group
+            # Broadcast right away; attachments follow as attachment_ready events
+            pending = {uuid.uuid4().hex: file_data for file_data in attachments}
             await self.channel_layer.group_send(
                 self.group_name,
                 {
@@ -72,10 +181,76 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
                     'sender': self.user.username,
                     'content': message.content,
                     'timestamp': str(message.timestamp),
-                    'attachments': attachment_urls
+                    'attachments': [],
+                    'pending_attachments': list(pending)
                 }
             )
 
+            for placeholder_id, file_data in pending.items():
+                task = asyncio.ensure_future(
+                    self.upload_attachment(placeholder_id, file_data, message.id))
+                self.attachment_tasks.add(task)
+                task.add_done_callback(self.attachment_tasks.discard)
+
+    async def typing(self):
+        now = time.monotonic()
+        if self.typing_sent_at is None or now - self.typing_sent_at >= CHAT_TYPING_WINDOW:
+            self.typing_sent_at = now
+            # Shared across the user's other connections to this chat
+            if await sync_to_async(cache.add)(self.typing_key, 1, CHAT_TYPING_WINDOW):
+                await self.channel_layer.group_send(
+                    self.group_name,
+                    {
+                        "type": "user_typing",
+                        "sender": self.user.username
+                    }
+                )
+
+        if self.typing_stop_task:
+            self.typing_stop_task.cancel()
+        self.typing_stop_task = asyncio.ensure_future(self.typing_timeout())
+
+    async def typing_timeout(self):
+        await asyncio.sleep(CHAT_TYPING_TIMEOUT)
+        self.typing_stop_task = None
+        await self.stop_typing()
+
+    @property
+    def typing_key(self):
+        return f'chat_typing:{self.chat_id}:{self.user.pk}'
+
+    async def reset_typing(self):
+        if self.typing_stop_task:
+            self.typing_stop_task.cancel()
+            self.typing_stop_task = None
+        if self.typing_sent_at is not None:
+            self.typing_sent_at = None
+            await sync_to_async(cache.delete)(self.typing_key)
+
+    async def stop_typing(self):
+        await self.reset_typing()
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                "type": "user_stopped_typing",
+                "sender": self.user.username
+            }
+        )
+
+    async def upload_attachment(self, placeholder_id, file_data, message_id):
+        loop = asyncio.get_running_loop()
+        url = await loop.run_in_executor(_attachment_pool, _store_attachment, file_data, message_id)
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                'type': 'attachment_ready',
+                'message_id': message_id,
+                'placeholder_id': placeholder_id,
+                'url': url,
+                'ok': url is not None
+            }
+        )
+
     async def chat_message(self, event):
         await self.send_json({
             "type": "new_message",
@@ -83,7 +258,17 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             "sender": event["sender"],
             "content": event["content"],
             "timestamp": event["timestamp"],
-            "attachments": event["attachments"]
+            "attachments": event["attachments"],
+            "pending_attachments": event.get("pending_attachments", [])
+        })
+
+    async def attachment_ready(self, event):
+        await self.send_json({
+            "type": "attachment_ready",
+            "message_id": event["message_id"],
+            "placeholder_id": event["placeholder_id"],
+            "url": event["url"],
+            "ok": event["ok"]
         })
 
     async def user_typing(self, event):
@@ -92,52 +277,56 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             "sender": event["sender"]
         })
 
-    # Helpers (DB/Storage)
+    async def user_stopped_typing(self, event):
+        await self.send_json({
+            "type": "stopped_typing",
+            "sender": event["sender"]
+        })
 
-    @database_sync_to_async
-    def get_chat(self, slug):
-        try:
-            return Chat.objects.select_related("client", "freelancer").get(slug=slug, active=True)
-        except Chat.DoesNotExist:
-            return None
+    # Helpers (DB/Storage)
 
     @database_sync_to_async
-    def is_participant(self, chat, user):
-        return chat.client.user == user or chat.freelancer.user == user
+    def get_chat_acl(self, slug):
+        return get_chat_acl(slug=slug)
 
     @database_sync_to_async
-    def save_message(self, chat, user, content):
-        return Message.objects.create(chat=chat, sender=user, content=content)
+    def save_message(self, chat_id, user, content):
+        return Message.objects.create(chat_id=chat_id, sender=user, content=content)
 
-    @database_sync_to_async
-    def get_last_messages(self, chat, limit=50):
-        return [
-            {
-                "message_id": msg.id,
-                "sender": msg.sender.username,
-                "content": msg.content,
-                "timestamp": str(msg.timestamp),
-                "attachments": [att.file.url for att in msg.attachments.all()]
-            }
-            for msg in Message.objects.filter(chat=chat).order_by("-timestamp")[:limit][::-1]
-        ]
+    @staticmethod
+    def serialize_message(msg, urls=None):
+        urls = urls or {}
+        return {
+            "message_id": msg.id,
+            "sender": msg.sender.username,
+            "content": msg.content,
+            "timestamp": str(msg.timestamp),
+            "attachments": [
+                urls.get(attachment_url_key(att.file)) or att.file.url
+                for att in msg.attachments.all() if att.file]
+        }
 
     @database_sync_to_async
-    def save_attachment(self, base64_data, message):
-        try:
-            file_format, encoded = base64_data.split(';base64,')
-            ext = file_format.split('/')[-1]
-            file_name = f"{uuid.uuid4()}.{ext}"
-            file_content = base64.b64decode(encoded)
-
-            from django.core.files.base import ContentFile
-            file = ContentFile(file_content, name=file_name)
+    def get_messages(self, chat, before=None, since=None, limit=HISTORY_PAGE_SIZE):
+        """
+        One page of history, oldest first, plus whether more remain in that
+        direction. Keyed on message id: the newest page by default, the page
+        before ``before``, or the messages after ``since``. Two queries
+        whatever the page size.
+        """
+        messages = Message.objects.filter(chat=chat).select_related(
+            'sender').prefetch_related('attachments')
+        if since is not None:
+            page = list(messages.filter(id__gt=since).order_by('id')[:limit + 1])
+            has_more, page = len(page) > limit, page[:limit]
+        else:
+            if before is not None:
+                messages = messages.filter(id__lt=before)
+            page = list(messages.order_by('-id')[:limit + 1])
+            has_more, page = len(page) > limit, page[:limit][::-1]
 
-            attachment = MessageAttachment.objects.create(
-                message=message, file=file)
-            return attachment.file.url
-        except Exception:
-            return None
+        urls = message_attachment_urls(page)
+        return [self.serialize_message(msg, urls) for msg in page], has_more
 
 
 class NotificationConsumer(AsyncJsonWebsocketConsumer):
@@ -149,13 +338,31 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             self.group_name = f'user_{user.id}'
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            await sync_to_async(presence.user_connected)(user.pk)
 
     async def disconnect(self, close_code):
+        if not hasattr(self, 'group_name'):
+            return
+        await sync_to_async(presence.user_disconnected)(self.scope['user'].pk)
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    async def receive_json(self, content):
+        if content.get('type') == 'heartbeat':
+            await sync_to_async(presence.heartbeat)(self.scope['user'].pk)
+
     async def unread_message(self, event):
         await self.send_json({
             'type': 'unread',
             'chat': event['chat_slug'],
             'unread_count': event['unread_count']
         })
+
+    async def notification(self, event):
+        await self.send_json({
+            'type': 'notification',
+            'id': event['id'],
+            'kind': event['kind'],
+            'message': event['message'],
+            'digest_count': event['digest_count'],
+            'created_at': event['created_at']
+        })
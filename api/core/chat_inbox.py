@@ -0,0 +1,58 @@
+from django.db.models import Case, CharField, Count, F, IntegerField, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+
+from accounts.models import Profile
+from core.models import Chat, ChatParticipantState, Message
+
+INBOX_PAGE_SIZE = 50
+# Most recent message (or chat creation) first; id breaks ties
+INBOX_KEYS = ('last_activity', 'id')
+
+
+def _counterpart(user_id, field):
+    """``field`` of the other participant's profile, as seen by ``user_id``."""
+    return Case(
+        When(client__user_id=user_id, then=F(f'freelancer__{field}')),
+        default=F(f'client__{field}'),
+    )
+
+
+def inbox_queryset(user):
+    """
+    The user's chats annotated with the last visible message, the user's
+    unread count and the other participant, in a single query.
+    """
+    last = Message.objects.filter(chat=OuterRef('pk'), is_deleted=False).order_by('-id')
+    # Rows in ChatParticipantState are created lazily; older chats count directly
+    unread_state = ChatParticipantState.objects.filter(
+        chat=OuterRef('pk'), user_id=user.pk).values('unread_count')[:1]
+    unread_messages = Message.objects.filter(
+        chat=OuterRef('pk'), is_read=False).exclude(sender_id=user.pk).order_by().values(
+        'chat').annotate(total=Count('id')).values('total')
+
+    return Chat.objects.filter(
+        Q(client__user_id=user.pk) | Q(freelancer__user_id=user.pk)
+    ).annotate(
+        job_title=F('job__title'),
+        last_message_id=Subquery(last.values('id')[:1]),
+        last_message_content=Subquery(last.values('content')[:1]),
+        last_message_sender=Subquery(last.values('sender__username')[:1]),
+        last_message_at=Subquery(last.values('timestamp')[:1]),
+        last_activity=Coalesce(Subquery(last.values('timestamp')[:1]), F('created_at')),
+        unread_count=Coalesce(
+            Subquery(unread_state), Subquery(unread_messages), 0, output_field=IntegerField()),
+        counterpart_user_id=_counterpart(user.pk, 'user_id'),
+        counterpart_username=_counterpart(user.pk, 'user__username'),
+        counterpart_profile_pic=Case(
+            When(client__user_id=user.pk, then=F('freelancer__profile_pic')),
+            default=F('client__profile_pic'),
+            output_field=CharField(),
+        ),
+    )
+
+
+def profile_pic_url(value):
+    """Delivery URL for a raw profile_pic column value, as the field would build it."""
+    if not value:
+        return None
+    return Profile._meta.get_field('profile_pic').to_python(value).url
@@ -0,0 +1,23 @@
+from core.models import ChatParticipantState, Notification
+from api.core.dashboard import invalidate_dashboard
+from api.core.realtime import publish_on_commit, unread_event
+
+
+def mark_chat_read(chat_id, chat_slug, user_id, up_to=None):
+    """
+    Read receipt shared by the REST endpoint and the chat socket: marks the
+    other side's messages up to ``up_to`` read, clears the chat's message
+    notifications once nothing is left unread and publishes one
+    unread_message event after commit.
+    Returns the participant's ChatParticipantState, or None for an empty chat.
+    """
+    state = ChatParticipantState.mark_read_up_to(chat_id, user_id, up_to)
+    if state is None:
+        return None
+
+    if state.unread_count == 0:
+        Notification.objects.filter(user_id=user_id, chat_id=chat_id, is_read=False).update(is_read=True)
+    invalidate_dashboard(user_id)
+    unread_count = state.unread_count
+    publish_on_commit(lambda: [unread_event(user_id, chat_slug, unread_count)])
+    return state
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends whose entries live in one process only
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Cached state that other workers have to see: an invalidation or counter
+# kept in one process leaves the rest serving stale data
+SHARED_CACHE_FEATURES = (
+    'dashboard snapshots',
+    'chat access lists',
+    'chat presence counters',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    With a cross-process channel layer the app runs on several workers, so
+    the default cache must be shared between them too.
+    """
+    layer = settings.CHANNEL_LAYERS.get('default', {}).get('BACKEND', '')
+    cache = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if layer.endswith('InMemoryChannelLayer') or cache not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        'The default cache is process-local but the channel layer spans workers.',
+        hint=f"Set CACHE_REDIS_URL; {', '.join(SHARED_CACHE_FEATURES)} rely on a shared cache.",
+        id='api.E001',
+    )]
@@ -0,0 +1,59 @@
+from django.db.models import Count, Q, Sum
+
+from core.models import Job, UserReputation
+from payment.models import Payment
+from payments.models import PaypalPayments
+
+
+def load_client_stats(user_ids):
+    """
+    Batched client figures used by the job serializers, keyed by client user id.
+
+    Runs three grouped queries however many clients are asked for (verified
+    PayPal and Paystack totals, hired counts) plus one UserReputation fetch.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return {}
+
+    paypal_totals = dict(
+        PaypalPayments.objects.filter(
+            user_id__in=user_ids, verified=True, status='completed'
+        ).values('user_id').annotate(total=Sum('amount')).values_list('user_id', 'total')
+    )
+    payment_totals = dict(
+        Payment.objects.filter(
+            user_id__in=user_ids, verified=True
+        ).values('user_id').annotate(total=Sum('amount')).values_list('user_id', 'total')
+    )
+
+    hired = {
+        row['client__user_id']: row
+        for row in Job.objects.filter(client__user_id__in=user_ids).values('client__user_id').annotate(
+            # Jobs with at least one selected freelancer, and all selections across them
+            hired_jobs=Count('id', filter=Q(selected_freelancers__isnull=False), distinct=True),
+            hired_freelancers=Count('selected_freelancers'),
+        )
+    }
+
+    reputations = UserReputation.bulk_for(user_ids)
+
+    stats = {}
+    for user_id in user_ids:
+        hired_row = hired.get(user_id, {})
+        reputation = reputations[user_id]
+        stats[user_id] = {
+            'total_amount_paid': round(
+                (paypal_totals.get(user_id) or 0) + (payment_totals.get(user_id) or 0), 2),
+            'hired_job_count': hired_row.get('hired_jobs', 0),
+            'hired_freelancer_count': hired_row.get('hired_freelancers', 0),
+            'rating': reputation.average_rating,
+            'review_count': reputation.review_count,
+        }
+    return stats
+
+
+def client_stats_context(jobs):
+    """Serializer context entry carrying the batched stats for a page of jobs."""
+    return {'client_stats': load_client_stats(
+        {job.client.user_id for job in jobs if job.client_id})}
@@ -0,0 +1,164 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.contrib.auth import get_user_model
+
+from core.models import Job, JobBookmark, Message, Response as JobResponse
+from payment.models import Payment
+from payments.models import PaypalPayments
+from wallet.models import WalletTransaction
+
+User = get_user_model()
+
+# Signals in api.signals invalidate snapshots; the timeout only bounds
+# staleness from bulk .update() calls that bypass them. Invalidation has to
+# reach every worker, hence the shared-cache check in api.core.checks.
+DASHBOARD_CACHE_TIMEOUT = 300
+
+
+def dashboard_cache_key(user_id):
+    return f'dashboard_summary:{user_id}'
+
+
+def invalidate_dashboard(*user_ids):
+    """Drops cached snapshots now and again once the current transaction commits."""
+    keys = [dashboard_cache_key(user_id) for user_id in set(user_ids) if user_id]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _scalar(queryset, group_by, aggregate, output_field):
+    """
+    One-row scalar subquery aggregating ``queryset``, which must already be
+    filtered to a single ``group_by`` value. Empty sets yield 0.
+    """
+    values = queryset.order_by().values(group_by).annotate(value=aggregate).values('value')[:1]
+    return Coalesce(Subquery(values, output_field=output_field), Value(0), output_field=output_field)
+
+
+def _client_summary(user, profile):
+    jobs = Job.objects.filter(client=profile).aggregate(
+        total=Count('id', distinct=True),
+        open=Count('id', filter=Q(status='open'), distinct=True),
+        in_progress=Count('id', filter=Q(status='in_progress'), distinct=True),
+        completed=Count('id', filter=Q(status='completed'), distinct=True),
+        with_selected=Count('id', filter=Q(selected_freelancers__isnull=False), distinct=True),
+    )
+
+    totals = User.objects.filter(pk=user.pk).annotate(
+        payment_total=_scalar(
+            Payment.objects.filter(user=user, verified=True),
+            'user', Sum('amount'), DecimalField()),
+        paypal_total=_scalar(
+            PaypalPayments.objects.filter(user=user, verified=True, status='completed'),
+            'user', Sum('amount'), DecimalField()),
+        under_review=_scalar(
+            JobResponse.objects.filter(job__client=profile, status='under_review'),
+            'job__client', Count('id'), IntegerField()),
+        unread_count=_scalar(
+            Message.objects.filter(chat__client=profile, is_read=False).exclude(sender=user),
+            'chat__client', Count('id'), IntegerField()),
+    ).values('payment_total', 'paypal_total', 'under_review', 'unread_count').get()
+
+    return {
+        'activity': {
+            'total_jobs_posted': jobs['total'],
+            'jobs_open': jobs['open'],
+            'jobs_in_progress': jobs['in_progress'],
+            'jobs_completed': jobs['completed'],
+            'jobs_with_selected_freelancers': jobs['with_selected'],
+            'responses_under_review': totals['under_review'],
+        },
+        'wallet': {
+            # cast to float only at the very end for JSON
+            'total_spent': float(totals['payment_total'] + totals['paypal_total'])
+        },
+        'messages': {
+            'unread_messages': totals['unread_count']
+        },
+    }
+
+
+def _freelancer_summary(user, profile):
+    responses = JobResponse.objects.filter(user=user).aggregate(
+        applied=Count('id'),
+        accepted=Count('id', filter=Q(status='accepted')),
+        rejected=Count('id', filter=Q(status='rejected')),
+        under_review=Count('id', filter=Q(status='under_review')),
+        submitted=Count('id', filter=Q(status='submitted')),
+    )
+
+    jobs = Job.objects.filter(selected_freelancers=user).aggregate(
+        in_progress=Count('id', filter=Q(status='in_progress'), distinct=True),
+        completed=Count('id', filter=Q(status='completed'), distinct=True),
+    )
+
+    completed = WalletTransaction.objects.filter(user=user, status='completed')
+    totals = User.objects.filter(pk=user.pk).annotate(
+        net=_scalar(completed, 'user', Sum('amount'), DecimalField()),
+        gross=_scalar(completed, 'user', Sum('gross_amount'), DecimalField()),
+        pending=_scalar(
+            WalletTransaction.objects.filter(user=user, status__in=['in_progress', 'pending']),
+            'user', Sum('amount'), DecimalField()),
+        bookmark_count=_scalar(
+            JobBookmark.objects.filter(user=user), 'user', Count('id'), IntegerField()),
+        unread_count=_scalar(
+            Message.objects.filter(chat__freelancer=profile, is_read=False).exclude(sender=user),
+            'chat__freelancer', Count('id'), IntegerField()),
+    ).values('net', 'gross', 'pending', 'bookmark_count', 'unread_count').get()
+
+    return {
+        'activity': {
+            'jobs_applied': responses['applied'],
+            'jobs_accepted': responses['accepted'],
+            'jobs_rejected': responses['rejected'],
+            'jobs_under_review': responses['under_review'],
+            'jobs_submitted': responses['submitted'],
+            'jobs_assigned': jobs['in_progress'],
+            'jobs_completed': jobs['completed'],
+        },
+        'bookmarks': {
+            'bookmarked_jobs': totals['bookmark_count']
+        },
+        'wallet': {
+            'gross_earnings': float(totals['gross']),
+            'net_earnings': float(totals['net']),
+            'pending_earnings': float(totals['pending']),
+        },
+        'messages': {
+            'unread_messages': totals['unread_count']
+        },
+    }
+
+
+def build_dashboard_summary(user, profile):
+    if profile.user_type == 'client':
+        return _client_summary(user, profile)
+    if profile.user_type == 'freelancer':
+        return _freelancer_summary(user, profile)
+
+    unread = Message.objects.filter(
+        chat__freelancer=profile, is_read=False).exclude(sender=user).count()
+    return {'messages': {'unread_messages': unread}}
+
+
+def get_dashboard_summary(user):
+    """
+    Cached snapshot for ``user``, or None if the user has no usable profile.
+    Warm reads do not touch the database.
+    """
+    key = dashboard_cache_key(user.pk)
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    profile = getattr(user, 'profile', None)
+    if not profile or not profile.user_type:
+        return None
+
+    summary = build_dashboard_summary(user, profile)
+    cache.set(key, summary, DASHBOARD_CACHE_TIMEOUT)
+    return summary
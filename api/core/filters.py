@@ -6,11 +6,35 @@ from django.db.models import Q
 from django.utils import timezone
 from django.db.models import Count
 from django_filters import rest_framework as filters
-from core.models import Job, Response as JobResponse
+from rest_framework.filters import OrderingFilter
+from core.models import Job, JobSkillIndex, Response as JobResponse
+from core.search import search_jobs
 from core.choices import EXPERIENCE_LEVEL, JOB_STATUS_CHOICES
 from api.core.jobsmatch import JobMatcher
 
 
+def filter_by_skill_name(queryset, value):
+    """
+    Jobs requiring a skill whose name contains ``value``. The substring test
+    runs against the small skill table; jobs are then reached through the
+    indexed JobSkillIndex rows instead of a DISTINCT join on core_job.
+    """
+    return queryset.filter(id__in=JobSkillIndex.objects.filter(
+        skill__name__icontains=value).values('job_id'))
+
+
+class SearchRankOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that keeps the full-text rank order when a ``q`` search is
+    given and the client did not ask for an explicit ``ordering``.
+    """
+
+    def get_default_ordering(self, view):
+        if view.request.query_params.get('q', '').strip():
+            return ['-search_rank', '-posted_date']
+        return super().get_default_ordering(view)
+
+
 class JobFilter(filters.FilterSet):
     price__gte = filters.NumberFilter(field_name='price', lookup_expr='gte')
     price__lte = filters.NumberFilter(field_name='price', lookup_expr='lte')
@@ -41,6 +65,8 @@ class JobFilter(filters.FilterSet):
 
     skills_required = filters.CharFilter(method='filter_skills_required')
 
+    q = filters.CharFilter(method='filter_search')
+
     # Use ChoiceFilter for status to restrict to JOB_STATUS_CHOICES
     status = filters.ChoiceFilter(
         field_name='status',
@@ -55,7 +81,10 @@ class JobFilter(filters.FilterSet):
         return queryset.annotate(bid_count=Count('responses')).filter(bid_count__lte=value)
 
     def filter_skills_required(self, queryset, name, value):
-        return queryset.filter(skills_required__name__icontains=value).distinct()
+        return filter_by_skill_name(queryset, value)
+
+    def filter_search(self, queryset, name, value):
+        return search_jobs(queryset, value).order_by('-search_rank', '-posted_date')
 
     class Meta:
         model = Job
@@ -64,7 +93,7 @@ class JobFilter(filters.FilterSet):
             'price__gte', 'price__lte',
             'deadline_before', 'deadline_after',
             'posted_before', 'posted_after',
-            'min_bids', 'max_bids', 'skills_required',
+            'min_bids', 'max_bids', 'skills_required', 'q',
         ]
 
 
@@ -84,6 +113,8 @@ class AdvancedJobFilter(filters.FilterSet):
     # Skills required (ManyToMany lookup by skill name)
     skills_required = filters.CharFilter(method='filter_skills_required')
 
+    q = filters.CharFilter(method='filter_search')
+
     def filter_deadline(self, queryset, name, value):
         try:
             cutoff = timezone.now().date() + timedelta(days=int(value))
@@ -100,14 +131,17 @@ class AdvancedJobFilter(filters.FilterSet):
         return queryset.filter(application_count__lte=value)
 
     def filter_skills_required(self, queryset, name, value):
-        return queryset.filter(skills_required__name__icontains=value).distinct()
+        return filter_by_skill_name(queryset, value)
+
+    def filter_search(self, queryset, name, value):
+        return search_jobs(queryset, value).order_by('-search_rank', '-posted_date')
 
     class Meta:
         model = Job
         fields = [
             'category', 'status', 'level',
             'min_price', 'max_price', 'deadline_days',
-            'min_applications', 'max_applications', 'skills_required'
+            'min_applications', 'max_applications', 'skills_required', 'q'
         ]
 
 
@@ -136,6 +170,8 @@ class JobDiscoveryFilter(filters.FilterSet):
     posted_before = filters.DateFilter(field_name='posted_date', lookup_expr='lte')
     posted_after = filters.DateFilter(field_name='posted_date', lookup_expr='gte')
 
+    q = filters.CharFilter(method='filter_search')
+
     class Meta:
         model = Job
         fields = [
@@ -149,7 +185,8 @@ class JobDiscoveryFilter(filters.FilterSet):
             'deadline_before',
             'deadline_after',
             'posted_before',
-            'posted_after'
+            'posted_after',
+            'q',
         ]
 
     def __init__(self, *args, **kwargs):
@@ -180,6 +217,9 @@ class JobDiscoveryFilter(filters.FilterSet):
         skills = [s.strip().lower() for s in value.split(",") if s.strip()]
         return JobMatcher.filter_by_skills(queryset, skills)
 
+    def filter_search(self, queryset, name, value):
+        return search_jobs(queryset, value).order_by('-search_rank', '-posted_date')
+
 
 def get_job_filters(request):
     filters = Q()
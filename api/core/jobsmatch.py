@@ -1,13 +1,14 @@
 from decimal import Decimal
 from datetime import timedelta
 
+from django.db import connection
 from django.db.models import (
-    Q, Count, F, FloatField, ExpressionWrapper, Case, When, Value
+    Q, Count, Max, F, Exists, FloatField, IntegerField, TextField, ExpressionWrapper, Case, When, Value
 )
-from django.db.models.functions import Abs, Cast
+from django.db.models.functions import Abs, Cast, Concat
 from django.utils import timezone
 
-from core.models import Job,JobBookmark
+from core.models import Job, JobBookmark, FreelancerSkillIndex
 from core.choices import EXPERIENCE_LEVEL
 
 
@@ -31,13 +32,9 @@ class JobMatcher:
         if getattr(user.profile, 'user_type', None) != 'freelancer':
             return queryset.none()
 
-        # Normalize freelancer skills
-        freelancer_skills = [
-            s.strip().lower()
-            for s in freelancer_profile.skills.values_list('name', flat=True)
-            if s and s.strip()
-        ]
-        if not freelancer_skills:
+        # Normalized skill ids come from the precomputed index (one PK lookup)
+        freelancer_skill_ids = FreelancerSkillIndex.skill_ids_for(freelancer_profile)
+        if not freelancer_skill_ids:
             return queryset.none()
 
         # Experience mapping
@@ -64,29 +61,25 @@ class JobMatcher:
         idx = levels.index(freelancer_level)
         valid_levels = levels[max(0, idx - 1): min(len(levels), idx + 2)]
 
-        # Build skill filter
-        skill_q = Q()
-        for sk in freelancer_skills:
-            skill_q |= Q(skills_required__name__icontains=sk)
-
-        # try with valid levels only
-        qs = queryset.filter(
+        # Open jobs sharing at least one indexed skill id
+        matched = queryset.filter(
             status="open",
-            preferred_freelancer_level__in=valid_levels
-        ).filter(skill_q).distinct()
-
-        # If no jobs found → fallback to skills only
-        if not qs.exists():
-            qs = queryset.filter(status="open").filter(skill_q).distinct()
-            fallback_mode = True
-        else:
-            fallback_mode = False
+            skill_index__skill_id__in=freelancer_skill_ids
+        )
+
+        # Prefer jobs at valid levels; fall back to skills only when there are none.
+        # Both branches run as one statement instead of exists() + a second query.
+        has_level_match = Exists(
+            matched.filter(preferred_freelancer_level__in=valid_levels).values('pk')
+        )
+        qs = matched.filter(
+            Q(preferred_freelancer_level__in=valid_levels) | ~has_level_match
+        )
 
         # Annotate scoring
         qs = qs.annotate(
-            matching_skills=Count(
-                "skills_required", filter=skill_q, distinct=True),
-            total_skills=Count("skills_required", distinct=True),
+            matching_skills=Count("skill_index", distinct=True),
+            total_skills=Max("skill_index__job_skill_count"),
         ).filter(matching_skills__gte=min_skills).annotate(
             skill_match_ratio=ExpressionWrapper(
                 F("matching_skills") * 1.0 / F("total_skills"),
@@ -95,7 +88,8 @@ class JobMatcher:
             experience_match=Case(
                 When(preferred_freelancer_level=freelancer_level, then=Value(1.0)),
                 When(preferred_freelancer_level__in=valid_levels, then=Value(0.7)),
-                default=Value(0.5 if fallback_mode else 0.0),
+                # Only reachable in fallback mode, where no row is at a valid level
+                default=Value(0.5),
                 output_field=FloatField()
             ),
             hourly_rate_match=ExpressionWrapper(
@@ -117,6 +111,40 @@ class JobMatcher:
         return qs
 
 
+    @staticmethod
+    def rank_by_skill_text(queryset, skill_names):
+        """
+        Orders jobs by how many of the given skill names occur in their
+        title + description, computed in the database so callers can paginate
+        before fetching rows. On PostgreSQL ties are broken by full-text
+        rank; elsewhere by posting date.
+        """
+        skill_names = [name for name in skill_names if name]
+        if not skill_names:
+            return queryset.order_by('-posted_date', '-id')
+
+        queryset = queryset.annotate(
+            search_text=Concat('title', 'description', output_field=TextField()))
+        match_score = sum(
+            (Case(When(search_text__icontains=name, then=Value(1)),
+                  default=Value(0), output_field=IntegerField())
+             for name in skill_names),
+            Value(0),
+        )
+        queryset = queryset.annotate(match_score=match_score)
+
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+            query = SearchQuery(skill_names[0])
+            for name in skill_names[1:]:
+                query |= SearchQuery(name)
+            vector = SearchVector('title', weight='A') + SearchVector('description', weight='B')
+            return queryset.annotate(text_rank=SearchRank(vector, query)).order_by(
+                '-match_score', '-text_rank', '-posted_date', '-id')
+
+        return queryset.order_by('-match_score', '-posted_date', '-id')
+
     @staticmethod
     def get_most_recent(queryset=None, days=7):
         if queryset is None:
@@ -0,0 +1,66 @@
+from django.core.cache import cache
+
+from core.models import Message
+
+TIMELINE_PAGE_SIZE = 50
+TIMELINE_MAX_PAGE_SIZE = 200
+EXPORT_CHUNK_SIZE = 500
+
+# Delivery URLs are derived from the public_id alone, so they never go stale;
+# the timeout only keeps the cache from growing without bound.
+ATTACHMENT_URL_TIMEOUT = 60 * 60 * 24
+
+
+def attachment_url_key(resource):
+    return f'attachment_url:{getattr(resource, "resource_type", "")}:{resource.public_id}'
+
+
+def attachment_urls(attachments):
+    """
+    {attachment_url_key: url} for the files and thumbnails of ``attachments``.
+    Built once per public_id and read back in a single cache round trip.
+    """
+    resources = {}
+    for attachment in attachments:
+        for resource in (attachment.file, attachment.thumbnail):
+            if resource and getattr(resource, 'public_id', None):
+                resources[attachment_url_key(resource)] = resource
+
+    urls = cache.get_many(list(resources))
+    missing = {key: resource.url for key, resource in resources.items() if key not in urls}
+    if missing:
+        cache.set_many(missing, ATTACHMENT_URL_TIMEOUT)
+        urls.update(missing)
+    return urls
+
+
+def message_attachment_urls(messages):
+    return attachment_urls(
+        attachment for message in messages for attachment in message.attachments.all())
+
+
+def timeline_queryset(chat_id):
+    """Visible messages of a chat with sender and attachments in two queries."""
+    return Message.objects.filter(chat_id=chat_id, is_deleted=False).select_related(
+        'sender').prefetch_related('attachments')
+
+
+def timeline_page(chat_id, before=None, limit=TIMELINE_PAGE_SIZE):
+    """
+    The ``limit`` messages before message id ``before`` (newest by default),
+    oldest first, and whether older ones remain.
+    """
+    messages = timeline_queryset(chat_id)
+    if before is not None:
+        messages = messages.filter(id__lt=before)
+    page = list(messages.order_by('-id')[:limit + 1])
+    return page[:limit][::-1], len(page) > limit
+
+
+def timeline_chunk(chat_id, after=0, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Up to ``chunk_size`` messages after message id ``after``, oldest first.
+    Seeking on id keeps each chunk a bounded query with no cursor held open.
+    """
+    return list(timeline_queryset(chat_id).filter(id__gt=after).order_by('id')[:chunk_size])
+
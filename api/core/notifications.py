@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Notification
+from api.core.realtime import publish_on_commit
+
+# Unread notifications of the same kind newer than this collapse into one digest
+NOTIFICATION_DIGEST_WINDOW = getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', timedelta(minutes=15))
+NOTIFICATION_BATCH_SIZE = 500
+
+# template -> (single message, digest message); both formatted with the payload,
+# the digest also with the collapsed ``count``
+NOTIFICATION_TEMPLATES = {
+    'job_completed': (
+        "'{job_title}' has been marked as completed.",
+        "{count} of your jobs have been marked as completed.",
+    ),
+    'payout_completed': (
+        "Your payout from batch {reference} has been sent.",
+        "{count} payouts have been sent to you.",
+    ),
+    'payout_failed': (
+        "Your payout from batch {reference} failed. It will be retried.",
+        "{count} of your payouts failed. They will be retried.",
+    ),
+}
+
+
+def notification_event(notification):
+    """The ``notification`` event handled by the notification consumer."""
+    return f'user_{notification.user_id}', {
+        'type': 'notification',
+        'id': notification.pk,
+        'kind': notification.kind,
+        'message': notification.message,
+        'digest_count': notification.digest_count,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def notify_many(user_ids, template, payload=None, async_run=False):
+    """
+    Notifies every user in ``user_ids`` with ``template`` from
+    NOTIFICATION_TEMPLATES. A user who still has an unread notification of
+    the same kind from within NOTIFICATION_DIGEST_WINDOW gets that one turned
+    into a digest instead of a new row. Rows are written with one select, one
+    bulk_update and batched bulk_creates; one event per user is pushed after
+    commit. With ``async_run`` the work is queued on Django-Q instead.
+    Returns the created or collapsed notifications.
+    """
+    if template not in NOTIFICATION_TEMPLATES:
+        raise ValueError(f"Unknown notification template: {template}")
+    payload = payload or {}
+    user_ids = sorted({user_id for user_id in user_ids if user_id})
+    if not user_ids:
+        return []
+
+    if async_run:
+        from django_q.tasks import async_task
+        async_task('api.core.notifications.notify_many', user_ids, template, payload)
+        return []
+
+    single, digest = NOTIFICATION_TEMPLATES[template]
+    now = timezone.now()
+
+    with transaction.atomic():
+        collapsed = {}
+        for notification in Notification.objects.select_for_update().filter(
+                user_id__in=user_ids, kind=template, is_read=False,
+                created_at__gte=now - NOTIFICATION_DIGEST_WINDOW).order_by('id'):
+            # The newest one per user carries the digest
+            collapsed[notification.user_id] = notification
+
+        for notification in collapsed.values():
+            notification.digest_count += 1
+            notification.message = digest.format(count=notification.digest_count, **payload)
+            notification.created_at = now
+        Notification.objects.bulk_update(
+            collapsed.values(), ['digest_count', 'message', 'created_at'],
+            batch_size=NOTIFICATION_BATCH_SIZE)
+
+        message = single.format(**payload)
+        created = Notification.objects.bulk_create([
+            Notification(user_id=user_id, kind=template, message=message)
+            for user_id in user_ids if user_id not in collapsed
+        ], batch_size=NOTIFICATION_BATCH_SIZE)
+
+        notifications = list(collapsed.values()) + created
+        publish_on_commit(lambda: [notification_event(n) for n in notifications])
+
+    return notifications
@@ -0,0 +1,157 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError as DRFValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Newest first; id breaks ties between jobs posted in the same instant
+JOB_FEED_KEYS = ('posted_date', 'id')
+# Score annotated by JobMatcher.get_best_matches, then newest first
+BEST_MATCH_KEYS = ('combined_score', 'posted_date', 'id')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset ("seek") pagination for infinite-scroll feeds.
+
+    Rows are ordered by ``keys`` (all descending, the last one unique) and
+    each page continues strictly after the last row of the previous one, so
+    page N costs the same as page 1. Cursors are opaque base64 tokens.
+    No COUNT runs unless the client sends ``include_count=1``.
+    """
+    keys = JOB_FEED_KEYS
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'include_count'
+    invalid_cursor_message = 'Invalid cursor'
+    # Orderings the cursor cannot follow: the seek always runs on ``keys``
+    conflicting_query_params = ('q', 'ordering')
+
+    def __init__(self, keys=None):
+        if keys is not None:
+            self.keys = tuple(keys)
+
+    @classmethod
+    def requested(cls, request):
+        """Keyset mode is opt-in: the client sends ``cursor`` (empty for the first page)."""
+        return cls.cursor_query_param in request.query_params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def _key_field(queryset, key):
+        """The model field or annotation output field ordered on by ``key``."""
+        try:
+            if key in queryset.query.annotations:
+                return queryset.query.annotations[key].output_field
+            return queryset.model._meta.get_field(key)
+        except (FieldDoesNotExist, FieldError):
+            return None
+
+    def decode_cursor(self, request, queryset=None):
+        """
+        The cursor's key values, parsed by the fields of ``queryset`` so a
+        tampered cursor is rejected here rather than failing in the query.
+        """
+        token = request.query_params.get(self.cursor_query_param, '')
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        if queryset is not None:
+            try:
+                values = [
+                    field.to_python(value) if field is not None else value
+                    for field, value in zip((self._key_field(queryset, key) for key in self.keys), values)
+                ]
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if any(value is None for value in values):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def seek_filter(self, values):
+        """Rows strictly after ``values`` in descending (keys...) order."""
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            step = Q(**{f'{key}__lt': values[i]})
+            for previous_key, previous_value in zip(self.keys[:i], values[:i]):
+                step &= Q(**{previous_key: previous_value})
+            condition |= step
+        return condition
+
+    @staticmethod
+    def _cursor_value(value):
+        return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        conflicts = [
+            param for param in self.conflicting_query_params
+            if request.query_params.get(param, '').strip()
+        ]
+        if conflicts:
+            raise DRFValidationError({
+                self.cursor_query_param: f"Cannot be combined with {', '.join(conflicts)}; use page instead."})
+
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.count = queryset.count() if request.query_params.get(self.count_query_param) in ('1', 'true') else None
+
+        queryset = queryset.order_by(*[f'-{key}' for key in self.keys])
+        values = self.decode_cursor(request, queryset)
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(values))
+
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        page = rows[:self.page_size_value]
+        self.next_values = (
+            [self._cursor_value(getattr(page[-1], key)) for key in self.keys]
+            if self.has_next else None
+        )
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([('next', self.get_next_link())])
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
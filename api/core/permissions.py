@@ -4,6 +4,7 @@ from rest_framework.permissions import BasePermission
 from rest_framework import permissions
 from accounts.models import Profile
 from core.models import Job, Chat, Response, Review
+from core.chat_access import get_chat_acl
 from django.contrib.auth import get_user_model
 from django.db.models import Q
 
@@ -142,12 +143,14 @@ class IsChatParticipant(permissions.BasePermission):
             self.message = "Access denied: Job payment has not been verified."
             return False
 
+        acl = get_chat_acl(chat_uuid=chat.chat_uuid)
+
         # If user is the job's client
-        if chat.client.user == request.user:
+        if acl and acl.client_user_id == request.user.pk:
             return True
 
         # If user is the selected freelancer
-        if job.selected_freelancer and chat.freelancer and chat.freelancer.user == request.user:
+        if job.selected_freelancer and acl and acl.freelancer_user_id == request.user.pk:
             if job.selected_freelancer != request.user:
                 self.message = "Access denied: You were not the selected freelancer for this job."
                 return False
@@ -0,0 +1,93 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+
+# Sockets send a heartbeat well within this; a connection that vanished
+# without a disconnect stops counting once its keys expire.
+PRESENCE_TTL = 60
+# How long a last-seen timestamp is kept after the user goes offline
+LAST_SEEN_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _online_key(user_id):
+    return f'presence:online:{user_id}'
+
+
+def _last_seen_key(user_id):
+    return f'presence:last_seen:{user_id}'
+
+
+def _viewing_key(chat_id, user_id):
+    return f'presence:viewing:{chat_id}:{user_id}'
+
+
+def _enter(key):
+    """Counts one more live connection under ``key``."""
+    cache.add(key, 0, PRESENCE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, PRESENCE_TTL)
+    cache.touch(key, PRESENCE_TTL)
+
+
+def _leave(key):
+    try:
+        if cache.decr(key) <= 0:
+            cache.delete(key)
+    except ValueError:
+        pass
+
+
+def _seen(user_id):
+    cache.set(_last_seen_key(user_id), time.time(), LAST_SEEN_TIMEOUT)
+
+
+def user_connected(user_id, chat_id=None):
+    """A socket for ``user_id`` opened, viewing ``chat_id`` if given."""
+    _enter(_online_key(user_id))
+    if chat_id is not None:
+        _enter(_viewing_key(chat_id, user_id))
+    _seen(user_id)
+
+
+def user_disconnected(user_id, chat_id=None):
+    _leave(_online_key(user_id))
+    if chat_id is not None:
+        _leave(_viewing_key(chat_id, user_id))
+    _seen(user_id)
+
+
+def heartbeat(user_id, chat_id=None):
+    """Keeps the user's connection counters alive for another PRESENCE_TTL."""
+    cache.touch(_online_key(user_id), PRESENCE_TTL)
+    if chat_id is not None:
+        cache.touch(_viewing_key(chat_id, user_id), PRESENCE_TTL)
+    _seen(user_id)
+
+
+def is_viewing_chat(chat_id, user_id):
+    return bool(cache.get(_viewing_key(chat_id, user_id)))
+
+
+def presence_for(user_ids):
+    """
+    {user_id: {'online': bool, 'last_seen': ISO timestamp or None}} for all
+    ``user_ids`` in a single cache round trip.
+    """
+    user_ids = [user_id for user_id in set(user_ids) if user_id]
+    found = cache.get_many([
+        key for user_id in user_ids for key in (_online_key(user_id), _last_seen_key(user_id))])
+
+    presence = {}
+    for user_id in user_ids:
+        last_seen = found.get(_last_seen_key(user_id))
+        presence[user_id] = {
+            'online': bool(found.get(_online_key(user_id))),
+            'last_seen': (
+                datetime.fromtimestamp(last_seen, tz=dt_timezone.utc).isoformat()
+                if last_seen else None),
+        }
+    return presence
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+async def _send_all(events):
+    channel_layer = get_channel_layer()
+    results = await asyncio.gather(
+        *(channel_layer.group_send(group, event) for group, event in events),
+        return_exceptions=True)
+    for (group, _), result in zip(events, results):
+        if isinstance(result, Exception):
+            logger.error(f"Channel layer send to {group} failed: {result}")
+
+
+def unread_event(user_id, chat_slug, unread_count):
+    """The ``unread_message`` event handled by the notification consumer."""
+    return f'user_{user_id}', {
+        'type': 'unread_message',
+        'chat_slug': chat_slug,
+        'unread_count': unread_count
+    }
+
+
+def publish(events):
+    """Sends ``[(group, event), ...]`` through the channel layer in one batch."""
+    events = list(events)
+    if events:
+        async_to_sync(_send_all)(events)
+
+
+def publish_on_commit(build_events):
+    """
+    Publishes once the current transaction commits, so consumers never see
+    rows that may still roll back. ``build_events`` is called at that point
+    and returns the ``(group, event)`` pairs.
+    """
+    transaction.on_commit(lambda: publish(build_events()))
@@ -10,6 +10,9 @@ from datetime import datetime, time
 from django.utils.text import slugify
 from rest_framework import serializers
 from api.core.utils import validate_file
+from api.core.client_stats import load_client_stats
+from api.core.message_timeline import attachment_url_key
+from api.core.chat_inbox import profile_pic_url
 from payments.models import PaypalPayments
 from django.contrib.auth import get_user_model
 from drf_spectacular.utils import OpenApiExample
@@ -57,7 +60,20 @@ class JobCategorySerializer(serializers.ModelSerializer):
         }
 
 
-class JobSerializer(serializers.ModelSerializer):
+class ClientStatsMixin:
+    """
+    Reads client figures from ``context['client_stats']`` (see
+    api.core.client_stats) and loads them one client at a time otherwise.
+    """
+
+    def get_client_stats(self, user):
+        stats = self.context.setdefault('client_stats', {})
+        if user.id not in stats:
+            stats.update(load_client_stats([user.id]))
+        return stats[user.id]
+
+
+class JobSerializer(ClientStatsMixin, serializers.ModelSerializer):
     client = serializers.SerializerMethodField()
     selected_freelancers = serializers.SerializerMethodField()
 
@@ -149,10 +165,10 @@ class JobSerializer(serializers.ModelSerializer):
         return obj.category.name if obj.category else None
 
     def get_client_rating(self, obj):
-        return round(Review.average_rating_for(obj.client.user), 2)
+        return round(self.get_client_stats(obj.client.user)['rating'], 2)
 
     def get_client_review_count(self, obj):
-        return Review.review_count_for(obj.client.user)
+        return self.get_client_stats(obj.client.user)['review_count']
 
     def get_client_recent_reviews(self, obj):
         recent = Review.recent_reviews_for(obj.client.user, limit=3)
@@ -163,25 +179,7 @@ class JobSerializer(serializers.ModelSerializer):
         user = obj.client.user
 
         if obj.client:
-            # From PaypalPayments (only verified & completed)
-            paypal_total = PaypalPayments.objects.filter(
-                user=user,
-                verified=True,
-                status='completed'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            # From Payment (only verified)
-            payment_total = Payment.objects.filter(
-                user=user,
-                verified=True
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            total_paid = round(paypal_total + payment_total, 2)
-
-            hired_count = Job.objects.filter(
-                client__user=user,
-                selected_freelancers__isnull=False
-            ).distinct().count()
+            stats = self.get_client_stats(user)
 
             return {
                 'id': user.id,
@@ -192,9 +190,9 @@ class JobSerializer(serializers.ModelSerializer):
                 'profile_pic': profile.profile_pic.url if profile.profile_pic else None,
                 'email_verified': user.is_active,
                 'date_joined': user.date_joined,
-                'client_rating': round(Review.average_rating_for(user), 2),
-                'total_amount_paid': total_paid,
-                'total_freelancers_hired': hired_count
+                'client_rating': round(stats['rating'], 2),
+                'total_amount_paid': stats['total_amount_paid'],
+                'total_freelancers_hired': stats['hired_job_count']
             }
         return None
 
@@ -404,7 +402,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['reviewer', 'created_at', 'updated_at']
 
 
-class JobSearchSerializer(serializers.ModelSerializer):
+class JobSearchSerializer(ClientStatsMixin, serializers.ModelSerializer):
     client = serializers.SerializerMethodField()
     category = JobCategorySerializer(read_only=True)
     skills_required = serializers.ListField(
@@ -434,23 +432,7 @@ class JobSearchSerializer(serializers.ModelSerializer):
         if not profile:
             return None
 
-        # Total payments
-        paypal_total = PaypalPayments.objects.filter(
-            user=user, verified=True, status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        payment_total = Payment.objects.filter(
-            user=user, verified=True
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        total_paid = round(paypal_total + payment_total, 2)
-
-        # Count of freelancers hired (selected_freelancers ManyToMany)
-        hired_count = Job.objects.filter(
-            client=profile, selected_freelancers__isnull=False
-        ).distinct().annotate(
-            num_selected=Count('selected_freelancers')
-        ).aggregate(total_hired=Sum('num_selected'))['total_hired'] or 0
+        stats = self.get_client_stats(user)
 
         return {
             'id': user.id,
@@ -461,9 +443,9 @@ class JobSearchSerializer(serializers.ModelSerializer):
             'profile_pic': profile.profile_pic.url if profile.profile_pic else None,
             'email_verified': user.is_active,
             'date_joined': user.date_joined,
-            'client_rating': round(Review.average_rating_for(user), 2),
-            'total_amount_paid': total_paid,
-            'total_freelancers_hired': hired_count
+            'client_rating': round(stats['rating'], 2),
+            'total_amount_paid': stats['total_amount_paid'],
+            'total_freelancers_hired': stats['hired_freelancer_count']
         }
 
 
@@ -536,15 +518,22 @@ class MessageAttachmentSerializer(serializers.ModelSerializer):
             'file_url', 'thumbnail_url'
         ]
 
+    def _url(self, resource):
+        # Timeline views pass the cached URLs of the whole page in the context
+        urls = self.context.get('attachment_urls')
+        if urls and getattr(resource, 'public_id', None):
+            return urls.get(attachment_url_key(resource)) or resource.url
+        return resource.url
+
     def get_file_url(self, obj):
-        return obj.file.url if obj.file else None
+        return self._url(obj.file) if obj.file else None
 
     def get_thumbnail_url(self, obj):
         if obj.thumbnail:
-            return obj.thumbnail.url
+            return self._url(obj.thumbnail)
         # Fallback: if file is an image, use the file itself as preview
         if obj.content_type and obj.content_type.startswith('image/'):
-            return obj.file.url
+            return self._url(obj.file)
         return None
 
     def validate_file(self, value):
@@ -621,10 +610,44 @@ class ChatSerializer(serializers.ModelSerializer):
         )
 
 
+class ChatInboxSerializer(serializers.ModelSerializer):
+    """Reads the annotations of api.core.chat_inbox.inbox_queryset only."""
+    job_title = serializers.CharField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+    last_activity = serializers.DateTimeField(read_only=True)
+    last_message = serializers.SerializerMethodField()
+    counterpart = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Chat
+        fields = ['id', 'chat_uuid', 'slug', 'job', 'job_title', 'active',
+                  'last_message', 'unread_count', 'counterpart', 'last_activity']
+
+    def get_last_message(self, obj):
+        if obj.last_message_id is None:
+            return None
+        return {
+            'id': obj.last_message_id,
+            'content': obj.last_message_content,
+            'sender': obj.last_message_sender,
+            'timestamp': serializers.DateTimeField().to_representation(obj.last_message_at),
+        }
+
+    def get_counterpart(self, obj):
+        if obj.counterpart_user_id is None:
+            return None
+        return {
+            'user_id': obj.counterpart_user_id,
+            'username': obj.counterpart_username,
+            'profile_pic': profile_pic_url(obj.counterpart_profile_pic),
+        }
+
+
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
-        fields = ['id', 'user', 'message', 'created_at', 'is_read', 'chat']
+        fields = ['id', 'user', 'message', 'created_at', 'is_read', 'chat', 'kind', 'digest_count']
+        read_only_fields = ['kind', 'digest_count']
 
 
 class ResponseAttachmentSerializer(serializers.ModelSerializer):
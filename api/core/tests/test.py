@@ -2,10 +2,43 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
-from accounts.models import User, Profile, FreelancerProfile
-from core.models import Job, Response, Chat, Message, MessageAttachment, Review
+from accounts.models import User, Profile, FreelancerProfile, Skill, Language
+from core.models import (
+    Job, JobCategory, Response, Chat, Message, MessageAttachment, Review, JobSkillIndex, UserReputation,
+    JobBookmark, ChatParticipantState, Notification, FreelancerSkillIndex
+)
+from django.core.management import call_command, CommandError
+from io import StringIO
+from unittest.mock import patch, PropertyMock
+from api.core.jobsmatch import JobMatcher
+from core.search import search_jobs
+from api.core.client_stats import load_client_stats
+from payment.models import Payment
+from payments.models import PaypalPayments
+from django.apps import apps
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from decimal import Decimal
+from core.matching import (
+    calculate_match_score, load_job_features, load_freelancer_features,
+    recommend_jobs_to_freelancer, score_matrix)
+from importlib import import_module
+import base64
 import json
+import time
 import os
+from datetime import timedelta
+from django.utils import timezone
+from django.core.cache import cache
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from api.consumers import ChatConsumer
+from channels.db import database_sync_to_async
+from core.chat_access import get_chat_acl
+from api.core import presence
+from api.core.checks import check_shared_cache
+from api.core.notifications import notify_many
 
 
 class APITestBase(APITestCase):
@@ -355,3 +388,1064 @@ class FreelancerRecommendationsViewTest(APITestBase):
         url = reverse('recommendations')
         response = self.client.get(url)
         self.assertEqual(response.status_code, 403)
+
+
+class JobFixturesBase(APITestCase):
+    """
+    Fixtures built through the profile signals, so users get their
+    Profile / FreelancerProfile / ClientProfile the same way as in production.
+    """
+
+    def setUp(self):
+        # Throttle counters live in the cache and would leak between tests
+        cache.clear()
+
+        self.client_user = User.objects.create_user(
+            username='client', password='testpass')
+        self.client_user.profile.user_type = 'client'
+        self.client_user.profile.save()
+
+        self.freelancer_user = User.objects.create_user(
+            username='freelancer', password='testpass')
+        self.freelancer = self.freelancer_user.profile.freelancer_profile
+        self.freelancer.experience_years = 3
+        self.freelancer.save()
+
+        self.category = JobCategory.objects.create(name='web_dev')
+        self.skills = {
+            name: Skill.objects.create(name=name)
+            for name in ['python', 'django', 'java', 'javascript', 'css']
+        }
+
+    def make_job(self, title, skills, level='intermediate', price=100, **extra):
+        extra.setdefault('description', f'{title} description')
+        extra.setdefault('client', self.client_user.profile)
+        job = Job.objects.create(
+            title=title,
+            category=self.category,
+            price=price,
+            deadline_date=timezone.now() + timedelta(days=30),
+            preferred_freelancer_level=level,
+            **extra
+        )
+        job.skills_required.set([self.skills[name] for name in skills])
+        return job
+
+
+class JobMatchIndexTest(JobFixturesBase):
+    def test_job_skill_index_follows_skills_required(self):
+        job = self.make_job('Backend', ['python', 'django'])
+        rows = JobSkillIndex.objects.filter(job=job)
+        self.assertEqual(rows.count(), 2)
+        self.assertTrue(all(r.job_skill_count == 2 for r in rows))
+
+        job.skills_required.remove(self.skills['django'])
+        rows = JobSkillIndex.objects.filter(job=job)
+        self.assertEqual(list(rows.values_list('skill__name', 'job_skill_count')), [('python', 1)])
+
+    def test_best_match_uses_substring_normalized_skill_ids(self):
+        backend = self.make_job('Backend', ['python', 'django'])
+        frontend = self.make_job('Frontend', ['javascript'])
+        self.make_job('Styling', ['css'])
+        self.freelancer.skills.set([self.skills['java'], self.skills['python']])
+
+        matches = list(JobMatcher.get_best_matches(self.freelancer_user, Job.objects.all()))
+        self.assertEqual({j.id for j in matches}, {backend.id, frontend.id})
+        by_id = {j.id: j for j in matches}
+        self.assertEqual(by_id[backend.id].matching_skills, 1)
+        self.assertEqual(by_id[backend.id].total_skills, 2)
+
+        self.freelancer.skills.remove(self.skills['python'])
+        matches = list(JobMatcher.get_best_matches(self.freelancer_user, Job.objects.all()))
+        self.assertEqual([j.id for j in matches], [frontend.id])
+
+    def test_skill_changes_invalidate_only_affected_freelancers(self):
+        other = User.objects.create_user(username='other', password='testpass').profile.freelancer_profile
+        self.freelancer.skills.set([self.skills['java']])
+        other.skills.set([self.skills['css']])
+        for profile in (self.freelancer, other):
+            FreelancerSkillIndex.skill_ids_for(profile)
+
+        # "javafx" widens the java freelancer's matches only
+        javafx = Skill.objects.create(name='javafx')
+        self.assertEqual(list(FreelancerSkillIndex.objects.values_list('pk', flat=True)), [other.pk])
+        self.assertIn(javafx.id, FreelancerSkillIndex.skill_ids_for(self.freelancer))
+
+        # Renaming it away from "java" drops it from that freelancer's set
+        javafx.name = 'kotlin'
+        javafx.save()
+        self.assertEqual(list(FreelancerSkillIndex.objects.values_list('pk', flat=True)), [other.pk])
+        self.assertNotIn(javafx.id, FreelancerSkillIndex.skill_ids_for(self.freelancer))
+
+        # Saving without a rename keeps every row
+        javafx.save()
+        self.assertEqual(FreelancerSkillIndex.objects.count(), 2)
+
+    def test_best_match_falls_back_when_no_job_at_valid_level(self):
+        job = self.make_job('Expert backend', ['python'], level='expert')
+        self.freelancer.experience_years = 0
+        self.freelancer.save()
+        self.freelancer.skills.set([self.skills['python']])
+
+        matches = list(JobMatcher.get_best_matches(self.freelancer_user, Job.objects.all()))
+        self.assertEqual([j.id for j in matches], [job.id])
+        self.assertEqual(matches[0].experience_match, 0.5)
+
+
+class BatchMatchScorerTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        english = Language.objects.create(name='english')
+        swahili = Language.objects.create(name='swahili')
+        self.client_user.profile.client_profile.languages.set([english, swahili])
+
+        self.freelancer.skills.set([self.skills['python'], self.skills['css']])
+        self.freelancer.languages.set([english])
+        self.freelancer.hourly_rate = 90
+        self.freelancer.availability = 'part_time'
+        self.freelancer.save()
+
+        self.jobs = [
+            self.make_job('Backend', ['python', 'django'], level='intermediate', price=100),
+            self.make_job('Frontend', ['css', 'javascript'], level='entry', price=80),
+            self.make_job('Legacy', ['java'], level='expert', price=50),
+            self.make_job('Styling', ['css'], level='advanced', price=120),
+            self.make_job('Fixed rate', ['python'], level='intermediate', price=90),
+        ]
+
+    def test_batch_scores_match_scalar_scores(self):
+        other_user = User.objects.create_user(username='other', password='testpass')
+        other = other_user.profile.freelancer_profile
+        other.experience_years = 8
+        other.availability = 'full_time'
+        other.hourly_rate = 10
+        other.save()
+        other.skills.set([self.skills['java'], self.skills['django']])
+
+        freelancers = FreelancerProfile.objects.filter(pk__in=[self.freelancer.pk, other.pk])
+        jobs = Job.objects.filter(pk__in=[job.pk for job in self.jobs])
+        job_features = load_job_features(jobs)
+        freelancer_features = load_freelancer_features(freelancers)
+        scores = score_matrix(job_features, freelancer_features)
+
+        for row, job_id in enumerate(job_features.ids):
+            for col, freelancer_id in enumerate(freelancer_features.ids):
+                expected = calculate_match_score(
+                    Job.objects.get(pk=job_id), FreelancerProfile.objects.get(pk=freelancer_id))
+                self.assertEqual(scores[row, col], expected)
+
+    def test_recommendations_are_top_k_in_score_order(self):
+        expected = sorted(
+            ((job, calculate_match_score(job, self.freelancer)) for job in self.jobs),
+            key=lambda match: match[1], reverse=True)[:3]
+
+        recommended = recommend_jobs_to_freelancer(self.freelancer, max_recommendations=3)
+        self.assertEqual([(job.id, score) for job, score in recommended],
+                         [(job.id, score) for job, score in expected])
+
+    def test_recommendations_skip_applied_and_full_jobs(self):
+        Response.objects.create(user=self.freelancer_user, job=self.jobs[0])
+        other_user = User.objects.create_user(username='other', password='testpass')
+        Response.objects.create(user=other_user, job=self.jobs[1])
+
+        recommended = recommend_jobs_to_freelancer(self.freelancer, max_recommendations=10)
+        self.assertEqual({job.id for job, _ in recommended},
+                         {job.id for job in self.jobs[2:]})
+
+    def test_recommendation_query_count_is_independent_of_job_count(self):
+        with self.assertNumQueries(7):
+            recommend_jobs_to_freelancer(self.freelancer)
+        for i in range(10):
+            self.make_job(f'Extra {i}', ['python'])
+        with self.assertNumQueries(7):
+            recommend_jobs_to_freelancer(self.freelancer)
+
+
+class JobDiscoveryBestMatchTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.freelancer.skills.set([self.skills['python'], self.skills['django']])
+        self.client.force_authenticate(user=self.freelancer_user)
+
+    def test_best_match_ranks_by_skill_mentions_in_the_database(self):
+        none = self.make_job('Logo design', [])
+        one = self.make_job('Python scripts', [])
+        both = self.make_job('Django site', [], description='A Python and Django backend')
+
+        response = self.client.get(
+            reverse('job-discovery', kwargs={'status_filter': 'best_match'}))
+        self.assertEqual(response.status_code, 200)
+        ids = [job['id'] for job in response.data['results']['jobs']]
+        self.assertEqual(ids, [both.id, one.id, none.id])
+        self.assertEqual(response.data['results']['count'], 3)
+
+    def test_best_match_serializes_only_the_requested_page(self):
+        for i in range(5):
+            self.make_job(f'Python job {i}', [])
+        self.make_job('Unrelated', [])
+
+        response = self.client.get(
+            reverse('job-discovery', kwargs={'status_filter': 'best_match'}),
+            {'page': 2, 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']['jobs']), 2)
+        self.assertEqual(response.data['results']['count'], 6)
+        self.assertEqual(response.data['count'], 6)
+
+
+class JobSearchIndexTest(JobFixturesBase):
+    def test_search_document_follows_job_and_skills(self):
+        job = self.make_job('Backend API', ['python'], description='Internal tooling')
+        self.assertEqual([j.id for j in search_jobs(Job.objects.all(), 'python')], [job.id])
+
+        job.skills_required.set([self.skills['java']])
+        self.assertFalse(search_jobs(Job.objects.all(), 'python').exists())
+
+        job.title = 'Payments service'
+        job.save()
+        self.assertEqual([j.id for j in search_jobs(Job.objects.all(), 'paym')], [job.id])
+        self.assertFalse(search_jobs(Job.objects.all(), 'backend').exists())
+
+        job.delete()
+        self.assertFalse(search_jobs(Job.objects.all(), 'paym').exists())
+
+    def test_search_requires_every_term_and_ranks_title_hits_first(self):
+        in_title = self.make_job('Django developer', [])
+        in_description = self.make_job('Web developer', [], description='Maintain a Django app')
+        self.make_job('Django', [], description='No other term here')
+
+        results = list(search_jobs(Job.objects.all(), 'djan develop').order_by('-search_rank'))
+        self.assertEqual([j.id for j in results], [in_title.id, in_description.id])
+
+    def test_search_endpoint_orders_by_rank(self):
+        in_description = self.make_job('Web developer', [], description='A css heavy site')
+        in_title = self.make_job('CSS cleanup', [])
+
+        response = self.client.get(reverse('job-search'), {'q': 'css'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([j['id'] for j in response.data['results']['results']],
+                         [in_title.id, in_description.id])
+
+    def test_skills_required_filter_uses_skill_index(self):
+        job = self.make_job('Scripts', ['javascript'])
+        self.make_job('Styles', ['css'])
+
+        response = self.client.get(reverse('job-search'), {'skills_required': 'script'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([j['id'] for j in response.data['results']['results']], [job.id])
+
+
+class ClientStatsLoaderTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.other_freelancer = User.objects.create_user(username='other', password='testpass')
+
+    def add_client(self, username):
+        user = User.objects.create_user(username=username, password='testpass')
+        user.profile.user_type = 'client'
+        user.profile.save()
+        return user
+
+    def test_loader_matches_the_per_client_figures(self):
+        hired = self.make_job('Hired', ['python'])
+        hired.selected_freelancers.set([self.freelancer_user, self.other_freelancer])
+        self.make_job('Open', ['css'])
+        Payment.objects.create(user=self.client_user, amount=150, email='c@example.com', job=hired)
+        PaypalPayments.objects.create(
+            user=self.client_user, amount='20.50', email='c@example.com', job=hired,
+            invoice='INV-1', status='completed')
+        Payment.objects.update(verified=True)
+        PaypalPayments.objects.update(verified=True)
+        Review.objects.create(reviewer=self.freelancer_user, recipient=self.client_user, rating=5, comment='Great')
+        Review.objects.create(reviewer=self.other_freelancer, recipient=self.client_user, rating=4, comment='Good')
+
+        stats = load_client_stats([self.client_user.id])[self.client_user.id]
+        self.assertEqual(stats['total_amount_paid'], Decimal('170.50'))
+        self.assertEqual(stats['hired_job_count'], 1)
+        self.assertEqual(stats['hired_freelancer_count'], 2)
+        self.assertEqual(stats['rating'], 4.5)
+        self.assertEqual(stats['review_count'], 2)
+
+    def test_job_list_queries_do_not_grow_with_clients(self):
+        self.make_job('First', ['python'])
+        response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.status_code, 200)
+
+        with CaptureQueriesContext(connection) as one_client:
+            self.client.get(reverse('job-list'))
+
+        for i in range(4):
+            client = self.add_client(f'client{i}')
+            self.make_job(f'Job {i}', ['css'], client=client.profile)
+
+        with CaptureQueriesContext(connection) as many_clients:
+            response = self.client.get(reverse('job-list'))
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(len(many_clients), len(one_client))
+
+
+class UserReputationTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.reviewers = [
+            User.objects.create_user(username=f'reviewer{i}', password='testpass') for i in range(3)]
+
+    def review(self, reviewer, rating):
+        return Review.objects.create(
+            reviewer=reviewer, recipient=self.client_user, rating=rating, comment='ok')
+
+    def assert_matches_rebuild(self):
+        live = UserReputation.objects.get(pk=self.client_user.pk)
+        fields = ['review_count', 'rating_total', 'average_rating', 'histogram', 'recent_review_ids']
+        snapshot = {field: getattr(live, field) for field in fields}
+        rebuilt = UserReputation.rebuild_for_user(self.client_user.pk)
+        self.assertEqual(snapshot, {field: getattr(rebuilt, field) for field in fields})
+
+    def test_signals_keep_summary_in_step_with_reviews(self):
+        first = self.review(self.reviewers[0], 5)
+        second = self.review(self.reviewers[1], 3)
+        self.assertEqual(Review.average_rating_for(self.client_user), 4.0)
+        self.assertEqual(Review.review_count_for(self.client_user), 2)
+        self.assert_matches_rebuild()
+
+        second.rating = 1
+        second.save()
+        reputation = UserReputation.for_user(self.client_user)
+        self.assertEqual(reputation.histogram['1'], 1)
+        self.assertEqual(reputation.histogram['3'], 0)
+        self.assertEqual(reputation.average_rating, 3.0)
+        self.assert_matches_rebuild()
+
+        first.delete()
+        self.assertEqual(Review.average_rating_for(self.client_user), 1.0)
+        self.assertEqual([r.id for r in Review.recent_reviews_for(self.client_user)], [second.id])
+        self.assert_matches_rebuild()
+
+    def test_recent_reviews_are_newest_first(self):
+        reviews = [self.review(reviewer, 4) for reviewer in self.reviewers]
+        recent = list(Review.recent_reviews_for(self.client_user, limit=2))
+        self.assertEqual([r.id for r in recent], [reviews[2].id, reviews[1].id])
+
+    def test_reads_are_primary_key_lookups(self):
+        self.review(self.reviewers[0], 4)
+        with self.assertNumQueries(1):
+            self.assertEqual(Review.average_rating_for(self.client_user), 4.0)
+        with self.assertNumQueries(1):
+            reputations = UserReputation.bulk_for([self.client_user.pk])
+        self.assertEqual(reputations[self.client_user.pk].review_count, 1)
+
+    def test_rebuild_command_repairs_drift(self):
+        self.review(self.reviewers[0], 2)
+        UserReputation.objects.filter(pk=self.client_user.pk).update(review_count=9, average_rating=5.0)
+
+        call_command('rebuild_reputation', stdout=StringIO())
+        reputation = UserReputation.for_user(self.client_user)
+        self.assertEqual((reputation.review_count, reputation.average_rating), (1, 2.0))
+
+    def test_rebuild_retries_when_another_rebuild_inserts_first(self):
+        self.review(self.reviewers[0], 4)
+        UserReputation.objects.all().delete()
+        rebuild = UserReputation._rebuild_locked
+        attempts = []
+
+        def racing(user_id):
+            attempts.append(user_id)
+            if len(attempts) == 1:
+                UserReputation.objects.create(user_id=user_id)
+                raise IntegrityError('UNIQUE constraint failed: core_userreputation.user_id')
+            return rebuild(user_id)
+
+        with patch.object(UserReputation, '_rebuild_locked', side_effect=racing):
+            reputation = UserReputation.rebuild_for_user(self.client_user.pk)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual((reputation.review_count, reputation.average_rating), (1, 4.0))
+
+    def test_migration_backfills_reviews_written_before_the_table(self):
+        self.review(self.reviewers[0], 5)
+        self.review(self.reviewers[1], 2)
+        UserReputation.objects.all().delete()
+
+        import_module('core.migrations.0011_backfill_user_reputation').backfill_reputation(apps, None)
+        self.assert_matches_rebuild()
+        self.assertEqual(UserReputation.objects.get(pk=self.client_user.pk).review_count, 2)
+
+
+class DashboardSummaryCacheTest(JobFixturesBase):
+    def summary(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('dashboard-summary'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['summary']
+
+    def test_client_summary_counts(self):
+        open_job = self.make_job('Open', ['python'])
+        done = self.make_job('Done', ['css'], status='completed')
+        done.selected_freelancers.set([self.freelancer_user])
+        Response.objects.create(user=self.freelancer_user, job=open_job, status='under_review')
+        Payment.objects.create(user=self.client_user, amount=40, email='c@example.com', job=done)
+        Payment.objects.update(verified=True)
+
+        summary = self.summary(self.client_user)
+        self.assertEqual(summary['activity'], {
+            'total_jobs_posted': 2,
+            'jobs_open': 1,
+            'jobs_in_progress': 0,
+            'jobs_completed': 1,
+            'jobs_with_selected_freelancers': 1,
+            'responses_under_review': 1,
+        })
+        self.assertEqual(summary['wallet'], {'total_spent': 40.0})
+        self.assertEqual(summary['messages'], {'unread_messages': 0})
+
+    def test_freelancer_summary_is_cached_until_a_signal_invalidates_it(self):
+        job = self.make_job('Open', ['python'])
+        Response.objects.create(user=self.freelancer_user, job=job)
+        self.client.force_authenticate(user=self.freelancer_user)
+        self.freelancer_user.refresh_from_db()
+
+        with self.assertNumQueries(4):
+            self.client.get(reverse('dashboard-summary'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('dashboard-summary'))
+        self.assertEqual(response.data['summary']['activity']['jobs_applied'], 1)
+        self.assertEqual(response.data['summary']['bookmarks']['bookmarked_jobs'], 0)
+
+        JobBookmark.objects.create(user=self.freelancer_user, job=job)
+        self.assertEqual(self.summary(self.freelancer_user)['bookmarks']['bookmarked_jobs'], 1)
+
+        Response.objects.create(user=self.freelancer_user, job=self.make_job('Another', ['css']))
+        self.assertEqual(self.summary(self.freelancer_user)['activity']['jobs_applied'], 2)
+
+
+    def test_process_local_cache_is_rejected_behind_a_shared_channel_layer(self):
+        redis_layer = {'default': {'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer'}}
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis_cache = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+
+        with self.settings(CHANNEL_LAYERS=redis_layer, CACHES=locmem):
+            errors = check_shared_cache(None)
+            self.assertEqual([e.id for e in errors], ['api.E001'])
+            self.assertIn('chat presence', errors[0].hint)
+            self.assertIn('chat access lists', errors[0].hint)
+        with self.settings(CHANNEL_LAYERS=redis_layer, CACHES=redis_cache):
+            self.assertEqual(check_shared_cache(None), [])
+        self.assertEqual(check_shared_cache(None), [])
+
+class JobListPaginationTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.jobs = [self.make_job(f'Job {i}', ['python']) for i in range(7)]
+
+    def test_page_flags_and_single_count(self):
+        # Push the oldest job onto page 2 of the default page size
+        self.jobs += [self.make_job(f'Job {i}', ['css']) for i in range(7, 11)]
+        bookmarked, applied = self.jobs[-1], self.jobs[-2]
+        JobBookmark.objects.create(user=self.freelancer_user, job=bookmarked)
+        JobBookmark.objects.create(user=self.freelancer_user, job=self.jobs[0])
+        Response.objects.create(user=self.freelancer_user, job=applied, status='submitted')
+        self.client.force_authenticate(user=self.freelancer_user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['job_count'], 11)
+        self.assertEqual(
+            sum(q['sql'].startswith('SELECT COUNT(*) FROM (SELECT DISTINCT "core_job"')
+                for q in ctx.captured_queries), 1)
+
+        flags = {job['id']: (job['bookmarked'], job['application_status'])
+                 for job in response.data['results']}
+        self.assertEqual(flags[bookmarked.id], (True, None))
+        self.assertEqual(flags[applied.id], (False, 'submitted'))
+        self.assertNotIn(self.jobs[0].id, flags)
+
+    def test_keyset_pages_cover_every_job_once(self):
+        expected = list(Job.objects.order_by('-posted_date', '-id').values_list('id', flat=True))
+        seen, params = [], {'cursor': '', 'page_size': 3}
+        while True:
+            response = self.client.get(reverse('job-list'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('job_count', response.data)
+            seen.extend(job['id'] for job in response.data['results'])
+            if not response.data['next']:
+                break
+            params = {'cursor': response.data['next'].split('cursor=')[1].split('&')[0], 'page_size': 3}
+        self.assertEqual(seen, expected)
+
+    def test_keyset_count_on_request_and_bad_cursor(self):
+        response = self.client.get(reverse('job-list'), {'cursor': '', 'include_count': '1'})
+        self.assertEqual(response.data['job_count'], 7)
+        response = self.client.get(reverse('job-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CursorFeedTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.freelancer.skills.set([self.skills['python'], self.skills['django']])
+        self.jobs = [
+            self.make_job(f'Job {i}', ['python'] if i % 2 else ['python', 'java'], price=100 + i)
+            for i in range(9)
+        ]
+        self.client.force_authenticate(user=self.freelancer_user)
+
+    def walk(self, url, **params):
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get(url, {**params, 'cursor': cursor, 'page_size': 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(response.data['results'])
+            if not response.data['next']:
+                return seen
+            cursor = response.data['next'].split('cursor=')[1].split('&')[0]
+
+    def test_best_match_cursor_follows_ranking(self):
+        ranked = list(JobMatcher.get_best_matches(self.freelancer_user, Job.objects.all())
+                      .order_by('-combined_score', '-posted_date', '-id').values_list('id', flat=True))
+        self.assertEqual(len(ranked), 9)
+        seen = self.walk(reverse('job-list'), match_type='best_match')
+        self.assertEqual([job['id'] for job in seen], ranked)
+
+    def test_tampered_cursor_is_not_found(self):
+        for values in (['notadate', 'x'], ['2024-01-01T00:00:00+00:00', 'x'], [None, 1], 'junk'):
+            token = base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+            response = self.client.get(reverse('job-list'), {'cursor': token})
+            self.assertEqual(response.status_code, 404, values)
+        response = self.client.get(reverse('job-list'), {'cursor': 'not base64 json'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_refuses_other_orderings(self):
+        for params in ({'q': 'python'}, {'ordering': 'price'}):
+            response = self.client.get(reverse('job-list'), {**params, 'cursor': ''})
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('cursor', response.data)
+        self.assertEqual(self.client.get(reverse('job-list'), {'q': 'python'}).status_code, 200)
+
+    def test_bookmarks_and_applied_cursor_modes(self):
+        for job in self.jobs[:5]:
+            JobBookmark.objects.create(user=self.freelancer_user, job=job)
+        for job in self.jobs[3:8]:
+            Response.objects.create(user=self.freelancer_user, job=job, status='submitted')
+
+        bookmarks = self.walk(reverse('bookmark-list'))
+        self.assertEqual(len(bookmarks), 5)
+        self.assertEqual(
+            [b['id'] for b in bookmarks],
+            list(JobBookmark.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+        applied = self.walk(reverse('applied-jobs'))
+        self.assertEqual([job['id'] for job in applied], [job.id for job in reversed(self.jobs[3:8])])
+        self.assertTrue(all(job['application_status'] == 'submitted' for job in applied))
+
+        # Without a cursor the endpoint keeps its plain list response
+        response = self.client.get(reverse('applied-jobs'))
+        self.assertEqual(len(response.data), 5)
+
+
+class ChatUnreadStateTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.chat = Chat.objects.create(
+            job=self.make_job('Chat job', ['python']),
+            client=self.client_user.profile,
+            freelancer=self.freelancer_user.profile,
+        )
+
+    def state(self, user):
+        return ChatParticipantState.objects.get(chat=self.chat, user=user)
+
+    def test_counters_follow_sends_and_reads(self):
+        for text in ('one', 'two'):
+            Message.objects.create(chat=self.chat, sender=self.freelancer_user, content=text)
+        Message.objects.create(chat=self.chat, sender=self.client_user, content='reply')
+
+        self.assertEqual(self.state(self.client_user).unread_count, 2)
+        self.assertEqual(self.state(self.freelancer_user).unread_count, 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(ChatParticipantState.unread_for(self.chat, self.client_user.pk), 2)
+
+        self.client.force_authenticate(user=self.client_user)
+        response = self.client.get(
+            reverse('message-list-by-chat', kwargs={'chat_uuid': self.chat.chat_uuid}))
+        self.assertEqual(response.status_code, 200)
+        # Fetching the history is not reading it
+        self.assertEqual(self.state(self.client_user).unread_count, 2)
+
+        response = self.client.post(
+            reverse('message-mark-read', kwargs={'chat_uuid': self.chat.chat_uuid}))
+        self.assertEqual(response.status_code, 200)
+
+        state = self.state(self.client_user)
+        self.assertEqual(state.unread_count, 0)
+        self.assertEqual(state.last_read_message_id, self.chat.messages.latest('id').id)
+        self.assertFalse(self.chat.messages.filter(sender=self.freelancer_user, is_read=False).exists())
+        self.assertEqual(self.chat.get_unread_count(self.freelancer_user), 1)
+
+    def test_missing_state_rows_are_rebuilt(self):
+        Message.objects.create(chat=self.chat, sender=self.freelancer_user, content='before')
+        ChatParticipantState.objects.all().delete()
+        Message.objects.create(chat=self.chat, sender=self.freelancer_user, content='after')
+        self.assertEqual(self.state(self.client_user).unread_count, 2)
+
+    def test_events_are_published_once_after_commit(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'user_{self.client_user.pk}', channel)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Message.objects.create(chat=self.chat, sender=self.freelancer_user, content='hi')
+        # Nothing reaches the layer before commit
+        self.assertNotIn(channel, layer.channels)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(layer.channels[channel].qsize(), 1)
+
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event, {
+            'type': 'unread_message', 'chat_slug': self.chat.slug, 'unread_count': 1})
+
+    def test_load_test_refuses_the_in_process_layer(self):
+        with self.assertRaises(CommandError):
+            call_command('channel_layer_loadtest', stdout=StringIO())
+
+
+class ChatConsumerHistoryTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.chat = Chat.objects.create(
+            job=self.make_job('Chat job', ['python']),
+            client=self.client_user.profile,
+            freelancer=self.freelancer_user.profile,
+            active=True,
+        )
+        self.messages = [
+            Message.objects.create(
+                chat=self.chat, sender=(self.client_user, self.freelancer_user)[i % 2], content=f'm{i}')
+            for i in range(7)
+        ]
+
+    async def connect(self, query=''):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.chat.slug}/{query}')
+        communicator.scope['user'] = self.client_user
+        communicator.scope['url_route'] = {'kwargs': {'slug': self.chat.slug}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def ids(self, payload):
+        return [message['message_id'] for message in payload['messages']]
+
+    async def test_history_pages_and_reconnect(self):
+        ids = [message.id for message in self.messages]
+
+        communicator = await self.connect()
+        first = await communicator.receive_json_from()
+        self.assertEqual(self.ids(first), ids)
+        self.assertFalse(first['has_more'])
+
+        await communicator.send_json_to({'type': 'history', 'before': ids[3]})
+        older = await communicator.receive_json_from()
+        self.assertEqual((older['before'], self.ids(older)), (ids[3], ids[:3]))
+        self.assertFalse(older['has_more'])
+        await communicator.disconnect()
+
+        communicator = await self.connect(f'?since={ids[4]}')
+        missed = await communicator.receive_json_from()
+        self.assertEqual(self.ids(missed), ids[5:])
+        await communicator.disconnect()
+
+    def test_history_query_count_is_flat(self):
+        consumer = ChatConsumer()
+        with self.assertNumQueries(2):
+            page, has_more = async_to_sync(consumer.get_messages)(self.chat, limit=4)
+        self.assertEqual([m['message_id'] for m in page], [m.id for m in self.messages[-4:]])
+        self.assertTrue(has_more)
+        self.assertEqual(page[-1]['sender'], self.client_user.username)
+
+    async def test_attachments_upload_concurrently_after_the_broadcast(self):
+        def slow_store(data, message_id):
+            time.sleep(0.2)
+            return f'https://files.example.com/{data}'
+
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        with patch('api.consumers._store_attachment', side_effect=slow_store):
+            started = time.monotonic()
+            await communicator.send_json_to({
+                'type': 'message', 'content': 'files', 'attachments': ['a', 'b', 'c', 'd']})
+            message = await communicator.receive_json_from()
+            self.assertLess(time.monotonic() - started, 0.2)
+            self.assertEqual(message['attachments'], [])
+            self.assertEqual(len(message['pending_attachments']), 4)
+
+            ready = [await communicator.receive_json_from(timeout=2) for _ in range(4)]
+        # Four workers: one round of uploads rather than four serial ones
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual({event['type'] for event in ready}, {'attachment_ready'})
+        self.assertEqual(
+            {event['placeholder_id'] for event in ready}, set(message['pending_attachments']))
+        self.assertEqual(
+            sorted(event['url'] for event in ready),
+            [f'https://files.example.com/{name}' for name in 'abcd'])
+        await communicator.disconnect()
+
+    async def test_typing_is_coalesced_and_stops_after_a_timeout(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        with patch('api.consumers.CHAT_TYPING_WINDOW', 10), patch('api.consumers.CHAT_TYPING_TIMEOUT', 0.2):
+            for _ in range(8):
+                await communicator.send_json_to({'type': 'typing'})
+            self.assertEqual(await communicator.receive_json_from(),
+                             {'type': 'typing', 'sender': self.client_user.username})
+            self.assertEqual(await communicator.receive_json_from(timeout=1),
+                             {'type': 'stopped_typing', 'sender': self.client_user.username})
+            self.assertTrue(await communicator.receive_nothing(0.3))
+
+            # A new burst after the stop is announced again
+            await communicator.send_json_to({'type': 'typing'})
+            self.assertEqual((await communicator.receive_json_from())['type'], 'typing')
+        await communicator.disconnect()
+
+    async def test_inbound_frames_are_rate_limited(self):
+        with patch('api.consumers.CHAT_FRAME_BURST', 3), patch('api.consumers.CHAT_FRAME_RATE', 0):
+            communicator = await self.connect()
+            await communicator.receive_json_from()
+            for _ in range(3):
+                await communicator.send_json_to({'type': 'history', 'before': self.messages[0].id})
+                self.assertEqual((await communicator.receive_json_from())['type'], 'history')
+            await communicator.send_json_to({'type': 'history', 'before': self.messages[0].id})
+            self.assertIn('error', await communicator.receive_json_from())
+        await communicator.disconnect()
+
+
+class ChatACLCacheTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job('Chat job', ['python'])
+        self.job.selected_freelancers.add(self.freelancer_user)
+        self.chat = Chat.objects.get(job=self.job, freelancer=self.freelancer_user.profile)
+
+    def test_lookup_is_cached_under_slug_and_uuid(self):
+        acl = get_chat_acl(slug=self.chat.slug)
+        self.assertEqual(
+            (acl.client_user_id, acl.freelancer_user_id, acl.active),
+            (self.client_user.pk, self.freelancer_user.pk, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_chat_acl(chat_uuid=str(self.chat.chat_uuid)), acl)
+            self.assertEqual(get_chat_acl(chat_uuid=self.chat.chat_uuid.hex), acl)
+        self.assertIsNone(get_chat_acl(chat_uuid='not-a-uuid'))
+        self.assertFalse(acl.allows(User.objects.create_user(username='other', password='x')))
+
+    def test_signals_invalidate(self):
+        self.assertFalse(get_chat_acl(slug=self.chat.slug).active)
+
+        # activate_chats_on_payment
+        self.job.payment_verified = True
+        self.job.save()
+        self.assertTrue(get_chat_acl(slug=self.chat.slug).active)
+
+        # handle_selected_freelancers, on a job whose payment is not verified
+        job = self.make_job('Unpaid', ['css'])
+        job.selected_freelancers.add(self.freelancer_user)
+        chat = Chat.objects.get(job=job)
+        self.assertFalse(get_chat_acl(chat_uuid=chat.chat_uuid).active)
+        chat.active = True
+        chat.save()
+        self.assertTrue(get_chat_acl(chat_uuid=chat.chat_uuid).active)
+        job.selected_freelancers.remove(self.freelancer_user)
+        self.assertFalse(get_chat_acl(chat_uuid=chat.chat_uuid).active)
+
+    def test_rest_access_uses_the_acl(self):
+        other = User.objects.create_user(username='other', password='x')
+        url = reverse('message-list-by-chat', kwargs={'chat_uuid': self.chat.chat_uuid})
+
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(user=self.freelancer_user)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    async def test_consumer_connects_without_a_freelancer(self):
+        chat = await database_sync_to_async(Chat.objects.create)(
+            job=self.job, client=self.client_user.profile, active=True)
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{chat.slug}/')
+        communicator.scope['user'] = self.client_user
+        communicator.scope['url_route'] = {'kwargs': {'slug': chat.slug}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.chat.slug}/')
+        communicator.scope['user'] = self.freelancer_user
+        communicator.scope['url_route'] = {'kwargs': {'slug': self.chat.slug}}
+        connected, _ = await communicator.connect()
+        # Payment not verified yet, so the chat is inactive
+        self.assertFalse(connected)
+
+
+class PresenceTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.chat = Chat.objects.create(
+            job=self.make_job('Chat job', ['python']),
+            client=self.client_user.profile,
+            freelancer=self.freelancer_user.profile,
+            active=True,
+        )
+
+    def test_connection_counting_and_bulk_query(self):
+        presence.user_connected(self.client_user.pk, self.chat.pk)
+        presence.user_connected(self.client_user.pk)
+        presence.user_disconnected(self.client_user.pk, self.chat.pk)
+
+        states = presence.presence_for([self.client_user.pk, self.freelancer_user.pk])
+        self.assertTrue(states[self.client_user.pk]['online'])
+        self.assertIsNotNone(states[self.client_user.pk]['last_seen'])
+        self.assertFalse(presence.is_viewing_chat(self.chat.pk, self.client_user.pk))
+        self.assertEqual(states[self.freelancer_user.pk], {'online': False, 'last_seen': None})
+
+        presence.user_disconnected(self.client_user.pk)
+        self.assertFalse(presence.presence_for([self.client_user.pk])[self.client_user.pk]['online'])
+
+    def test_unread_push_skipped_for_viewers(self):
+        presence.user_connected(self.client_user.pk, self.chat.pk)
+        with patch('api.core.realtime.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(chat=self.chat, sender=self.freelancer_user, content='seen live')
+        groups = [group for group, _ in publish.call_args.args[0]]
+        self.assertEqual(groups, [f'chat_{self.chat.slug}'])
+
+        presence.user_disconnected(self.client_user.pk, self.chat.pk)
+        with patch('api.core.realtime.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(chat=self.chat, sender=self.freelancer_user, content='away')
+        groups = [group for group, _ in publish.call_args.args[0]]
+        self.assertEqual(groups, [f'chat_{self.chat.slug}', f'user_{self.client_user.pk}'])
+
+    def test_presence_endpoint_reports_counterparts(self):
+        presence.user_connected(self.freelancer_user.pk)
+        self.client.force_authenticate(user=self.client_user)
+        response = self.client.get(reverse('chat-presence'), {'chat': str(self.chat.chat_uuid)})
+        self.assertEqual(response.status_code, 200)
+        entry = response.data[str(self.chat.chat_uuid)]
+        self.assertEqual((entry['user_id'], entry['online']), (self.freelancer_user.pk, True))
+
+        response = self.client.get(reverse('chat-presence'), {'chat': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_consumer_marks_the_chat_as_viewed(self):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.chat.slug}/')
+        communicator.scope['user'] = self.client_user
+        communicator.scope['url_route'] = {'kwargs': {'slug': self.chat.slug}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertTrue(presence.is_viewing_chat(self.chat.pk, self.client_user.pk))
+        await communicator.disconnect()
+        self.assertFalse(presence.is_viewing_chat(self.chat.pk, self.client_user.pk))
+
+
+class MarkReadUpToTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.chat = Chat.objects.create(
+            job=self.make_job('Chat job', ['python']),
+            client=self.client_user.profile,
+            freelancer=self.freelancer_user.profile,
+            active=True,
+        )
+        self.incoming = [
+            Message.objects.create(chat=self.chat, sender=self.freelancer_user, content=f'in {i}')
+            for i in range(5)
+        ]
+        Message.objects.create(chat=self.chat, sender=self.client_user, content='out')
+
+    def test_single_update_and_forward_only_watermark(self):
+        with CaptureQueriesContext(connection) as ctx:
+            state = ChatParticipantState.mark_read_up_to(
+                self.chat.pk, self.client_user.pk, self.incoming[2].id)
+        self.assertEqual(
+            sum(q['sql'].startswith('UPDATE "core_message"') for q in ctx.captured_queries), 1)
+        self.assertEqual((state.unread_count, state.last_read_message_id), (2, self.incoming[2].id))
+        self.assertEqual(
+            list(self.chat.messages.filter(sender=self.freelancer_user, is_read=False)), self.incoming[3:])
+
+        # Older receipts arriving late do not move the watermark back
+        state = ChatParticipantState.mark_read_up_to(self.chat.pk, self.client_user.pk, self.incoming[0].id)
+        self.assertEqual((state.unread_count, state.last_read_message_id), (2, self.incoming[2].id))
+
+    def test_rest_endpoint_publishes_one_event(self):
+        self.client.force_authenticate(user=self.client_user)
+        url = reverse('message-mark-read', kwargs={'chat_uuid': self.chat.chat_uuid})
+        with patch('api.core.realtime.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'up_to': self.incoming[3].id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unread_count'], 1)
+        publish.assert_called_once_with(
+            [(f'user_{self.client_user.pk}',
+              {'type': 'unread_message', 'chat_slug': self.chat.slug, 'unread_count': 1})])
+
+        response = self.client.post(url, {'up_to': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_socket_read_frame(self):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.chat.slug}/')
+        communicator.scope['user'] = self.client_user
+        communicator.scope['url_route'] = {'kwargs': {'slug': self.chat.slug}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()
+
+        await communicator.send_json_to({'type': 'read'})
+        receipt = await communicator.receive_json_from()
+        self.assertEqual(receipt['type'], 'read')
+        self.assertEqual(receipt['unread_count'], 0)
+        await communicator.disconnect()
+
+
+class MessageTimelineTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.chat = Chat.objects.create(
+            job=self.make_job('Chat job', ['python']),
+            client=self.client_user.profile,
+            freelancer=self.freelancer_user.profile,
+            active=True,
+        )
+        self.messages = [
+            Message.objects.create(
+                chat=self.chat, sender=(self.client_user, self.freelancer_user)[i % 2], content=f'm{i}')
+            for i in range(7)
+        ]
+        for message in self.messages[-3:]:
+            MessageAttachment.objects.create(
+                message=message, file='freelance/chat_attachments/brief.pdf', filename='brief.pdf',
+                file_size=1, content_type='application/pdf')
+        self.client.force_authenticate(user=self.client_user)
+        self.url = reverse('message-list-by-chat', kwargs={'chat_uuid': self.chat.chat_uuid})
+
+    def url_patch(self):
+        return patch('cloudinary.CloudinaryResource.url', new_callable=PropertyMock,
+                     return_value='https://res.example.com/brief.pdf')
+
+    def test_keyset_pages_in_fixed_queries(self):
+        ids = [message.id for message in self.messages]
+        with self.url_patch() as url:
+            response = self.client.get(self.url, {'limit': 3})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([m['id'] for m in response.data['results']], ids[-3:])
+            self.assertTrue(response.data['has_more'])
+            self.assertEqual(response.data['next_before'], ids[-3])
+            # Same public_id on every attachment: built once, then read from the cache
+            self.assertEqual(url.call_count, 1)
+            self.assertEqual(
+                response.data['results'][0]['attachments'][0]['file_url'], 'https://res.example.com/brief.pdf')
+
+            with CaptureQueriesContext(connection) as small:
+                self.client.get(self.url, {'before': ids[-3], 'limit': 2})
+            with CaptureQueriesContext(connection) as large:
+                response = self.client.get(self.url, {'before': ids[-3], 'limit': 4})
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual([m['id'] for m in response.data['results']], ids[:4])
+        self.assertFalse(response.data['has_more'])
+        self.assertIsNone(response.data['next_before'])
+
+        self.assertEqual(self.client.get(self.url, {'before': 'x'}).status_code, 400)
+
+    def test_export_streams_json_lines(self):
+        with self.url_patch():
+            response = self.client.get(
+                reverse('message-export', kwargs={'chat_uuid': self.chat.chat_uuid}))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+
+            async def body():
+                return b''.join([part async for part in response.streaming_content])
+            lines = async_to_sync(body)().decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [m.id for m in self.messages])
+
+        # Several chunks, each sent as its own part of the stream
+        with patch('api.core.views.EXPORT_CHUNK_SIZE', 3), self.url_patch():
+            response = self.client.get(
+                reverse('message-export', kwargs={'chat_uuid': self.chat.chat_uuid}))
+
+            async def parts():
+                return [part async for part in response.streaming_content]
+            self.assertEqual([part.count(b'\n') for part in async_to_sync(parts)()], [3, 3, 1])
+
+
+class ChatInboxTest(JobFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.chats = [
+            Chat.objects.create(
+                job=self.make_job(f'Inbox job {i}', ['python']),
+                client=self.client_user.profile,
+                freelancer=self.freelancer_user.profile,
+                active=True,
+            )
+            for i in range(3)
+        ]
+        # Chat 1 is the most recently active, chat 2 never had a message
+        Message.objects.create(chat=self.chats[1], sender=self.freelancer_user, content='older')
+        Message.objects.create(chat=self.chats[0], sender=self.freelancer_user, content='first')
+        Message.objects.create(chat=self.chats[0], sender=self.freelancer_user, content='second')
+        Message.objects.create(chat=self.chats[1], sender=self.client_user, content='latest')
+        self.client.force_authenticate(user=self.client_user)
+
+    def test_inbox_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('chat-inbox'))
+        self.assertEqual(response.status_code, 200)
+        chat_queries = [q for q in ctx.captured_queries if 'FROM "core_chat"' in q['sql']]
+        self.assertEqual(len(chat_queries), 1)
+
+        results = response.data['results']
+        self.assertEqual([r['id'] for r in results], [self.chats[1].id, self.chats[0].id, self.chats[2].id])
+        self.assertEqual(results[0]['last_message']['content'], 'latest')
+        self.assertEqual(results[0]['last_message']['sender'], self.client_user.username)
+        self.assertEqual([r['unread_count'] for r in results], [1, 2, 0])
+        self.assertIsNone(results[2]['last_message'])
+        self.assertEqual(results[0]['counterpart']['user_id'], self.freelancer_user.pk)
+
+    def test_inbox_keyset_pages(self):
+        first = self.client.get(reverse('chat-inbox'), {'page_size': 2})
+        self.assertEqual(len(first.data['results']), 2)
+        second = self.client.get(first.data['next'])
+        self.assertEqual([r['id'] for r in second.data['results']], [self.chats[2].id])
+        self.assertIsNone(second.data['next'])
+
+
+class NotifyManyTest(JobFixturesBase):
+    def test_bulk_insert_push_and_digest(self):
+        users = [self.client_user.pk, self.freelancer_user.pk]
+        with patch('api.core.realtime.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                created = notify_many(users, 'job_completed', {'job_title': 'Logo'})
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "core_notification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(created), 2)
+        events = publish.call_args[0][0]
+        self.assertEqual(sorted(group for group, _ in events), sorted(f'user_{u}' for u in users))
+        self.assertEqual(events[0][1]['message'], "'Logo' has been marked as completed.")
+
+        # Still unread: the next one collapses into a digest for the same user
+        Notification.objects.filter(user=self.client_user).update(is_read=True)
+        with patch('api.core.realtime.publish'), self.captureOnCommitCallbacks(execute=True):
+            notify_many(users, 'job_completed', {'job_title': 'Banner'})
+        digest = Notification.objects.get(user=self.freelancer_user, kind='job_completed')
+        self.assertEqual(digest.digest_count, 2)
+        self.assertEqual(digest.message, '2 of your jobs have been marked as completed.')
+        self.assertEqual(Notification.objects.filter(user=self.client_user).count(), 2)
+
+    def test_async_run_queues_task(self):
+        with patch('django_q.tasks.async_task') as async_task:
+            self.assertEqual(notify_many([self.client_user.pk], 'job_completed', {'job_title': 'x'}, async_run=True), [])
+        async_task.assert_called_once_with(
+            'api.core.notifications.notify_many', [self.client_user.pk], 'job_completed', {'job_title': 'x'})
+        self.assertFalse(Notification.objects.exists())
+        with self.assertRaises(ValueError):
+            notify_many([self.client_user.pk], 'nope')
@@ -7,6 +7,14 @@ chat_list_view = ChatViewSet.as_view({
     'get': 'list',
 })
 
+chat_presence_view = ChatViewSet.as_view({
+    'get': 'presence',
+})
+
+chat_inbox_view = ChatViewSet.as_view({
+    'get': 'inbox',
+})
+
 notification_list_view = NotificationViewSet.as_view({
     'get': 'list',
 })
@@ -27,13 +35,25 @@ message_detail = MessageViewSet.as_view({
     'delete': 'destroy_by_chat_uuid',
 })
 
+message_mark_read = MessageViewSet.as_view({
+    'post': 'mark_read',
+})
+
+message_export = MessageViewSet.as_view({
+    'get': 'export',
+})
+
 urlpatterns = [
     # 🔹 Chat endpoints
     re_path(r'^chats/$', chat_list_view, name='chat-list'),
+    re_path(r'^chats/presence/$', chat_presence_view, name='chat-presence'),
+    re_path(r'^chats/inbox/$', chat_inbox_view, name='chat-inbox'),
 
     # 🔹 Message endpoints
     re_path(r'^chats/(?P<chat_uuid>[0-9a-f-]+)/$', message_list_create, name='message-list-by-chat'),
     re_path(r'^chats/(?P<chat_uuid>[0-9a-f-]+)/(?P<message_id>\d+)/$', message_detail, name='message-detail-by-uuid'),
+    re_path(r'^chats/(?P<chat_uuid>[0-9a-f-]+)/read/$', message_mark_read, name='message-mark-read'),
+    re_path(r'^chats/(?P<chat_uuid>[0-9a-f-]+)/export/$', message_export, name='message-export'),
 
     # 🔹 Notification endpoints (read-only)
     re_path(r'^notifications/$', notification_list_view, name='notification-list'),
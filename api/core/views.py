@@ -1,5 +1,7 @@
 
+import json
 import logging
+import uuid
 from decimal import Decimal
 from django.utils import timezone
 from rest_framework import serializers
@@ -10,12 +12,15 @@ from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response as DRFResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import viewsets, status,filters,permissions,generics
 from rest_framework.exceptions import PermissionDenied,NotFound,ValidationError
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.html import format_html
 from django.db.models import Exists, OuterRef
 from django.contrib.auth import get_user_model
@@ -29,16 +34,27 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.db.models import Q, F, Sum, Count,DecimalField,Prefetch
 
 from api.core.jobsmatch import JobMatcher
+from api.core.client_stats import client_stats_context
+from api.core.pagination import KeysetPagination, JOB_FEED_KEYS, BEST_MATCH_KEYS
+from api.core.dashboard import get_dashboard_summary
+from api.core.chat_reads import mark_chat_read
+from api.core.notifications import notify_many
+from api.core.chat_inbox import INBOX_KEYS, INBOX_PAGE_SIZE, inbox_queryset
+from api.core.message_timeline import (
+    TIMELINE_PAGE_SIZE, TIMELINE_MAX_PAGE_SIZE, EXPORT_CHUNK_SIZE,
+    timeline_queryset, timeline_page, timeline_chunk, message_attachment_urls)
+from api.core import presence
+from core.chat_access import get_chat_acl
 from api.wallet.utility import get_wallet_stats
 from accounts.models import Profile, FreelancerProfile,Skill
 from api.core.permissions import IsClient, IsJobOwner, IsChatParticipant, CanReview
 from api.core.matching import match_freelancers_to_job, recommend_jobs_to_freelancer
-from api.core.filters import JobFilter,AdvancedJobFilter,JobDiscoveryFilter,get_job_filters
+from api.core.filters import JobFilter,AdvancedJobFilter,JobDiscoveryFilter,SearchRankOrderingFilter,get_job_filters
 from core.models import Job, JobCategory,Chat, Message, MessageAttachment, Review,JobBookmark,Notification,Response as JobResponse
 
 from api.core.serializers import ( 
     JobSerializer,JobCategorySerializer, ApplyResponseSerializer,ResponseListSerializer,ResponseReviewSerializer,JobWithResponsesSerializer,NotificationSerializer,
-    ChatSerializer, MessageSerializer, ReviewSerializer,JobSearchSerializer,BookmarkedJobSerializer
+    ChatSerializer, ChatInboxSerializer, MessageSerializer, ReviewSerializer,JobSearchSerializer,BookmarkedJobSerializer
 )
 
 from payment.models import Payment
@@ -100,7 +116,7 @@ def get_skills_required_choices():
 
 
 class JobViewSet(viewsets.ModelViewSet):
-    queryset = Job.objects.all().select_related('client', 'category').prefetch_related(
+    queryset = Job.objects.all().select_related('client__user', 'category').prefetch_related(
     'skills_required','selected_freelancers', 'responses',)
 
     serializer_class = JobSerializer
@@ -136,10 +152,14 @@ class JobViewSet(viewsets.ModelViewSet):
             raise ValidationError("You cannot modify this job.")
         serializer.save()
 
-    def _get_enriched_paginated_response(self, queryset, extra_meta=None):
+    def _get_enriched_paginated_response(self, queryset, extra_meta=None, keyset_keys=JOB_FEED_KEYS):
         """
         Utility to paginate, serialize and enrich jobs with `bookmarked`, `has_applied`,
         and `application_status` for freelancers.
+
+        Sending `cursor` switches to keyset pagination on `keyset_keys`
+        (descending); `job_count` is then only included with `include_count=1`.
+        A `q` search or `ordering` cannot be paged that way and answers 400.
         """
         user = self.request.user
         profile = getattr(user, 'profile', None)
@@ -148,19 +168,26 @@ class JobViewSet(viewsets.ModelViewSet):
                 profile, 'user_type', '') == 'freelancer'
         )
 
+        use_keyset = KeysetPagination.requested(self.request)
+        if use_keyset:
+            paginator = KeysetPagination(keys=keyset_keys)
+            page = paginator.paginate_queryset(queryset, self.request, view=self)
+        else:
+            paginator = self.paginator
+            page = self.paginate_queryset(queryset)
+
         bookmarked_ids, applied_ids, application_statuses = set(), set(), {}
         if is_freelancer:
-            # Collect bookmark and application data efficiently
-            bookmarked_ids = set(user.bookmarks.values_list('job_id', flat=True))
-
-            # Fetch JobResponse objects to know the application status per job
-            responses = JobResponse.objects.filter(
-                user=user).values('job_id', 'status')
-            applied_ids = {r['job_id'] for r in responses}
-            application_statuses = {r['job_id']: r['status'] for r in responses}
+            # Only the jobs on this page, however many the user has bookmarked or applied to
+            page_ids = [job.id for job in page]
+            bookmarked_ids = set(user.bookmarks.filter(
+                job_id__in=page_ids).values_list('job_id', flat=True))
+            application_statuses = dict(JobResponse.objects.filter(
+                user=user, job_id__in=page_ids).values_list('job_id', 'status'))
+            applied_ids = set(application_statuses)
 
-        page = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(page, many=True)
+        serializer = self.get_serializer(page, many=True, context={
+            **self.get_serializer_context(), **client_stats_context(page)})
 
         enriched = []
         for job in serializer.data:
@@ -177,8 +204,12 @@ class JobViewSet(viewsets.ModelViewSet):
 
             enriched.append(enriched_job)
 
-        paginated = self.get_paginated_response(enriched)
-        paginated.data["job_count"] = queryset.count()
+        paginated = paginator.get_paginated_response(enriched)
+        if not use_keyset:
+            # The paginator already counted the queryset
+            paginated.data["job_count"] = paginator.page.paginator.count
+        elif paginator.count is not None:
+            paginated.data["job_count"] = paginator.count
 
         if extra_meta:
             paginated.data.update(extra_meta)
@@ -221,12 +252,12 @@ class JobViewSet(viewsets.ModelViewSet):
 
         # Handle best_match separately (bypass filter_backends completely)
         if match_type == "best_match":
-            queryset = JobMatcher.get_best_matches(user, Job.objects.all())
+            queryset = JobMatcher.get_best_matches(user, self.get_queryset())
         elif match_type == "bookmarks" and is_freelancer:
             queryset = Job.objects.filter(
                 id__in=JobBookmark.objects.filter(
                     user=user).values_list('job_id', flat=True)
-            ).select_related('client').prefetch_related('skills_required')
+            ).select_related('client__user', 'category').prefetch_related('skills_required')
 
         else:
             base_qs = self.get_queryset()
@@ -248,7 +279,10 @@ class JobViewSet(viewsets.ModelViewSet):
         if status_filter == 'applied':
             extra_meta['application_count'] = queryset.filter(responses__user=user).count()
 
-        return self._get_enriched_paginated_response(queryset, extra_meta=extra_meta)
+        # best_match cursors carry the ranking score ahead of the posting date
+        return self._get_enriched_paginated_response(
+            queryset, extra_meta=extra_meta,
+            keyset_keys=BEST_MATCH_KEYS if match_type == "best_match" else JOB_FEED_KEYS)
 
     
     @extend_schema(
@@ -360,6 +394,9 @@ class JobViewSet(viewsets.ModelViewSet):
             
         success = job.mark_as_completed()
         if success:
+            notify_many(
+                job.selected_freelancers.values_list('id', flat=True), 'job_completed',
+                {'job_title': job.title}, async_run=True)
             return DRFResponse({'detail': 'Job marked as completed.'}, status=status.HTTP_200_OK)
         
         return DRFResponse({'detail': 'Failed to mark job as completed.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -938,12 +975,22 @@ class AppliedJobsByFreelancerView(APIView):
     def get(self, request):
         user = request.user
 
-        # Get all the user's responses
-        responses = JobResponse.objects.filter(user=user).select_related('job')
-        response_map = {r.job_id: r.status for r in responses}
+        if KeysetPagination.requested(request):
+            # Cursor mode: one page of applied jobs, newest first
+            paginator = KeysetPagination()
+            jobs = paginator.paginate_queryset(
+                Job.objects.filter(responses__user=user).distinct(), request, view=self)
+            response_map = dict(JobResponse.objects.filter(
+                user=user, job_id__in=[job.id for job in jobs]).values_list('job_id', 'status'))
+        else:
+            paginator = None
+
+            # Get all the user's responses
+            responses = JobResponse.objects.filter(user=user).select_related('job')
+            response_map = {r.job_id: r.status for r in responses}
 
-        # Get the related jobs
-        jobs = Job.objects.filter(id__in=response_map.keys()).distinct()
+            # Get the related jobs
+            jobs = Job.objects.filter(id__in=response_map.keys()).distinct()
 
         # Serialize job data
         serializer = JobSearchSerializer(
@@ -954,6 +1001,8 @@ class AppliedJobsByFreelancerView(APIView):
         for item in data:
             item["application_status"] = response_map.get(item["id"])
 
+        if paginator is not None:
+            return paginator.get_paginated_response(data)
         return DRFResponse(data)
 
 
@@ -964,7 +1013,7 @@ class AdvancedJobSearchAPIView(generics.ListAPIView):
     throttle_classes = [ScopedRateThrottle]
     throttle_scope = 'search'
 
-    filter_backends = [DjangoFilterBackend,filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend,filters.SearchFilter, SearchRankOrderingFilter]
     filterset_class = AdvancedJobFilter
     search_fields = ['title', 'description',
                      'skills_required__name', 'category__name']
@@ -1045,6 +1094,16 @@ class JobBookmarkListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     pagination_class = CustomPaginator
 
+    @property
+    def paginator(self):
+        # `cursor` selects keyset pagination, most recently bookmarked first
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.requested(self.request):
+                self._paginator = KeysetPagination(keys=('created_at', 'id'))
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         return JobBookmark.objects.filter(user=self.request.user).select_related('job', 'job__client')
 
@@ -1189,7 +1248,7 @@ class ClientJobStatusView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = JobSerializer
     pagination_class = PageNumberPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, SearchRankOrderingFilter]
     filterset_class = AdvancedJobFilter
     search_fields = ['title', 'description', 'skills_required__name', 'category__name']
     ordering = ['-posted_date']
@@ -1201,7 +1260,9 @@ class ClientJobStatusView(generics.ListAPIView):
         if profile.user_type != 'client':
             return Job.objects.none()
 
-        queryset = Job.objects.filter(client=profile).annotate(
+        queryset = Job.objects.filter(client=profile).select_related(
+            'client__user', 'category'
+        ).prefetch_related('skills_required', 'selected_freelancers').annotate(
             application_count=Count('responses')
         )
 
@@ -1308,7 +1369,8 @@ class ClientJobStatusView(generics.ListAPIView):
                 'jobs': paginated,
             })
 
-        serializer = self.get_serializer(page, many=True)
+        serializer = self.get_serializer(page, many=True, context={
+            **self.get_serializer_context(), **client_stats_context(page)})
         return paginator.get_paginated_response({
             'status': status_filter or 'all',
             'count': queryset.count(),
@@ -1344,109 +1406,27 @@ class DashboardSummaryView(APIView):
 
     def get(self, request):
         user = request.user
-        profile = getattr(user, 'profile', None)
-
-        if not profile or not profile.user_type:
-            return DRFResponse({
-                'detail': 'User profile or user_type is missing.'
-            }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            summary = {}
-
-            # Unread messages
-            chat_filter = Q(client=profile) if profile.user_type == 'client' else Q(
-                freelancer=profile
-            )
-            unread_messages = Message.objects.filter(
-                chat__in=Chat.objects.filter(chat_filter)
-            ).exclude(sender=user).filter(is_read=False).count()
-
-            if profile.user_type == 'client':
-                jobs = Job.objects.filter(client=profile)
-                responses = JobResponse.objects.filter(job__client=profile)
-
-                total_payment = Payment.objects.filter(
-                    user=user, verified=True
-                ).aggregate(
-                    total=Coalesce(Sum('amount', output_field=DecimalField()),
-                                0, output_field=DecimalField())
-                )['total']
-
-                total_paypal = PaypalPayments.objects.filter(
-                    user=user, verified=True, status='completed'
-                ).aggregate(
-                    total=Coalesce(Sum('amount', output_field=DecimalField()),
-                                0, output_field=DecimalField())
-                )['total']
-
-                summary['activity'] = {
-                    'total_jobs_posted': jobs.count(),
-                    'jobs_open': jobs.filter(status='open').count(),
-                    'jobs_in_progress': jobs.filter(status='in_progress').count(),
-                    'jobs_completed': jobs.filter(status='completed').count(),
-                    'jobs_with_selected_freelancers': jobs.filter(selected_freelancers__isnull=False).distinct().count(),
-                    'responses_under_review': responses.filter(status='under_review').count()
-                }
-
-                summary['wallet'] = {
-                    # cast to float only at the very end for JSON
-                    'total_spent': float(total_payment + total_paypal)
-                }
-
-            elif profile.user_type == 'freelancer':
-                responses = JobResponse.objects.filter(user=user)
-
-                # Using WalletTransaction for earnings
-                total_earnings = WalletTransaction.total_earnings(user)
-                gross_earnings = WalletTransaction.total_gross_earnings(user)
-
-                # Pending earnings → jobs picked but not completed yet
-                pending_earnings = WalletTransaction.objects.filter(
-                    user=user, status__in=['in_progress', 'pending']
-                ).aggregate(total=Sum('amount'))['total'] or 0
-
-                completed_jobs = Job.objects.filter(selected_freelancers=user, status='completed').distinct()
-
-                in_progress_jobs = Job.objects.filter(selected_freelancers=user, status='in_progress').distinct()
-
-
-                summary['activity'] = {
-                    'jobs_applied': responses.count(),
-                    'jobs_accepted': responses.filter(status='accepted').count(),
-                    'jobs_rejected': responses.filter(status='rejected').count(),
-                    'jobs_under_review': responses.filter(status='under_review').count(),
-                    'jobs_submitted': responses.filter(status='submitted').count(),
-                    'jobs_assigned': in_progress_jobs.count(),
-                    'jobs_completed': completed_jobs.count(),
-                }
-
-                summary['bookmarks'] = {
-                    'bookmarked_jobs': JobBookmark.objects.filter(user=user).count()
-                }
-
-                summary['wallet'] = {
-                    'gross_earnings': float(gross_earnings),
-                    'net_earnings': float(total_earnings),
-                    'pending_earnings': float(pending_earnings),
-                }
-
-            summary['messages'] = {
-                'unread_messages': unread_messages
-            }
-
-            logger.info(f"{user.username} fetched unified dashboard summary.")
-            return DRFResponse({
-                'detail': 'Dashboard summary retrieved successfully.',
-                'summary': summary
-            }, status=status.HTTP_200_OK)
-
+            # Cached per user; invalidated by the model signals in api.signals
+            summary = get_dashboard_summary(user)
         except Exception as e:
             logger.error(f"Dashboard summary failed for {user.username}: {e}")
             return DRFResponse({
                 'error': 'Failed to retrieve dashboard summary.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        if summary is None:
+            return DRFResponse({
+                'detail': 'User profile or user_type is missing.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"{user.username} fetched unified dashboard summary.")
+        return DRFResponse({
+            'detail': 'Dashboard summary retrieved successfully.',
+            'summary': summary
+        }, status=status.HTTP_200_OK)
+
 
 
 class JobDiscoveryPagination(PageNumberPagination):
@@ -1495,7 +1475,8 @@ class JobDiscoveryView(APIView):
 
         try:
             jobs = Job.objects.filter(
-                status='open').select_related('client__user')
+                status='open').select_related('client__user', 'category').prefetch_related(
+                'skills_required', 'selected_freelancers')
 
             # Filters
             category = request.query_params.get('category')
@@ -1532,16 +1513,9 @@ class JobDiscoveryView(APIView):
                         'status_code': status.HTTP_403_FORBIDDEN
                     }, status=status.HTTP_403_FORBIDDEN)
 
-                skill_names = user.profile.freelancer_profile.skills.values_list(
-                    'name', flat=True)
-                jobs = list(jobs)
-
-                def match_score(job):
-                    return sum(
-                        1 for skill in skill_names if skill.lower() in (job.title + job.description).lower()
-                    )
-
-                jobs = sorted(jobs, key=match_score, reverse=True)
+                skill_names = list(user.profile.freelancer_profile.skills.values_list(
+                    'name', flat=True))
+                jobs = JobMatcher.rank_by_skill_text(jobs, skill_names)
 
             elif status_filter == 'most_recent':
                 jobs = jobs.order_by('-posted_date')
@@ -1563,26 +1537,27 @@ class JobDiscoveryView(APIView):
                     'status_code': status.HTTP_400_BAD_REQUEST
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Serialize and enrich
+            # Paginate first so only the requested page is fetched and serialized
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(jobs, request)
+
+            context = client_stats_context(page)
             results = []
-            for job in jobs:
-                data = JobSearchSerializer(job).data
+            for job in page:
+                data = JobSearchSerializer(job, context=context).data
                 job_id = job.id
                 data['bookmarked'] = job_id in bookmarked_ids
                 data['has_applied'] = job_id in applied_ids
                 data['has_applied_and_bookmarked'] = job_id in bookmarked_ids and job_id in applied_ids
                 results.append(data)
 
-            # Paginate
-            paginator = self.pagination_class()
-            page = paginator.paginate_queryset(results, request)
             return paginator.get_paginated_response({
                 'success': True,
                 'status_filter': status_filter or 'open',
-                'count': len(results),
+                'count': paginator.page.paginator.count,
                 'message': 'Jobs fetched successfully.',
                 'status_code': status.HTTP_200_OK,
-                'jobs': page
+                'jobs': results
             })
 
         except Exception as e:
@@ -1687,11 +1662,63 @@ class ChatViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+    @extend_schema(
+        summary="Presence of the other participant in each chat",
+        description=(
+            "Online flag and last-seen time of the counterpart in every chat of the user, "
+            "or only in the chats given as repeated `chat` uuid parameters. "
+            "Read from the presence cache; no per-chat queries."
+        ),
+        parameters=[
+            OpenApiParameter(name='chat', type=str, many=True, required=False,
+                             description='Chat uuid; repeat to ask for several chats'),
+        ],
+        responses={200: OpenApiResponse(description="Presence keyed by chat uuid")},
+        tags=["Chats"],
+    )
+    @action(detail=False, methods=['get'])
+    def presence(self, request):
+        chats = self.get_queryset()
+        chat_uuids = request.query_params.getlist('chat')
+        if chat_uuids:
+            try:
+                chats = chats.filter(chat_uuid__in=[uuid.UUID(value) for value in chat_uuids])
+            except ValueError:
+                return DRFResponse({"message": "Invalid chat uuid."}, status=status.HTTP_400_BAD_REQUEST)
+
+        counterparts = {
+            str(chat_uuid): freelancer_user_id if client_user_id == request.user.pk else client_user_id
+            for chat_uuid, client_user_id, freelancer_user_id in chats.values_list(
+                'chat_uuid', 'client__user_id', 'freelancer__user_id')
+        }
+        states = presence.presence_for(counterparts.values())
+        return DRFResponse({
+            chat_uuid: {'user_id': user_id, **states[user_id]} if user_id else None
+            for chat_uuid, user_id in counterparts.items()
+        })
+
+    @extend_schema(
+        summary="Chat inbox",
+        description=(
+            "The user's chats, most recently active first, each with its last message, the user's "
+            "unread count and the other participant's name and avatar. "
+            f"Keyset paginated ({INBOX_PAGE_SIZE} per page); follow `next` for older chats."
+        ),
+        responses={200: ChatInboxSerializer(many=True)},
+        tags=["Chats"],
+    )
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        paginator = KeysetPagination(keys=INBOX_KEYS)
+        paginator.page_size = INBOX_PAGE_SIZE
+        page = paginator.paginate_queryset(inbox_queryset(request.user), request, view=self)
+        return paginator.get_paginated_response(ChatInboxSerializer(page, many=True).data)
+
 
 class MessageViewSet(viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated, IsChatParticipant]
-    parser_classes = [MultiPartParser]
+    parser_classes = [MultiPartParser, JSONParser]
     
 
     def get_queryset(self):
@@ -1702,16 +1729,15 @@ class MessageViewSet(viewsets.ModelViewSet):
             return Message.objects.none()
 
         chats = Chat.objects.filter(Q(client=profile) | Q(freelancer=profile))
-        return Message.objects.filter(chat__in=chats, is_deleted=False)
+        return Message.objects.filter(chat__in=chats, is_deleted=False).select_related(
+            'sender').prefetch_related('attachments')
 
     def get_chat(self, chat_uuid):
-        try:
-            chat = Chat.objects.get(chat_uuid=chat_uuid)
-        except Chat.DoesNotExist:
-            return None
-        if not chat.can_access(self.request.user):
+        # Access is decided from the cached chat ACL before any chat row is loaded
+        acl = get_chat_acl(chat_uuid=chat_uuid)
+        if not acl or not acl.allows(self.request.user):
             return None
-        return chat
+        return Chat.objects.select_related('job').filter(pk=acl.chat_id).first()
 
     @extend_schema(
         summary="Send a message with optional attachments",
@@ -1808,11 +1834,27 @@ class MessageViewSet(viewsets.ModelViewSet):
 
         return DRFResponse(self.get_serializer(message).data, status=status.HTTP_201_CREATED)
 
+    def _timeline_data(self, messages):
+        serializer = self.get_serializer(
+            messages, many=True,
+            context={**self.get_serializer_context(), 'attachment_urls': message_attachment_urls(messages)})
+        return serializer.data
+
     @extend_schema(
         summary="List messages by chat UUID",
-        description="Retrieve all non-deleted messages for a given chat.",
+        description=(
+            "Retrieve the non-deleted messages of a chat. With `before` and/or `limit` only one page "
+            "is returned, oldest first: the `limit` messages before message id `before` (the newest "
+            "by default), with `has_more` and the `next_before` id for the older page. "
+            "Listing does not mark anything read; clients call the read endpoint for that."
+        ),
+        parameters=[
+            OpenApiParameter(name='before', type=int, required=False, description='Only messages older than this message id'),
+            OpenApiParameter(name='limit', type=int, required=False, description=f'Page size (default {TIMELINE_PAGE_SIZE}, max {TIMELINE_MAX_PAGE_SIZE})'),
+        ],
         responses={
             200: OpenApiResponse(description="List of messages", response=MessageSerializer(many=True)),
+            400: OpenApiResponse(description="`before` or `limit` is not a number."),
             403: OpenApiResponse(description="Chat not found or access denied."),
         },
         tags=["Messages"],
@@ -1825,9 +1867,101 @@ class MessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        messages = Message.objects.filter(chat=chat, is_deleted=False)
-        serializer = self.get_serializer(messages, many=True)
-        return DRFResponse(serializer.data, status=status.HTTP_200_OK)
+        params = request.query_params
+        if 'before' not in params and 'limit' not in params:
+            messages = list(timeline_queryset(chat.pk))
+            return DRFResponse(self._timeline_data(messages), status=status.HTTP_200_OK)
+
+        try:
+            before = int(params['before']) if params.get('before') else None
+            limit = int(params.get('limit') or TIMELINE_PAGE_SIZE)
+        except ValueError:
+            return DRFResponse(
+                {"message": "before and limit must be numbers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, TIMELINE_MAX_PAGE_SIZE))
+
+        messages, has_more = timeline_page(chat.pk, before=before, limit=limit)
+        return DRFResponse({
+            "results": self._timeline_data(messages),
+            "has_more": has_more,
+            "next_before": messages[0].id if has_more else None,
+        }, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Export a chat as JSON lines",
+        description=(
+            "Streams every non-deleted message of the chat, oldest first, one JSON object per line "
+            f"(application/x-ndjson). Messages are loaded {EXPORT_CHUNK_SIZE} at a time."
+        ),
+        responses={
+            (200, 'application/x-ndjson'): OpenApiResponse(description="One serialized message per line."),
+            403: OpenApiResponse(description="Chat not found or access denied."),
+        },
+        tags=["Messages"],
+    )
+    def export(self, request, chat_uuid=None):
+        chat = self.get_chat(chat_uuid)
+        if not chat:
+            return DRFResponse(
+                {"message": "Chat not found or access denied."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        def export_chunk(after):
+            chunk = timeline_chunk(chat.pk, after, EXPORT_CHUNK_SIZE)
+            body = ''.join(
+                json.dumps(message, cls=DjangoJSONEncoder) + '\n' for message in self._timeline_data(chunk))
+            return (chunk[-1].id if len(chunk) == EXPORT_CHUNK_SIZE else None), body
+
+        async def lines():
+            # Under ASGI a sync iterator is drained into a list before anything
+            # is sent; this one sends each chunk as soon as it is serialized
+            after = 0
+            while after is not None:
+                after, body = await sync_to_async(export_chunk)(after)
+                if body:
+                    yield body
+
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="chat-{chat.chat_uuid}.jsonl"'
+        return response
+
+    @extend_schema(
+        summary="Mark messages read up to a message",
+        description=(
+            "Marks every message from the other participant up to `up_to` (default: the newest) "
+            "as read in a single update, moves the read watermark and sends one unread-count event."
+        ),
+        request={"application/json": {
+            "type": "object",
+            "properties": {"up_to": {"type": "integer", "description": "Last message id read"}},
+        }},
+        responses={
+            200: OpenApiResponse(description="New unread count and read watermark."),
+            400: OpenApiResponse(description="`up_to` is not a message id."),
+            403: OpenApiResponse(description="Chat not found or access denied."),
+        },
+        tags=["Messages"],
+    )
+    def mark_read(self, request, chat_uuid=None):
+        chat = self.get_chat(chat_uuid)
+        if not chat:
+            return DRFResponse({"message": "Chat not found or access denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        up_to = request.data.get('up_to')
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                return DRFResponse({"message": "up_to must be a message id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        state = mark_chat_read(chat.pk, chat.slug, request.user.pk, up_to)
+        return DRFResponse({
+            "unread_count": state.unread_count if state else 0,
+            "last_read_message_id": state.last_read_message_id if state else None,
+        }, status=status.HTTP_200_OK)
 
     @extend_schema(
         summary="Retrieve a message by chat UUID and message ID",
@@ -9,6 +9,7 @@ from django.urls import reverse
 from rest_framework import status
 from urllib.parse import urlencode
 from django.dispatch import receiver
+from django.db import transaction
 from django.http import JsonResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -20,15 +21,27 @@ from django.utils.decorators import method_decorator
 from django.shortcuts import redirect, get_object_or_404
 from paypal.standard.forms import PayPalPaymentsForm
 from .paypal_api import get_paypal_access_token
+from api.wallet.gateways.paypal import PayPalGateway
 
 from core.models import Job
 from payments.models import PaypalPayments
+from wallet.models import WebhookEvent
+from wallet.webhook.inbox import RejectedEvent, body_event_id, record_event
 
 logger = logging.getLogger(__name__)
 
 frontend_url = getattr(settings, "FRONTEND_URL",
                         "https://nilltech.brainversetechnologies.co.ke")
 
+# Headers PayPal's verify-webhook-signature call needs, stored with the event
+PAYPAL_SIGNATURE_HEADERS = (
+    "PAYPAL-AUTH-ALGO",
+    "PAYPAL-CERT-URL",
+    "PAYPAL-TRANSMISSION-ID",
+    "PAYPAL-TRANSMISSION-SIG",
+    "PAYPAL-TRANSMISSION-TIME",
+)
+
 
 class InitiatePaypalPayment(APIView):
     
@@ -282,129 +295,210 @@ class PaymentStatus(APIView):
         return Response(data, status=status.HTTP_200_OK)
 
 
-@method_decorator(csrf_exempt, name="dispatch")
-class PaypalWebhookView(APIView):
-    authentication_classes = []
-    permission_classes = []
+def _resolve_paypal_ids(resource):
+    """(invoice_id, order_id) of a PayPal webhook resource."""
+    # Extract invoice_id and order_id safely across event types
+    invoice_id = None
+    order_id = resource.get("id")
 
-    def post(self, request, *args, **kwargs):
-        event = request.data
-        logger.info(f"Received PayPal webhook: {event}")
+    # CHECKOUT.ORDER.APPROVED → invoice is inside purchase_units
+    if resource.get("purchase_units"):
+        invoice_id = resource["purchase_units"][0].get("invoice_id")
 
-        try:
-            event_type = event.get("event_type")
-            resource = event.get("resource", {})
-
-            # Extract invoice_id and order_id safely across event types
-            invoice_id = None
-            order_id = resource.get("id")
-
-            # CHECKOUT.ORDER.APPROVED → invoice is inside purchase_units
-            if resource.get("purchase_units"):
-                invoice_id = resource["purchase_units"][0].get("invoice_id")
-
-            # For PAYMENT.CAPTURE.* → invoice is usually at root level
-            if not invoice_id and "invoice_id" in resource:
-                invoice_id = resource["invoice_id"]
-
-            # If still missing → check supplementary_data.related_ids
-            if not invoice_id:
-                related_ids = resource.get(
-                    "supplementary_data", {}).get("related_ids", {})
-                if "order_id" in related_ids:
-                    order_id = related_ids["order_id"]
-
-            logger.info(
-                f"Resolved invoice_id={invoice_id}, order_id={order_id}")
-
-            # Try to match payment
-            payment = None
-            if invoice_id:
-                payment = PaypalPayments.objects.filter(
-                    invoice=invoice_id).first()
-            if not payment and order_id:
-                payment = PaypalPayments.objects.filter(
-                    extra_data__id=order_id).first()
+    # For PAYMENT.CAPTURE.* → invoice is usually at root level
+    if not invoice_id and "invoice_id" in resource:
+        invoice_id = resource["invoice_id"]
+
+    # If still missing → check supplementary_data.related_ids
+    if not invoice_id:
+        related_ids = resource.get(
+            "supplementary_data", {}).get("related_ids", {})
+        if "order_id" in related_ids:
+            order_id = related_ids["order_id"]
+    return invoice_id, order_id
 
-            if not payment:
-                logger.warning(
-                    f"No payment found for invoice={invoice_id}, order={order_id}")
-                return Response({"error": "Payment not found"}, status=404)
 
-            # keep last event for debugging
-            payment.extra_data = {**payment.extra_data, "last_event": event}
+def _mark_paypal_paid(payment, **extra):
+    """Verifies ``payment`` and opens its job."""
+    with transaction.atomic():
+        payment.status = "completed"
+        payment.verified = True
+        payment.extra_data = {**payment.extra_data, **extra}
+        payment.save()
+
+        job = payment.job
+        job.is_paid = True
+        job.payment_verified = True
+        job.status = "open"
+        job.save()
+
+
+def _capture_completed(capture):
+    return bool(capture) and capture.get("status") == "COMPLETED"
+
+
+def _request_capture(capture_url):
+    """
+    POSTs the capture and returns PayPal's response. An order that was
+    already captured answers with the order itself, so a retry whose
+    earlier capture went through still reads as completed.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {get_paypal_access_token()}",
+    }
+    response = requests.post(capture_url, headers=headers, timeout=30)
+    data = response.json()
+    if response.status_code == 201:
+        return data
+
+    issues = {detail.get("issue") for detail in data.get("details", [])}
+    if "ORDER_ALREADY_CAPTURED" in issues:
+        order_url = capture_url.rsplit("/capture", 1)[0]
+        return requests.get(order_url, headers=headers, timeout=30).json()
+
+    logger.error(f"Capture failed via webhook: {data}")
+    return data
+
+
+def _fail_approval_event(payment, error):
+    """
+    Marks the latest approval event of ``payment`` failed with ``error``, so
+    replay_webhooks queues the capture again.
+    """
+    references = [ref for ref in (payment.invoice, payment.extra_data.get("id")) if ref]
+    event = (
+        WebhookEvent.objects.filter(
+            provider="paypal", event_type="CHECKOUT.ORDER.APPROVED", reference__in=references)
+        .order_by("-id")
+        .first()
+    )
+    if event:
+        event.status = "failed"
+        event.error = error
+        event.save(update_fields=["status", "error"])
+
+
+def capture_paypal_payment(payment_id, capture_url):
+    """
+    Captures an approved order outside any transaction, queued by
+    process_paypal_event. The capture response is stored on the payment
+    before the payment and job are updated, so a retry or a replayed event
+    finishes from it instead of capturing again. A failed capture marks the
+    approval event failed for replay and raises, so the task shows as failed.
+    """
+    payment = PaypalPayments.objects.filter(pk=payment_id).first()
+    if not payment or payment.verified:
+        return
+
+    capture = payment.extra_data.get("capture")
+    if not _capture_completed(capture):
+        try:
+            capture = _request_capture(capture_url)
+        except (requests.RequestException, ValueError) as exc:
+            _fail_approval_event(payment, f"Capture request failed: {exc}")
+            raise
+        with transaction.atomic():
+            payment = PaypalPayments.objects.select_for_update().get(pk=payment_id)
+            payment.extra_data = {**payment.extra_data, "capture": capture}
             payment.save(update_fields=["extra_data"])
+        if not _capture_completed(capture):
+            error = f"Capture not completed: {capture}"
+            _fail_approval_event(payment, error)
+            raise ValueError(error)
 
-            if event_type == "CHECKOUT.ORDER.APPROVED":
-                if not payment.verified:
-                    capture_url = None
-                    for link in resource.get("links", []):
-                        if link.get("rel") == "capture":
-                            capture_url = link.get("href")
-                            break
-
-                    if capture_url:
-                        access_token = get_paypal_access_token()
-                        headers = {
-                            "Content-Type": "application/json",
-                            "Authorization": f"Bearer {access_token}",
-                        }
-                        capture_response = requests.post(
-                            capture_url, headers=headers)
-                        capture_data = capture_response.json()
-
-                        if capture_response.status_code == 201:
-                            payment.status = "completed"
-                            payment.verified = True
-                            payment.extra_data = {
-                                **payment.extra_data,
-                                "capture": capture_data,
-                            }
-                            payment.save()
-
-                            job = payment.job
-                            job.is_paid = True
-                            job.payment_verified = True
-                            job.status = "open"
-                            job.save()
-
-                            logger.info(
-                                f"Payment captured successfully via webhook: {payment.invoice}")
-                        else:
-                            logger.error(
-                                f"Capture failed via webhook: {capture_data}")
-
-            elif event_type == "PAYMENT.CAPTURE.COMPLETED":
-                if not payment.verified:
-                    payment.status = "completed"
-                    payment.verified = True
-                    payment.extra_data = {
-                        **payment.extra_data,
-                        "capture_completed": resource,
-                    }
-                    payment.save()
+    if not payment.verified:
+        _mark_paypal_paid(payment)
+        logger.info(
+            f"Payment captured successfully via webhook: {payment.invoice}")
 
-                    job = payment.job
-                    job.is_paid = True
-                    job.payment_verified = True
-                    job.status = "open"
-                    job.save()
 
-            elif event_type == "PAYMENT.CAPTURE.DENIED":
-                payment.status = "failed"
-                payment.extra_data = {**payment.extra_data, "denied": resource}
-                payment.save()
+def process_paypal_event(event, headers):
+    """
+    Inbox handler for stored PayPal webhooks (see wallet.webhook.inbox).
+    The signature is verified with PayPal before anything changes; an event
+    that fails it is rejected. Raises when no payment matches, so the event
+    is kept as failed for replay. The capture of an approved order is queued
+    to run after this commits.
+    """
+    if not PayPalGateway().verify_webhook(headers, event):
+        raise RejectedEvent("PayPal webhook signature verification failed")
+
+    event_type = event.get("event_type")
+    resource = event.get("resource", {})
+    invoice_id, order_id = _resolve_paypal_ids(resource)
+
+    logger.info(
+        f"Resolved invoice_id={invoice_id}, order_id={order_id}")
+
+    # Try to match payment
+    payments = PaypalPayments.objects.select_for_update()
+    payment = None
+    if invoice_id:
+        payment = payments.filter(invoice=invoice_id).first()
+    if not payment and order_id:
+        payment = payments.filter(extra_data__id=order_id).first()
+
+    if not payment:
+        raise ValueError(
+            f"No payment found for invoice={invoice_id}, order={order_id}")
+
+    # keep last event for debugging
+    payment.extra_data = {**payment.extra_data, "last_event": event}
+    payment.save(update_fields=["extra_data"])
+
+    if event_type == "CHECKOUT.ORDER.APPROVED":
+        if not payment.verified:
+            capture_url = None
+            for link in resource.get("links", []):
+                if link.get("rel") == "capture":
+                    capture_url = link.get("href")
+                    break
+
+            if capture_url:
+                from django_q.tasks import async_task
+                transaction.on_commit(lambda: async_task(
+                    "api.payments.views.capture_paypal_payment", payment.pk, capture_url))
+
+    elif event_type == "PAYMENT.CAPTURE.COMPLETED":
+        if not payment.verified:
+            _mark_paypal_paid(payment, capture_completed=resource)
+
+    elif event_type == "PAYMENT.CAPTURE.DENIED":
+        payment.status = "failed"
+        payment.extra_data = {**payment.extra_data, "denied": resource}
+        payment.save()
+
+    elif event_type == "PAYMENT.CAPTURE.PENDING":
+        payment.status = "pending"
+        payment.extra_data = {
+            **payment.extra_data, "pending": resource}
+        payment.save()
+        logger.info(
+            f"Payment marked as pending for invoice={invoice_id}")
 
-            elif event_type == "PAYMENT.CAPTURE.PENDING":
-                payment.status = "pending"
-                payment.extra_data = {
-                    **payment.extra_data, "pending": resource}
-                payment.save()
-                logger.info(
-                    f"Payment marked as pending for invoice={invoice_id}")
 
-            return Response({"message": "Webhook processed"}, status=200)
+@method_decorator(csrf_exempt, name="dispatch")
+class PaypalWebhookView(APIView):
+    """
+    Stores the event and its signature headers in the webhook inbox and
+    answers at once; verification, the capture call and payment updates run
+    in process_paypal_event on a worker.
+    """
+    authentication_classes = []
+    permission_classes = []
 
-        except Exception as e:
-            logger.exception("Error processing PayPal webhook")
-            return Response({"error": str(e)}, status=500)
+    def post(self, request, *args, **kwargs):
+        # The raw body can only be read before request.data consumes the stream
+        body = request.body
+        event = request.data
+        event_type = event.get("event_type")
+        invoice_id, order_id = _resolve_paypal_ids(event.get("resource") or {})
+        logger.info(f"Received PayPal webhook: {event_type} id={event.get('id')}")
+
+        record_event(
+            "paypal", event.get("id") or body_event_id(body),
+            event_type, invoice_id or order_id, event,
+            headers={name: request.headers[name] for name in PAYPAL_SIGNATURE_HEADERS
+                     if name in request.headers})
+        return Response({"message": "Webhook received"}, status=200)
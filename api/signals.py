@@ -1,62 +1,125 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from core.models import Message
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from accounts.models import Profile
+from core.models import Message, Chat, ChatParticipantState, Job, JobBookmark, Response
+from payment.models import Payment
+from payments.models import PaypalPayments
+from wallet.events import batch_settled, transactions_bulk_updated
+from wallet.models import WalletTransaction
+from api.core.dashboard import invalidate_dashboard
+from api.core.notifications import notify_many
+from api.core.realtime import publish_on_commit, unread_event
+from api.core import presence
 
 
 @receiver(post_save, sender=Message)
-def notify_unread_messages(sender, instance, created, **kwargs):
-    if not created:
+def send_message_notification(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
         return
 
-    # Determine recipient
-    chat = instance.chat
-    recipient = chat.freelancer.user if instance.sender != chat.freelancer.user else chat.client.user
+    chat = Chat.objects.filter(pk=instance.chat_id).values_list(
+        'slug', 'client__user_id', 'freelancer__user_id').first()
+    if not chat:
+        return
+    chat_slug, client_user_id, freelancer_user_id = chat
+    recipient_id = client_user_id if instance.sender_id != client_user_id else freelancer_user_id
 
-    # Broadcast to recipient's WebSocket channel group
-    channel_layer = get_channel_layer()
-    group_name = f"user_{recipient.id}"
+    message_event = {
+        'type': 'new_message',
+        'message': instance.content,
+        'sender': instance.sender.username,
+        'timestamp': str(instance.timestamp)
+    }
 
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "unread.message",
-            "chat_slug": chat.slug,
-            "unread_count": chat.messages.filter(is_read=False).exclude(sender=recipient).count()
-        }
-    )
+    def build_events():
+        # Broadcast to chat participants, then the recipient's unread count
+        events = [(f'chat_{chat_slug}', message_event)]
+        # A recipient with the chat open sees the message there already
+        if recipient_id and not presence.is_viewing_chat(instance.chat_id, recipient_id):
+            unread_count = ChatParticipantState.objects.filter(
+                chat_id=instance.chat_id, user_id=recipient_id
+            ).values_list('unread_count', flat=True).first() or 0
+            events.append(unread_event(recipient_id, chat_slug, unread_count))
+        return events
 
+    publish_on_commit(build_events)
 
-@receiver(post_save, sender=Message)
-def send_message_notification(sender, instance, created, **kwargs):
-    if not created:
+
+# Dashboard snapshot invalidation
+def _profile_user_id(profile_id):
+    if not profile_id:
+        return None
+    return Profile.objects.filter(pk=profile_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Job)
+@receiver(pre_delete, sender=Job)
+def invalidate_dashboard_for_job(sender, instance, **kwargs):
+    # pre_delete so the selected freelancers are still readable
+    invalidate_dashboard(
+        _profile_user_id(instance.client_id),
+        *instance.selected_freelancers.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Job.selected_freelancers.through)
+def invalidate_dashboard_for_selection(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # instance is the freelancer, pk_set the jobs
+        jobs = Job.objects.filter(pk__in=pk_set) if pk_set else instance.selected_jobs.all()
+        client_ids = Profile.objects.filter(jobs__in=jobs).values_list('user_id', flat=True)
+        invalidate_dashboard(instance.pk, *client_ids)
         return
 
-    chat = instance.chat
-    channel_layer = get_channel_layer()
-
-    # Broadcast to chat participants
-    async_to_sync(channel_layer.group_send)(
-        f'chat_{chat.slug}',
-        {
-            'type': 'new_message',
-            'message': instance.content,
-            'sender': instance.sender.username,
-            'timestamp': str(instance.timestamp)
-        }
-    )
-
-    # Notify recipient’s unread count
-    recipient = chat.client.user if instance.sender != chat.client.user else chat.freelancer.user
-    unread_count = chat.messages.filter(
-        is_read=False).exclude(sender=recipient).count()
-
-    async_to_sync(channel_layer.group_send)(
-        f'user_{recipient.id}',
-        {
-            'type': 'unread_message',
-            'chat_slug': chat.slug,
-            'unread_count': unread_count
-        }
-    )
+    freelancer_ids = pk_set if pk_set else instance.selected_freelancers.values_list('id', flat=True)
+    invalidate_dashboard(_profile_user_id(instance.client_id), *freelancer_ids)
+
+
+@receiver(post_save, sender=Response)
+@receiver(post_delete, sender=Response)
+def invalidate_dashboard_for_response(sender, instance, **kwargs):
+    client_user_id = Job.objects.filter(pk=instance.job_id).values_list(
+        'client__user_id', flat=True).first()
+    invalidate_dashboard(instance.user_id, client_user_id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_dashboard_for_message(sender, instance, **kwargs):
+    participants = Chat.objects.filter(pk=instance.chat_id).values_list(
+        'client__user_id', 'freelancer__user_id').first()
+    if participants:
+        invalidate_dashboard(*participants)
+
+
+@receiver(post_save, sender=WalletTransaction)
+@receiver(post_delete, sender=WalletTransaction)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=PaypalPayments)
+@receiver(post_delete, sender=PaypalPayments)
+@receiver(post_save, sender=JobBookmark)
+@receiver(post_delete, sender=JobBookmark)
+def invalidate_dashboard_for_owner(sender, instance, **kwargs):
+    invalidate_dashboard(instance.user_id)
+
+
+@receiver(transactions_bulk_updated)
+def invalidate_dashboard_for_transactions(sender, user_ids, **kwargs):
+    invalidate_dashboard(*user_ids)
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_dashboard_for_profile(sender, instance, **kwargs):
+    invalidate_dashboard(instance.user_id)
+
+
+@receiver(batch_settled)
+def notify_batch_outcome(sender, batch, sent_user_ids, failed_user_ids, **kwargs):
+    payload = {'reference': batch.reference}
+    if sent_user_ids:
+        notify_many(sent_user_ids, 'payout_completed', payload, async_run=True)
+    if failed_user_ids:
+        notify_many(failed_user_ids, 'payout_failed', payload, async_run=True)
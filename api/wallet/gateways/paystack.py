@@ -1,6 +1,8 @@
+import hashlib
 import json
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
@@ -17,6 +19,10 @@ class PaystackGateway(BaseGateway):
     provider_name = "paystack"
     base_url = getattr(settings, "PAYSTACK_BASE_URL",
                         "https://api.paystack.co")
+    # Paystack accepts at most 100 transfers per transfer/bulk request
+    bulk_transfer_limit = getattr(settings, "PAYSTACK_BULK_TRANSFER_LIMIT", 100)
+    # Concurrent HTTP calls per payout run; also the session's pool size
+    max_workers = getattr(settings, "PAYSTACK_PAYOUT_WORKERS", 8)
 
     def __init__(self):
         self.sk = settings.PAYSTACK_SECRET_KEY
@@ -27,7 +33,8 @@ class PaystackGateway(BaseGateway):
             backoff_factor=0.8,
             status_forcelist=[429, 500, 502, 503, 504],
         )
-        self.session.mount("https://", HTTPAdapter(max_retries=retries))
+        self.session.mount("https://", HTTPAdapter(
+            max_retries=retries, pool_maxsize=self.max_workers))
         self.session.headers.update({
             "Authorization": f"Bearer {self.sk}",
             "Content-Type": "application/json",
@@ -48,8 +55,12 @@ class PaystackGateway(BaseGateway):
         batch_ref = wallet_tx.batch.reference if wallet_tx.batch else "no-batch"
         return f"paystack-payout-{batch_ref}-tx-{wallet_tx.id}"
 
-    def _idempotency_key_for_batch(self, batch: PaymentBatch):
-        return f"paystack-batch-{batch.reference}"
+    def _idempotency_key_for_batch(self, batch: PaymentBatch, tx_ids=()):
+        # Derived from the chunk's contents, so a retry that splits the
+        # transfers differently never reuses a key for other transfers
+        digest = hashlib.sha256(
+            ",".join(str(tx_id) for tx_id in sorted(tx_ids)).encode()).hexdigest()[:24]
+        return f"paystack-batch-{batch.reference}-{digest}"
 
     # Phone + provider normalization
 
@@ -115,17 +126,7 @@ class PaystackGateway(BaseGateway):
         )
         return {"success": False, "error": data}
 
-    def get_or_create_recipient_code(self, user) -> str | None:
-        try:
-            profile = user.profile
-        except Profile.DoesNotExist:
-            logger.error("Profile missing for user id=%s",
-                         getattr(user, "id", None))
-            return None
-
-        if getattr(profile, "paystack_recipient", None):
-            return profile.paystack_recipient
-
+    def _recipient_payload(self, user, profile) -> dict | None:
         provider_code = self._map_mobile_provider(
             getattr(profile, "mobile_money_provider", None)
         )
@@ -140,7 +141,7 @@ class PaystackGateway(BaseGateway):
             )
             return None
 
-        payload = {
+        return {
             "type": "mobile_money",
             "name": (
                 f"{getattr(user, 'first_name', '')} "
@@ -151,6 +152,21 @@ class PaystackGateway(BaseGateway):
             "currency": "KES",
         }
 
+    def get_or_create_recipient_code(self, user) -> str | None:
+        try:
+            profile = user.profile
+        except Profile.DoesNotExist:
+            logger.error("Profile missing for user id=%s",
+                         getattr(user, "id", None))
+            return None
+
+        if getattr(profile, "paystack_recipient", None):
+            return profile.paystack_recipient
+
+        payload = self._recipient_payload(user, profile)
+        if not payload:
+            return None
+
         result = self.create_transfer_recipient_payload(payload)
 
         if result.get("success"):
@@ -170,6 +186,51 @@ class PaystackGateway(BaseGateway):
         )
         return None
 
+    def resolve_recipient_codes(self, users) -> dict:
+        """
+        {user_id: recipient_code} for ``users``. Missing codes are created
+        concurrently (HTTP only in the pool) and saved with one bulk_update.
+        Users whose recipient cannot be created are left out.
+        """
+        codes = {}
+        missing = {}
+        for user in users:
+            profile = getattr(user, "profile", None)
+            if profile is None:
+                logger.error("Profile missing for user id=%s", user.id)
+            elif profile.paystack_recipient:
+                codes[user.id] = profile.paystack_recipient
+            else:
+                payload = self._recipient_payload(user, profile)
+                if payload:
+                    missing[user.id] = (profile, payload)
+
+        if not missing:
+            return codes
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = pool.map(
+                self.create_transfer_recipient_payload,
+                [payload for _, payload in missing.values()])
+
+        created = []
+        for (user_id, (profile, _)), result in zip(missing.items(), results):
+            if not result.get("success"):
+                logger.error(
+                    "Failed creating recipient for user id=%s err=%s",
+                    user_id, json.dumps(result.get("error", {}))
+                )
+                continue
+            profile.paystack_recipient = result["recipient_code"]
+            codes[user_id] = profile.paystack_recipient
+            created.append(profile)
+
+        try:
+            Profile.objects.bulk_update(created, ["paystack_recipient"])
+        except Exception:
+            logger.exception("Failed saving %d recipient codes", len(created))
+        return codes
+
     # SINGLE PAYOUT
 
     def payout(self, wallet_tx: WalletTransaction, idempotency_key: str | None = None) -> dict:
@@ -251,24 +312,55 @@ class PaystackGateway(BaseGateway):
 
     # BULK PAYOUT
 
+    def _post_bulk_chunk(self, payload: dict, idem_key: str) -> dict:
+        """One transfer/bulk request; HTTP only, safe to run in the pool."""
+        url = f"{self.base_url}/transfer/bulk"
+        try:
+            resp = self.session.post(
+                url, json=payload, headers={"Idempotency-Key": idem_key}, timeout=60)
+        except requests.RequestException as exc:
+            logger.exception("Paystack bulk chunk HTTP error key=%s", idem_key)
+            return {"status_code": None, "data": None, "error": str(exc)}
+
+        data = self._safe_json(resp)
+        if resp.status_code in (200, 201) and data.get("status"):
+            return {"status_code": resp.status_code, "data": data, "error": None}
+        err = data.get("message") or data.get("error") or str(data)
+        return {"status_code": resp.status_code, "data": data, "error": err}
+
     def bulk_payout_batch(self, batch: PaymentBatch) -> dict:
         """
-        Sends ONE bulk transfer request for the entire batch.
-        Paystack will fan-out internally and webhook each transfer.
+        Sends the batch's pending transfers as transfer/bulk requests of at
+        most ``bulk_transfer_limit`` transfers each, submitted in parallel
+        with one idempotency key per chunk, derived from its transaction ids.
+        Recipient codes are resolved for
+        all users up front. Paystack fans out each chunk and webhooks every
+        transfer. One PayoutLog per chunk is written with a single bulk_create.
+
+        ``queued_tx_ids`` were accepted by Paystack; ``failed_tx_ids`` were
+        never sent (no recipient, bad amount or a rejected chunk).
+        ``bulk_codes`` has the batch code of every accepted chunk.
         """
         logger.info("PAYSTACK BULK PAYOUT batch=%s", batch.reference)
 
-        txs = batch.transactions.filter(status="pending")
+        txs = list(
+            batch.transactions.filter(status="pending")
+            .select_related("user__profile").order_by("id")
+        )
 
-        if not txs.exists():
+        if not txs:
             return {"success": False, "error": "no_pending_transactions"}
 
+        recipients = self.resolve_recipient_codes({tx.user_id: tx.user for tx in txs}.values())
+
         transfers = []
+        failed_tx_ids = []
 
         for tx in txs:
-            recipient = self.get_or_create_recipient_code(tx.user)
+            recipient = recipients.get(tx.user_id)
             if not recipient:
                 logger.error("Skipping tx %s: no recipient", tx.id)
+                failed_tx_ids.append(tx.id)
                 continue
 
             try:
@@ -278,90 +370,90 @@ class PaystackGateway(BaseGateway):
             except Exception:
                 logger.exception(
                     "Invalid amount for tx %s amount=%s", tx.id, tx.amount)
+                failed_tx_ids.append(tx.id)
                 continue
 
-            transfers.append({
+            transfers.append((tx.id, {
                 "amount": amount_kobo,
                 "recipient": recipient,
                 "reference": f"{batch.reference}:{tx.id}",
-                "reason": f"Payout for job {getattr(tx.job, 'id', '')}",
-            })
+                "reason": f"Payout for job {tx.job_id or ''}",
+            }))
 
         if not transfers:
-            return {"success": False, "error": "no_valid_transfers"}
+            return {"success": False, "error": "no_valid_transfers", "failed_tx_ids": failed_tx_ids}
+
+        chunks = [
+            transfers[i:i + self.bulk_transfer_limit]
+            for i in range(0, len(transfers), self.bulk_transfer_limit)
+        ]
+        payloads = [
+            {"source": "balance", "currency": "KES", "transfers": [t for _, t in chunk]}
+            for chunk in chunks
+        ]
+        keys = [
+            self._idempotency_key_for_batch(batch, [tx_id for tx_id, _ in chunk])
+            for chunk in chunks
+        ]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(self._post_bulk_chunk, payloads, keys))
 
-        payload = {
-            "source": "balance",
-            "currency": "KES",
-            "transfers": transfers,
-        }
-
-        url = f"{self.base_url}/transfer/bulk"
-        idem_key = self._idempotency_key_for_batch(batch)
-        headers = {"Idempotency-Key": idem_key}
-
-        log = None
         try:
-            print('working on creating logs for payment')
-            log = PayoutLog.objects.create(
-                batch=batch,
-                provider=self.provider_name,
-                endpoint="transfer/bulk",
-                request_payload=payload,
-                idempotency_key=idem_key,
-            )
+            PayoutLog.objects.bulk_create([
+                PayoutLog(
+                    batch=batch,
+                    provider=self.provider_name,
+                    endpoint="transfer/bulk",
+                    request_payload=payload,
+                    response_payload=result["data"],
+                    status_code=result["status_code"],
+                    error=result["error"],
+                    idempotency_key=key,
+                )
+                for payload, key, result in zip(payloads, keys, results)
+            ])
         except Exception:
             logger.exception(
-                "Failed creating batch PayoutLog batch=%s", batch.reference)
-
-        try:
-            resp = self.session.post(
-                url, json=payload, headers=headers, timeout=60)
-        except requests.RequestException as exc:
-            logger.exception(
-                "Paystack bulk payout HTTP error batch=%s", batch.reference)
-            if log:
-                log.error = str(exc)
-                log.save(update_fields=["error"])
-            return {"success": False, "raw": None, "error": str(exc)}
-
-        data = self._safe_json(resp)
-
-        if log:
-            try:
-                log.response_payload = data
-                log.status_code = resp.status_code
-                log.save(update_fields=["response_payload", "status_code"])
-            except Exception:
-                logger.exception(
-                    "Failed updating batch PayoutLog batch=%s", batch.reference)
+                "Failed creating batch PayoutLogs batch=%s", batch.reference)
+
+        queued_tx_ids = []
+        bulk_codes = []
+        queued = []
+        errors = []
+        for chunk, result in zip(chunks, results):
+            chunk_ids = [tx_id for tx_id, _ in chunk]
+            if result["error"]:
+                logger.error("Paystack bulk chunk failed batch=%s err=%s",
+                             batch.reference, result["error"])
+                failed_tx_ids += chunk_ids
+                errors.append(result["error"])
+                continue
 
-        # === FIXED BLOCK ===
-        if resp.status_code in (200, 201) and data.get("status"):
+            data = result["data"]
             # Paystack bulk response: data is a list, batch_code is in meta
-            bulk_code = data.get("meta", {}).get("batch_code")
-
-            # Optional: log individual transfers
-            for t in data.get("data", []):
-                logger.info(
-                    "Queued transfer | ref=%s code=%s status=%s",
-                    t.get("reference"),
-                    t.get("transfer_code"),
-                    t.get("status"),
-                )
-
-            return {
-                "success": True,
-                "bulk_code": bulk_code,
-                "raw": data,
-                "error": None,
-            }
-
-        err = data.get("message") or data.get("error") or str(data)
-        logger.error("Paystack bulk payout failed batch=%s err=%s",
-                    batch.reference, err)
-        return {"success": False, "raw": data, "error": err}
-
+            bulk_codes.append(data.get("meta", {}).get("batch_code"))
+            queued += data.get("data", [])
+            queued_tx_ids += chunk_ids
+
+        logger.info("Paystack bulk payout batch=%s chunks=%d queued=%d failed=%d",
+                    batch.reference, len(chunks), len(queued_tx_ids), len(failed_tx_ids))
+
+        if not queued_tx_ids:
+            return {"success": False, "raw": [r["data"] for r in results],
+                    "error": "; ".join(errors), "failed_tx_ids": failed_tx_ids}
+
+        return {
+            "success": True,
+            "bulk_code": bulk_codes[0],
+            "bulk_codes": bulk_codes,
+            # Same shape as a single transfer/bulk response
+            "raw": {"status": True, "data": queued,
+                    "meta": {"batch_code": bulk_codes[0], "batch_codes": bulk_codes}},
+            "queued_tx_ids": queued_tx_ids,
+            "failed_tx_ids": failed_tx_ids,
+            "error": "; ".join(errors) or None,
+        }
 
     # Webhook verification
 
@@ -0,0 +1,72 @@
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models import Chat
+
+# Saves, selection changes and payment verification invalidate entries in
+# the shared cache (see api.core.checks); the timeout only bounds staleness
+# from other bulk updates.
+CHAT_ACL_TIMEOUT = 600
+
+
+class ChatACL(namedtuple('ChatACL', [
+        'chat_id', 'slug', 'chat_uuid', 'client_user_id', 'freelancer_user_id', 'active'])):
+    __slots__ = ()
+
+    def allows(self, user):
+        user_id = getattr(user, 'pk', None)
+        return user_id is not None and user_id in (self.client_user_id, self.freelancer_user_id)
+
+
+def chat_acl_key(slug=None, chat_uuid=None):
+    return f'chat_acl:uuid:{chat_uuid}' if chat_uuid else f'chat_acl:slug:{slug}'
+
+
+def get_chat_acl(slug=None, chat_uuid=None):
+    """
+    Participants and active flag of the chat with ``slug`` or ``chat_uuid``,
+    or None if there is no such chat. Misses load it in one query and cache
+    it under both keys.
+    """
+    if chat_uuid:
+        # One spelling per chat, so invalidation reaches every cached entry
+        try:
+            chat_uuid = uuid.UUID(str(chat_uuid))
+        except ValueError:
+            return None
+
+    key = chat_acl_key(slug=slug, chat_uuid=chat_uuid)
+    acl = cache.get(key)
+    if acl is not None:
+        return acl
+
+    lookup = {'chat_uuid': chat_uuid} if chat_uuid else {'slug': slug}
+    row = Chat.objects.filter(**lookup).values_list(
+        'id', 'slug', 'chat_uuid', 'client__user_id', 'freelancer__user_id', 'active').first()
+    if row is None:
+        return None
+
+    acl = ChatACL(*row)
+    cache.set_many({
+        chat_acl_key(chat_uuid=acl.chat_uuid): acl,
+        chat_acl_key(slug=acl.slug): acl,
+    }, CHAT_ACL_TIMEOUT)
+    return acl
+
+
+def invalidate_chat_acl(chats):
+    """Drops entries for ``chats`` ((slug, chat_uuid) pairs) now and after commit."""
+    keys = []
+    for slug, chat_uuid in chats:
+        keys += [chat_acl_key(slug=slug), chat_acl_key(chat_uuid=chat_uuid)]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_chat_acl_for_job(job):
+    invalidate_chat_acl(Chat.objects.filter(job=job).values_list('slug', 'chat_uuid'))
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.core.realtime import publish
+
+GROUP_PREFIX = 'loadtest'
+
+
+def _subscriber(worker, group_names, expected, timeout, ready, results):
+    """Runs in its own process: joins ``group_names`` and counts what arrives."""
+    import django
+    django.setup()
+    from channels.layers import get_channel_layer
+
+    async def run():
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        for group in group_names:
+            await layer.group_add(group, channel)
+        ready.put(worker)
+
+        received, latencies = 0, []
+        deadline = time.monotonic() + timeout
+        while received < expected and time.monotonic() < deadline:
+            try:
+                event = await asyncio.wait_for(layer.receive(channel), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+            received += 1
+            latencies.append(time.time() - event['sent_at'])
+
+        for group in group_names:
+            await layer.group_discard(group, channel)
+        return received, latencies
+
+    received, latencies = asyncio.run(run())
+    results.put((worker, received, latencies))
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks that group messages published from this process reach consumers in '
+        'other processes through the configured channel layer, and reports throughput.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Subscriber processes.')
+        parser.add_argument('--groups', type=int, default=8, help='Groups, spread over the workers.')
+        parser.add_argument('--messages', type=int, default=250, help='Messages sent to each group.')
+        parser.add_argument('--batch', type=int, default=100, help='Events per publish() call.')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Seconds a worker waits.')
+
+    def handle(self, *args, **options):
+        backend = settings.CHANNEL_LAYERS['default']['BACKEND']
+        if backend.endswith('InMemoryChannelLayer'):
+            raise CommandError(
+                'The in-process channel layer cannot deliver across processes; '
+                'set CHANNEL_REDIS_URLS to load test the Redis layer.')
+
+        workers, group_count = options['workers'], options['groups']
+        per_group = options['messages']
+        groups = [f'{GROUP_PREFIX}_{i}' for i in range(group_count)]
+        assignments = {worker: groups[worker::workers] for worker in range(workers)}
+
+        self.stdout.write(self.style.NOTICE(
+            f'Starting {workers} subscribers on {backend} ({group_count} groups)...'))
+
+        # Children must not inherit open database connections
+        connections.close_all()
+        ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_subscriber, args=(
+                worker, assignments[worker], len(assignments[worker]) * per_group,
+                options['timeout'], ready, results))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get(timeout=options['timeout'])
+
+        events = [
+            (group, {'type': 'loadtest.message', 'seq': seq, 'sent_at': None})
+            for seq in range(per_group) for group in groups
+        ]
+        started = time.monotonic()
+        for start in range(0, len(events), options['batch']):
+            batch = events[start:start + options['batch']]
+            for _, event in batch:
+                event['sent_at'] = time.time()
+            publish(batch)
+        publish_seconds = time.monotonic() - started
+
+        outcome = {}
+        for _ in processes:
+            worker, received, latencies = results.get(timeout=options['timeout'] + 10)
+            outcome[worker] = (received, latencies)
+        elapsed = time.monotonic() - started
+        for process in processes:
+            process.join()
+
+        expected_total = sum(len(assignments[w]) for w in range(workers)) * per_group
+        delivered = sum(received for received, _ in outcome.values())
+        latencies = sorted(l for _, worker_latencies in outcome.values() for l in worker_latencies)
+
+        for worker in range(workers):
+            received, _ = outcome[worker]
+            expected = len(assignments[worker]) * per_group
+            self.stdout.write(f'  worker {worker}: {received}/{expected}')
+
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f'Published {len(events)} events in {publish_seconds:.2f}s; '
+                f'delivered {delivered} in {elapsed:.2f}s ({delivered / elapsed:.0f}/s); '
+                f'latency p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms')
+
+        if delivered != expected_total:
+            raise CommandError(f'Delivered {delivered} of {expected_total} messages.')
+        self.stdout.write(self.style.SUCCESS(f'All {delivered} messages delivered across processes.'))
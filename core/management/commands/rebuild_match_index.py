@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from accounts.models import FreelancerProfile
+from core.models import Job, JobSkillIndex, FreelancerSkillIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the job skill index and freelancer skill-id sets used by best-match.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Rebuilding job skill index...'))
+
+        job_count = 0
+        for job in Job.objects.all().iterator(chunk_size=500):
+            JobSkillIndex.rebuild_for_job(job)
+            job_count += 1
+
+        freelancer_count = 0
+        for freelancer in FreelancerProfile.objects.all().iterator(chunk_size=500):
+            FreelancerSkillIndex.rebuild_for_freelancer(freelancer)
+            freelancer_count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {job_count} jobs and {freelancer_count} freelancers.'))
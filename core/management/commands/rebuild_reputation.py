@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from core.models import Review, UserReputation
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the UserReputation summary rows from the Review table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only rebuild these user ids (repeatable).')
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+        if not user_ids:
+            # Everyone with a review or a stale summary row
+            user_ids = set(Review.objects.values_list('recipient_id', flat=True).distinct())
+            user_ids |= set(UserReputation.objects.values_list('user_id', flat=True))
+
+        self.stdout.write(self.style.NOTICE(f'Rebuilding reputation for {len(user_ids)} users...'))
+
+        existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        for user_id in sorted(existing):
+            UserReputation.rebuild_for_user(user_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(existing)} reputation rows.'))
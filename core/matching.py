@@ -1,46 +1,209 @@
-from django.db.models import Q
+from collections import defaultdict, namedtuple
 from datetime import datetime
 
-from accounts.models import FreelancerProfile
+import numpy as np
+from django.db.models import Q, Count, F
+
+from accounts.models import FreelancerProfile, ClientProfile
 from core.models import Job
 
+MATCH_WEIGHTS = {
+    'level': 25.0,
+    'skills': 25.0,
+    'availability': 20.0,
+    'rate': 15.0,
+    'languages': 10.0,
+    'experience': 5.0
+}
+
+# Column-oriented features for the batch scorer. Scalars are NumPy arrays in
+# row order; ``skills``/``languages`` are per-row lists of related ids.
+JobFeatures = namedtuple('JobFeatures', ['ids', 'level', 'price', 'skills', 'languages'])
+FreelancerFeatures = namedtuple('FreelancerFeatures', [
+    'ids', 'experience', 'rate', 'availability', 'skills', 'languages'])
+
+
+def load_job_features(jobs):
+    """
+    Loads the scoring features of every job in ``jobs`` with three queries,
+    regardless of how many jobs there are.
+    """
+    rows = list(jobs.values_list('id', 'preferred_freelancer_level', 'price', 'client_id'))
+    job_ids = jobs.values('pk')
+
+    skills = defaultdict(list)
+    for job_id, skill_id in Job.skills_required.through.objects.filter(
+            job_id__in=job_ids).values_list('job_id', 'skill_id'):
+        skills[job_id].append(skill_id)
+
+    client_languages = defaultdict(list)
+    for profile_id, language_id in ClientProfile.languages.through.objects.filter(
+            clientprofile__profile_id__in=jobs.values('client_id')
+    ).values_list('clientprofile__profile_id', 'language_id'):
+        client_languages[profile_id].append(language_id)
+
+    return JobFeatures(
+        ids=[row[0] for row in rows],
+        level=np.array([row[1] for row in rows], dtype=object),
+        price=np.array([float(row[2]) for row in rows], dtype=np.float64),
+        skills=[skills[row[0]] for row in rows],
+        languages=[client_languages[row[3]] for row in rows],
+    )
+
+
+def load_freelancer_features(freelancers):
+    """
+    Loads the scoring features of every freelancer profile in ``freelancers``
+    with three queries.
+    """
+    rows = list(freelancers.values_list('id', 'experience_years', 'hourly_rate', 'availability'))
+    freelancer_ids = freelancers.values('pk')
+
+    skills = defaultdict(list)
+    for freelancer_id, skill_id in FreelancerProfile.skills.through.objects.filter(
+            freelancerprofile_id__in=freelancer_ids).values_list('freelancerprofile_id', 'skill_id'):
+        skills[freelancer_id].append(skill_id)
+
+    languages = defaultdict(list)
+    for freelancer_id, language_id in FreelancerProfile.languages.through.objects.filter(
+            freelancerprofile_id__in=freelancer_ids).values_list('freelancerprofile_id', 'language_id'):
+        languages[freelancer_id].append(language_id)
+
+    return FreelancerFeatures(
+        ids=[row[0] for row in rows],
+        experience=np.array([row[1] for row in rows], dtype=np.int64),
+        rate=np.array([float(row[2]) for row in rows], dtype=np.float64),
+        availability=np.array([row[3] for row in rows], dtype=object),
+        skills=[skills[row[0]] for row in rows],
+        languages=[languages[row[0]] for row in rows],
+    )
+
+
+def _overlap(left, right):
+    """
+    Returns (overlap, left_sizes): the pairwise count of shared ids between
+    every left row and every right row, and the number of distinct ids per
+    left row.
+    """
+    vocabulary = {}
+    for items in left + right:
+        for item in items:
+            vocabulary.setdefault(item, len(vocabulary))
+
+    a = np.zeros((len(left), len(vocabulary)), dtype=np.int64)
+    b = np.zeros((len(right), len(vocabulary)), dtype=np.int64)
+    for row, items in enumerate(left):
+        a[row, [vocabulary[item] for item in items]] = 1
+    for row, items in enumerate(right):
+        b[row, [vocabulary[item] for item in items]] = 1
+
+    return a @ b.T, a.sum(axis=1)
+
+
+def _share_score(overlap, sizes, weight):
+    """min(overlap / size, 1) * weight wherever there is an overlap, else 0."""
+    ratio = np.divide(overlap, sizes[:, None], out=np.zeros(overlap.shape),
+                      where=sizes[:, None] > 0)
+    return np.where(overlap > 0, np.minimum(ratio, 1) * weight, 0.0)
+
+
+def score_matrix(jobs, freelancers):
+    """
+    Scores every (job, freelancer) pair at once.
+
+    Returns an int array of shape (len(jobs.ids), len(freelancers.ids)) holding
+    exactly what ``calculate_match_score`` returns for each pair. Components
+    are added in the same order as the scalar version so the float sums, and
+    therefore the rounding, are identical.
+    """
+    weights = MATCH_WEIGHTS
+    shape = (len(jobs.ids), len(freelancers.ids))
+    if not all(shape):
+        return np.zeros(shape, dtype=np.int64)
+
+    level = jobs.level[:, None]
+    experience = freelancers.experience[None, :]
+    full_level = (
+        ((level == 'entry') & (experience <= 2))
+        | ((level == 'intermediate') & (experience > 2) & (experience <= 5))
+        | ((level == 'expert') & (experience > 5))
+    )
+    score = np.zeros(shape)
+    score += np.where(full_level, weights['level'],
+                      np.where(level != 'entry', weights['level'] * 0.5, 0.0))
+
+    skill_overlap, job_skill_counts = _overlap(jobs.skills, freelancers.skills)
+    score += _share_score(skill_overlap, job_skill_counts, weights['skills'])
+
+    availability = freelancers.availability
+    score += np.select(
+        [availability == 'not_available',
+         availability == 'full_time',
+         (availability == 'part_time') | (availability == 'weekends')],
+        [0.0, weights['availability'], weights['availability'] * 0.7],
+        default=weights['availability'] * 0.5,
+    )[None, :]
+
+    budget = jobs.price[:, None]
+    rate = freelancers.rate[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        under_budget = np.minimum(weights['rate'] * (1 - (rate / budget)), weights['rate'])
+    under_budget = np.nan_to_num(under_budget, nan=0.0, posinf=0.0, neginf=0.0)
+    score += np.where(rate <= budget, under_budget,
+                      np.where(rate <= budget * 1.2, weights['rate'] * 0.5, 0.0))
+
+    language_overlap, job_language_counts = _overlap(jobs.languages, freelancers.languages)
+    score += _share_score(language_overlap, job_language_counts, weights['languages'])
+
+    score += (np.minimum(freelancers.experience / 10, 1) * weights['experience'])[None, :]
+
+    # np.rint rounds half to even, like the builtin round() used by calculate_match_score.
+    return np.minimum(np.rint(score), 100).astype(np.int64)
+
+
+def top_k(scores, k):
+    """
+    Indices of the ``k`` highest positive scores, best first. Ties keep their
+    input order, matching a stable descending sort of the same list.
+    """
+    candidates = np.flatnonzero(scores > 0)
+    if k <= 0 or not len(candidates):
+        return []
+
+    if len(candidates) > k:
+        kept = scores[candidates]
+        threshold = kept[np.argpartition(-kept, k - 1)[k - 1]]
+        candidates = candidates[kept >= threshold]
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:k].tolist()
+
+
 def match_freelancers_to_job(job, max_matches=5):
     """
     Matches only freelancers who have responded to the job.
     Returns a list of tuples: (freelancer_profile, score)
     """
-    # Get users who have responded to this job
-    responded_users = job.responses.values_list('user', flat=True)
-    
     # Filter freelancer profiles to only those who responded
     freelancer_profiles = FreelancerProfile.objects.filter(
         profile__user_type='freelancer',
-        profile__user__in=responded_users
-    ).select_related('profile').prefetch_related('skills', 'languages')
-    
-    matched_freelancers = []
-    
-    for freelancer in freelancer_profiles:
-        score = calculate_match_score(job, freelancer)
-        if score > 0:
-            matched_freelancers.append((freelancer, score))
-    
-    matched_freelancers.sort(key=lambda x: x[1], reverse=True)
-    return matched_freelancers[:max_matches]
+        profile__user__in=job.responses.values('user')
+    )
+
+    freelancers = load_freelancer_features(freelancer_profiles)
+    scores = score_matrix(load_job_features(Job.objects.filter(pk=job.pk)), freelancers)[0]
+    picked = [(freelancers.ids[i], int(scores[i])) for i in top_k(scores, max_matches)]
+
+    profiles = freelancer_profiles.select_related('profile').prefetch_related(
+        'skills', 'languages').in_bulk([pk for pk, _ in picked])
+    return [(profiles[pk], score) for pk, score in picked]
 
 def calculate_match_score(job, freelancer):
-    # This function remains unchanged from the previous corrected version
+    # Scalar reference for score_matrix; keep the two in step.
     score = 0.0
     max_score = 100.0
     
-    weights = {
-        'level': 25.0,
-        'skills': 25.0,
-        'availability': 20.0,
-        'rate': 15.0,
-        'languages': 10.0,
-        'experience': 5.0
-    }
+    weights = MATCH_WEIGHTS
     
     if job.preferred_freelancer_level == 'entry' and freelancer.experience_years <= 2:
         score += weights['level']
@@ -51,7 +214,7 @@ def calculate_match_score(job, freelancer):
     elif job.preferred_freelancer_level != 'entry':
         score += weights['level'] * 0.5
     
-    job_skills = set(job.category.split(','))
+    job_skills = set(skill.name for skill in job.skills_required.all())
     freelancer_skills = set(skill.name for skill in freelancer.skills.all())
     skill_overlap = len(job_skills.intersection(freelancer_skills))
     if skill_overlap > 0:
@@ -117,15 +280,15 @@ def recommend_jobs_to_freelancer(freelancer_profile, max_recommendations=5):
         status='open'
     ).exclude(
         responses__user=freelancer_profile.profile.user
-    ).select_related('client__client_profile')
+    ).alias(
+        num_responses=Count('responses')
+    ).filter(num_responses__lt=F('max_freelancers'))
 
-    
-    job_matches = []
-    for job in open_jobs:
-        if not job.is_max_freelancers_reached:
-            score = calculate_match_score(job, freelancer_profile)
-            if score > 0:
-                job_matches.append((job, score))
-    
-    job_matches.sort(key=lambda x: x[1], reverse=True)
-    return job_matches[:max_recommendations]
\ No newline at end of file
+    jobs = load_job_features(open_jobs)
+    freelancer = load_freelancer_features(FreelancerProfile.objects.filter(pk=freelancer_profile.pk))
+    scores = score_matrix(jobs, freelancer)[:, 0]
+    picked = [(jobs.ids[i], int(scores[i])) for i in top_k(scores, max_recommendations)]
+
+    job_objects = Job.objects.select_related('client__client_profile').in_bulk(
+        [pk for pk, _ in picked])
+    return [(job_objects[pk], score) for pk, score in picked]
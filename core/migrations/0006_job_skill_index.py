@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_job_skill_index(apps, schema_editor):
+    """
+    Populates JobSkillIndex from the existing skills_required rows.
+    Freelancer skill-id sets are built lazily on first best-match lookup.
+    """
+    Job = apps.get_model('core', 'Job')
+    JobSkillIndex = apps.get_model('core', 'JobSkillIndex')
+    Through = Job.skills_required.through
+
+    skills_by_job = {}
+    for job_id, skill_id in Through.objects.values_list('job_id', 'skill_id'):
+        skills_by_job.setdefault(job_id, []).append(skill_id)
+
+    JobSkillIndex.objects.bulk_create([
+        JobSkillIndex(job_id=job_id, skill_id=skill_id, job_skill_count=len(skill_ids))
+        for job_id, skill_ids in skills_by_job.items()
+        for skill_id in skill_ids
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_alter_skill_name'),
+        ('core', '0005_alter_response_cover_letter_alter_response_cv_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreelancerSkillIndex',
+            fields=[
+                ('freelancer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='skill_index', serialize=False, to='accounts.freelancerprofile')),
+                ('skill_ids', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobSkillIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_skill_count', models.PositiveSmallIntegerField(default=0, help_text='Total skills on the job, stored so the match ratio needs no extra COUNT')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_index', to='core.job')),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='job_index', to='accounts.skill')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['skill', 'job'], name='core_jobski_skill_i_19fad3_idx')],
+                'unique_together': {('job', 'skill')},
+            },
+        ),
+        migrations.RunPython(backfill_job_skill_index, reverse_code=migrations.RunPython.noop),
+    ]
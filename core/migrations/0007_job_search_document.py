@@ -0,0 +1,120 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+FTS_COLUMNS = 'title, skills, category, description'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE core_jobsearch_fts USING fts5(
+        {FTS_COLUMNS}, content='core_jobsearchdocument', content_rowid='job_id')""",
+    f"""CREATE TRIGGER core_jobsearch_fts_ai AFTER INSERT ON core_jobsearchdocument BEGIN
+        INSERT INTO core_jobsearch_fts(rowid, {FTS_COLUMNS})
+        VALUES (new.job_id, new.title, new.skills, new.category, new.description);
+    END""",
+    f"""CREATE TRIGGER core_jobsearch_fts_ad AFTER DELETE ON core_jobsearchdocument BEGIN
+        INSERT INTO core_jobsearch_fts(core_jobsearch_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.job_id, old.title, old.skills, old.category, old.description);
+    END""",
+    f"""CREATE TRIGGER core_jobsearch_fts_au AFTER UPDATE ON core_jobsearchdocument BEGIN
+        INSERT INTO core_jobsearch_fts(core_jobsearch_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.job_id, old.title, old.skills, old.category, old.description);
+        INSERT INTO core_jobsearch_fts(rowid, {FTS_COLUMNS})
+        VALUES (new.job_id, new.title, new.skills, new.category, new.description);
+    END""",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS core_jobsearch_fts_au",
+    "DROP TRIGGER IF EXISTS core_jobsearch_fts_ad",
+    "DROP TRIGGER IF EXISTS core_jobsearch_fts_ai",
+    "DROP TABLE IF EXISTS core_jobsearch_fts",
+]
+
+POSTGRES_FORWARD = [
+    """ALTER TABLE core_jobsearchdocument ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(skills, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(category, '')), 'C') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'D')
+        ) STORED""",
+    "CREATE INDEX core_jobsearch_vector_gin ON core_jobsearchdocument USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS core_jobsearch_vector_gin",
+    "ALTER TABLE core_jobsearchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_REVERSE)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
+
+
+def backfill_job_search_documents(apps, schema_editor):
+    """
+    Builds a search document for every existing job; the triggers / generated
+    column fill the backend index from these rows.
+    """
+    Job = apps.get_model('core', 'Job')
+    Skill = apps.get_model('accounts', 'Skill')
+    JobSearchDocument = apps.get_model('core', 'JobSearchDocument')
+
+    skill_labels = dict(Skill._meta.get_field('name').choices)
+    skills_by_job = {}
+    for job_id, name in Job.skills_required.through.objects.values_list('job_id', 'skill__name'):
+        skills_by_job.setdefault(job_id, []).append(f"{name} {skill_labels.get(name, name)}")
+
+    JobSearchDocument.objects.bulk_create([
+        JobSearchDocument(
+            job_id=job_id,
+            title=title or '',
+            skills=' '.join(skills_by_job.get(job_id, [])),
+            category=category or '',
+            description=description or '',
+        )
+        for job_id, title, category, description in Job.objects.values_list(
+            'id', 'title', 'category__name', 'description').iterator(chunk_size=1000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_job_skill_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobSearchDocument',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.job')),
+                ('title', models.TextField(blank=True)),
+                ('skills', models.TextField(blank=True)),
+                ('category', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_job_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0007_job_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserReputation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reputation', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('average_rating', models.FloatField(default=0.0)),
+                ('histogram', models.JSONField(blank=True, default=dict, help_text="Review count per star, keyed '1'..'5'")),
+                ('recent_review_ids', models.JSONField(blank=True, default=list, help_text='Newest first, at most RECENT_LIMIT')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Count
+
+# UserReputation.RECENT_LIMIT and STARS when this migration was written
+RECENT_LIMIT = 7
+STARS = ('1', '2', '3', '4', '5')
+
+
+def backfill_reputation(apps, schema_editor):
+    """
+    Builds the summary rows for reviews written before 0008. Rows the Review
+    signals created since are already current and are left alone.
+    """
+    Review = apps.get_model('core', 'Review')
+    UserReputation = apps.get_model('core', 'UserReputation')
+
+    histograms = {}
+    for recipient_id, rating, count in (
+            Review.objects.values('recipient_id', 'rating').annotate(count=Count('id'))
+            .order_by().values_list('recipient_id', 'rating', 'count')):
+        histograms.setdefault(recipient_id, {star: 0 for star in STARS})[str(rating)] = count
+
+    existing = set(UserReputation.objects.filter(
+        user_id__in=histograms).values_list('user_id', flat=True))
+    rows = []
+    for user_id, histogram in histograms.items():
+        if user_id in existing:
+            continue
+        review_count = sum(histogram.values())
+        rating_total = sum(int(star) * count for star, count in histogram.items())
+        rows.append(UserReputation(
+            user_id=user_id,
+            review_count=review_count,
+            rating_total=rating_total,
+            average_rating=rating_total / review_count,
+            histogram=histogram,
+            recent_review_ids=list(Review.objects.filter(recipient_id=user_id).order_by(
+                '-created_at', '-id').values_list('id', flat=True)[:RECENT_LIMIT]),
+        ))
+    UserReputation.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_notification_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_reputation, migrations.RunPython.noop),
+    ]
@@ -4,10 +4,11 @@ from cloudinary import api
 import cloudinary.uploader
 from django.db import models
 from django.conf import settings
-from django.db.models import Avg
+from django.db.models import Avg, Count, F, Max, Q
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from decimal import Decimal, ROUND_DOWN
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from accounts.models import Profile
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
@@ -16,7 +17,7 @@ from django.core.exceptions import ValidationError
 from django.utils.text import slugify
 from django.urls import reverse
 from datetime import timedelta
-from accounts.models import Skill
+from accounts.models import Skill, FreelancerProfile
 from django.utils.timezone import now
 from .choices import CATEGORY_CHOICES,APPLICATION_STATUS_CHOICES,JOB_STATUS_CHOICES,EXPERIENCE_LEVEL
 from PIL import Image
@@ -218,6 +219,108 @@ class Job(models.Model):
             return self.title or "Untitled Job"
 
 
+class JobSkillIndex(models.Model):
+    """
+    Denormalised (job, skill) pairs used by best-match lookups.
+    Kept in sync with Job.skills_required by the m2m signal in core.signals.
+    """
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='skill_index')
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='job_index')
+    job_skill_count = models.PositiveSmallIntegerField(
+        default=0, help_text="Total skills on the job, stored so the match ratio needs no extra COUNT")
+
+    class Meta:
+        unique_together = ('job', 'skill')
+        indexes = [
+            models.Index(fields=['skill', 'job']),
+        ]
+
+    @classmethod
+    def rebuild_for_job(cls, job):
+        skill_ids = list(job.skills_required.values_list('id', flat=True))
+        with transaction.atomic():
+            cls.objects.filter(job=job).delete()
+            cls.objects.bulk_create([
+                cls(job=job, skill_id=skill_id, job_skill_count=len(skill_ids))
+                for skill_id in skill_ids
+            ])
+
+    def __str__(self):
+        return f"{self.job_id} -> {self.skill_id}"
+
+
+class FreelancerSkillIndex(models.Model):
+    """
+    Normalised skill-id set for a freelancer.
+    A freelancer skill matches every Skill whose name contains it, which is the
+    same rule the old icontains matcher applied on every request.
+    """
+    freelancer = models.OneToOneField(
+        FreelancerProfile, on_delete=models.CASCADE, primary_key=True, related_name='skill_index')
+    skill_ids = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def resolve_skill_ids(skill_names):
+        names = [s.strip().lower() for s in skill_names if s and s.strip()]
+        if not names:
+            return []
+
+        skill_q = Q()
+        for name in names:
+            skill_q |= Q(name__icontains=name)
+        return sorted(Skill.objects.filter(skill_q).values_list('id', flat=True))
+
+    @classmethod
+    def rebuild_for_freelancer(cls, freelancer_profile):
+        skill_ids = cls.resolve_skill_ids(
+            freelancer_profile.skills.values_list('name', flat=True))
+        cls.objects.update_or_create(
+            freelancer=freelancer_profile, defaults={'skill_ids': skill_ids})
+        return skill_ids
+
+    @classmethod
+    def skill_ids_for(cls, freelancer_profile):
+        """Single primary-key lookup; builds the row on first use."""
+        skill_ids = cls.objects.filter(
+            pk=freelancer_profile.pk).values_list('skill_ids', flat=True).first()
+        if skill_ids is None:
+            skill_ids = cls.rebuild_for_freelancer(freelancer_profile)
+        return skill_ids
+
+    def __str__(self):
+        return f"Skill index for freelancer {self.freelancer_id}"
+
+
+class JobSearchDocument(models.Model):
+    """
+    Denormalised search text for a job, kept in sync by core.signals.
+    The backend index over it (a GIN tsvector column on PostgreSQL, an FTS5
+    table on SQLite) is created by migration and queried through core.search.
+    """
+    job = models.OneToOneField(
+        Job, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.TextField(blank=True)
+    skills = models.TextField(blank=True)
+    category = models.TextField(blank=True)
+    description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def rebuild_for_job(cls, job):
+        skills = ' '.join(
+            f"{skill.name} {skill.get_name_display()}" for skill in job.skills_required.all())
+        cls.objects.update_or_create(job=job, defaults={
+            'title': job.title or '',
+            'skills': skills,
+            'category': job.category.name if job.category_id else '',
+            'description': job.description or '',
+        })
+
+    def __str__(self):
+        return f"Search document for job {self.job_id}"
+
+
 class JobBookmark(models.Model):
     user = models.ForeignKey( User, on_delete=models.CASCADE, related_name='bookmarks')
     job = models.ForeignKey('Job', on_delete=models.CASCADE, related_name='bookmarked_by')
@@ -412,13 +515,14 @@ class Chat(models.Model):
     def get_last_message(self):
         return self.messages.order_by('-timestamp').first()
 
+    def participant_user_ids(self):
+        return [user_id for user_id in (
+            self.client.user_id, self.freelancer.user_id if self.freelancer else None) if user_id]
+
     def get_unread_count(self, user):
         if not self.can_access(user):
             return 0
-        other = self.get_other_participant(user)
-        if other:
-            return self.messages.filter(sender=other, is_read=False).count()
-        return 0
+        return ChatParticipantState.unread_for(self, user.pk)
 
     def archive(self):
         self.active = False
@@ -460,6 +564,90 @@ class Message(models.Model):
         return f"Message from {self.sender.username} at {self.timestamp}"
     
 
+class ChatParticipantState(models.Model):
+    """
+    Per-participant read state of a chat: how many messages from the other
+    side are unread and the newest message id the participant has read.
+    Counters move with F() updates on send and read, so neither path scans
+    the chat's messages.
+    """
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='participant_states')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_states')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_message = models.ForeignKey(
+        Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('chat', 'user')
+
+    @staticmethod
+    def _count_unread(chat_id, user_id):
+        return Message.objects.filter(chat_id=chat_id, is_read=False).exclude(sender_id=user_id).count()
+
+    @classmethod
+    def ensure_for_chat(cls, chat):
+        """Creates missing rows for the chat's participants, counting their unread messages."""
+        existing = set(cls.objects.filter(chat=chat).values_list('user_id', flat=True))
+        cls.objects.bulk_create([
+            cls(chat=chat, user_id=user_id, unread_count=cls._count_unread(chat.pk, user_id))
+            for user_id in chat.participant_user_ids() if user_id not in existing
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def unread_for(cls, chat, user_id):
+        count = cls.objects.filter(chat=chat, user_id=user_id).values_list('unread_count', flat=True).first()
+        if count is None:
+            cls.ensure_for_chat(chat)
+            count = cls._count_unread(chat.pk, user_id)
+        return count
+
+    @classmethod
+    def record_message(cls, message):
+        """Bumps the unread counter of every participant other than the sender."""
+        participants = Chat.objects.filter(pk=message.chat_id).values_list(
+            'client__user_id', 'freelancer__user_id').first() or ()
+        recipients = [user_id for user_id in participants if user_id and user_id != message.sender_id]
+        if not recipients:
+            return
+        updated = cls.objects.filter(chat_id=message.chat_id, user_id__in=recipients).update(
+            unread_count=F('unread_count') + 1)
+        if updated < len(recipients):
+            # Missing rows are counted from scratch, which includes this message
+            cls.ensure_for_chat(message.chat)
+
+    @classmethod
+    def mark_read_up_to(cls, chat_id, user_id, message_id=None):
+        """
+        Marks the other side's messages up to ``message_id`` (default: all)
+        as read in one UPDATE, lowers the unread counter by that many and
+        moves the read watermark forward. Returns the updated row, or None
+        when the chat has no such messages.
+        """
+        with transaction.atomic():
+            messages = Message.objects.filter(chat_id=chat_id)
+            if message_id is not None:
+                messages = messages.filter(id__lte=message_id)
+            # Clamp to a real message so the watermark foreign key holds
+            last_id = messages.aggregate(last=Max('id'))['last']
+            if last_id is None:
+                return None
+
+            marked = messages.filter(id__lte=last_id, is_read=False).exclude(
+                sender_id=user_id).update(is_read=True)
+            updated = cls.objects.filter(chat_id=chat_id, user_id=user_id).update(
+                unread_count=Greatest(F('unread_count') - marked, 0),
+                last_read_message_id=Greatest(Coalesce('last_read_message_id', 0), last_id),
+            )
+            if not updated:
+                cls.ensure_for_chat(Chat.objects.get(pk=chat_id))
+                cls.objects.filter(chat_id=chat_id, user_id=user_id).update(last_read_message_id=last_id)
+            return cls.objects.get(chat_id=chat_id, user_id=user_id)
+
+    def __str__(self):
+        return f"{self.user_id} in chat {self.chat_id}: {self.unread_count} unread"
+
+
 class MessageAttachment(models.Model):
     message = models.ForeignKey(
         'Message', on_delete=models.CASCADE, related_name='attachments')
@@ -531,6 +719,15 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     chat = models.ForeignKey(
         Chat, on_delete=models.CASCADE, null=True, blank=True)
+    # Template name for notifications sent through api.core.notifications;
+    # unread ones of the same kind collapse into a digest of digest_count
+    kind = models.CharField(max_length=50, blank=True, default='')
+    digest_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'kind', 'is_read'], name='notification_digest_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}"
@@ -558,11 +755,11 @@ class Review(models.Model):
         
     @classmethod
     def average_rating_for(cls, user):
-        return cls.objects.filter(recipient=user).aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0.0
+        return UserReputation.for_user(user).average_rating
 
     @classmethod
     def review_count_for(cls, user):
-        return cls.objects.filter(recipient=user).count()
+        return UserReputation.for_user(user).review_count
 
     @classmethod
     def reviews_for(cls, user):
@@ -570,12 +767,151 @@ class Review(models.Model):
 
     @classmethod
     def recent_reviews_for(cls, user, limit=7):
-        return cls.reviews_for(user)[:limit]
+        if limit > UserReputation.RECENT_LIMIT:
+            return cls.reviews_for(user)[:limit]
+        recent_ids = UserReputation.for_user(user).recent_review_ids[:limit]
+        return cls.objects.filter(pk__in=recent_ids).order_by('-created_at', '-id')
     
     def __str__(self):
         return f"{self.reviewer.username}'s review for {self.recipient.username}"
 
 
+class UserReputation(models.Model):
+    """
+    Review summary for a recipient, so reputation reads are a primary-key
+    lookup instead of fresh aggregates. Updated incrementally by the Review
+    signals in core.signals; `manage.py rebuild_reputation` recomputes it.
+    """
+    RECENT_LIMIT = 7
+    STARS = ('1', '2', '3', '4', '5')
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='reputation')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0.0)
+    histogram = models.JSONField(default=dict, blank=True, help_text="Review count per star, keyed '1'..'5'")
+    recent_review_ids = models.JSONField(default=list, blank=True, help_text="Newest first, at most RECENT_LIMIT")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def _recent_ids(cls, user_id):
+        return list(Review.objects.filter(recipient_id=user_id).order_by(
+            '-created_at', '-id').values_list('id', flat=True)[:cls.RECENT_LIMIT])
+
+    @classmethod
+    def rebuild_for_user(cls, user_id):
+        """
+        Recomputes the row from the Review table under its lock. Two first
+        rebuilds can race to insert it; the loser retries once and then
+        finds the winner's row.
+        """
+        try:
+            return cls._rebuild_locked(user_id)
+        except IntegrityError:
+            return cls._rebuild_locked(user_id)
+
+    @classmethod
+    def _rebuild_locked(cls, user_id):
+        with transaction.atomic():
+            reputation, _ = cls.objects.select_for_update().get_or_create(user_id=user_id)
+
+            histogram = {star: 0 for star in cls.STARS}
+            for rating, count in Review.objects.filter(recipient_id=user_id).values('rating').annotate(
+                    count=Count('id')).values_list('rating', 'count'):
+                histogram[str(rating)] = count
+
+            reputation.review_count = sum(histogram.values())
+            reputation.rating_total = sum(int(star) * count for star, count in histogram.items())
+            reputation.average_rating = (
+                reputation.rating_total / reputation.review_count if reputation.review_count else 0.0)
+            reputation.histogram = histogram
+            reputation.recent_review_ids = cls._recent_ids(user_id)
+            reputation.save()
+        return reputation
+
+    @classmethod
+    def for_user(cls, user):
+        user_id = getattr(user, 'pk', user)
+        return cls.bulk_for([user_id])[user_id]
+
+    @classmethod
+    def bulk_for(cls, user_ids):
+        """
+        {user_id: UserReputation} for every id in one primary-key query.
+        Users without a row and without reviews get an unsaved empty summary;
+        a missing row for a reviewed user is built on the spot.
+        """
+        user_ids = set(user_ids)
+        reputations = cls.objects.in_bulk(user_ids)
+        missing = user_ids - reputations.keys()
+        if missing:
+            reviewed = set(Review.objects.filter(
+                recipient_id__in=missing).values_list('recipient_id', flat=True).distinct())
+            for user_id in missing:
+                if user_id in reviewed:
+                    reputations[user_id] = cls.rebuild_for_user(user_id)
+                else:
+                    reputations[user_id] = cls(
+                        user_id=user_id, histogram={star: 0 for star in cls.STARS})
+        return reputations
+
+    @classmethod
+    def _locked(cls, user_id, build_missing=True):
+        """
+        The row locked for an incremental update, or None when there is none.
+        A missing row is built from scratch, which already reflects the change;
+        deletes skip that since the user may be going away in the same cascade.
+        """
+        reputation = cls.objects.select_for_update().filter(pk=user_id).first()
+        if reputation is None and build_missing:
+            cls.rebuild_for_user(user_id)
+        return reputation
+
+    def _apply(self, rating, delta):
+        star = str(rating)
+        self.histogram[star] = max(self.histogram.get(star, 0) + delta, 0)
+        self.review_count = max(self.review_count + delta, 0)
+        self.rating_total = max(self.rating_total + delta * rating, 0)
+        self.average_rating = self.rating_total / self.review_count if self.review_count else 0.0
+
+    @classmethod
+    def record_review(cls, review):
+        with transaction.atomic():
+            reputation = cls._locked(review.recipient_id)
+            if reputation is None:
+                return
+            reputation._apply(review.rating, 1)
+            reputation.recent_review_ids = (
+                [review.pk] + [pk for pk in reputation.recent_review_ids if pk != review.pk]
+            )[:cls.RECENT_LIMIT]
+            reputation.save()
+
+    @classmethod
+    def change_rating(cls, review, old_rating):
+        with transaction.atomic():
+            reputation = cls._locked(review.recipient_id)
+            if reputation is None:
+                return
+            reputation._apply(old_rating, -1)
+            reputation._apply(review.rating, 1)
+            reputation.save()
+
+    @classmethod
+    def forget_review(cls, review):
+        with transaction.atomic():
+            reputation = cls._locked(review.recipient_id, build_missing=False)
+            if reputation is None:
+                return
+            reputation._apply(review.rating, -1)
+            if review.pk in reputation.recent_review_ids:
+                reputation.recent_review_ids = cls._recent_ids(review.recipient_id)
+            reputation.save()
+
+    def __str__(self):
+        return f"Reputation for user {self.user_id}: {self.average_rating:.2f} ({self.review_count})"
+
+
 class ResponseAttachment(models.Model):
     response = models.ForeignKey(
         'Response',
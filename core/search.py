@@ -0,0 +1,69 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from core.models import Job, JobSearchDocument
+
+# Longer queries are truncated; every kept term must match.
+MAX_SEARCH_TERMS = 8
+
+FTS_TABLE = 'core_jobsearch_fts'
+
+# bm25 column weights for (title, skills, category, description) on SQLite,
+# mirroring the A/B/C/D setweight() order of the PostgreSQL tsvector.
+FTS_WEIGHTS = '10.0, 5.0, 3.0, 1.0'
+
+
+def parse_search_terms(query):
+    """Lowercased word tokens of ``query``; punctuation never reaches the SQL."""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_SEARCH_TERMS]
+
+
+def search_jobs(queryset, query):
+    """
+    Restricts ``queryset`` to jobs whose search document matches every term of
+    ``query`` (each term as a prefix) and annotates ``search_rank``, higher
+    meaning a better match. Returns ``queryset`` unchanged for an empty query.
+    """
+    terms = parse_search_terms(query)
+    if not terms:
+        return queryset
+
+    job_pk = f'{connection.ops.quote_name(Job._meta.db_table)}.{connection.ops.quote_name(Job._meta.pk.column)}'
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        table = JobSearchDocument._meta.db_table
+        matches = RawSQL(
+            f"SELECT job_id FROM {table} WHERE search_vector @@ to_tsquery('english', %s)",
+            [tsquery])
+        rank = RawSQL(
+            f"SELECT ts_rank(search_vector, to_tsquery('english', %s)) FROM {table} "
+            f"WHERE job_id = {job_pk}",
+            [tsquery], output_field=FloatField())
+
+    elif connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matches = RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {job_pk}",
+            [match], output_field=FloatField())
+
+    else:
+        # No native index: substring match over the same document, unranked
+        term_q = Q()
+        for term in terms:
+            term_q &= (
+                Q(search_document__title__icontains=term)
+                | Q(search_document__skills__icontains=term)
+                | Q(search_document__category__icontains=term)
+                | Q(search_document__description__icontains=term)
+            )
+        return queryset.filter(term_q).annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
@@ -9,12 +9,158 @@ from django.dispatch import receiver
 from decimal import Decimal
 from django.db import transaction
 from django.core.exceptions import ValidationError
-from django.db.models.signals import m2m_changed, post_save, pre_save
-
-from core.models import Job, Chat, Profile, Response, Message
+from django.db.models.signals import m2m_changed, post_save, pre_save, post_delete
+from django.db.models import Value
+from django.db.models.functions import Lower, Trim
+
+from core.models import (
+    Job, Chat, Profile, Response, Message, Review, UserReputation,
+    JobSkillIndex, FreelancerSkillIndex, JobSearchDocument, ChatParticipantState
+)
+from accounts.models import FreelancerProfile, Skill
+from core.chat_access import invalidate_chat_acl, invalidate_chat_acl_for_job
 from wallet.models import Rate, WalletTransaction, Rate, PaymentPeriod
 
 
+# Best-match index maintenance
+@receiver(m2m_changed, sender=Job.skills_required.through)
+def sync_job_skill_index(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        JobSkillIndex.rebuild_for_job(instance)
+        return
+
+    # Changed from the Skill side: instance is a Skill, pk_set holds job ids
+    if pk_set is None:
+        job_ids = JobSkillIndex.objects.filter(
+            skill=instance).values_list('job_id', flat=True)
+    else:
+        job_ids = pk_set
+    for job in Job.objects.filter(pk__in=list(job_ids)):
+        JobSkillIndex.rebuild_for_job(job)
+
+
+@receiver(m2m_changed, sender=FreelancerProfile.skills.through)
+def sync_freelancer_skill_index(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        FreelancerSkillIndex.rebuild_for_freelancer(instance)
+        return
+
+    # Changed from the Skill side; affected rows rebuild lazily on next lookup
+    stale = FreelancerSkillIndex.objects.all()
+    if pk_set is not None:
+        stale = stale.filter(freelancer_id__in=pk_set)
+    stale.delete()
+
+
+@receiver(pre_save, sender=Skill)
+def remember_previous_skill_name(sender, instance, **kwargs):
+    instance._previous_name = None
+    if instance.pk:
+        instance._previous_name = Skill.objects.filter(pk=instance.pk).values_list(
+            'name', flat=True).first()
+
+
+@receiver(post_save, sender=Skill)
+def invalidate_freelancer_skill_index(sender, instance, created, **kwargs):
+    # A freelancer skill matches every Skill whose name contains it (e.g.
+    # "java" -> "javascript"), so only freelancers with a skill contained in
+    # the old or new name are affected; their rows rebuild lazily on lookup
+    previous = getattr(instance, '_previous_name', None)
+    if not created and previous == instance.name:
+        return
+
+    skill_ids = set()
+    for name in {instance.name, previous} - {None}:
+        skill_ids.update(Skill.objects.alias(saved=Value(name.lower())).filter(
+            saved__contains=Lower(Trim('name'))).values_list('id', flat=True))
+    if skill_ids:
+        FreelancerSkillIndex.objects.filter(freelancer__skills__in=skill_ids).delete()
+
+
+# Job search document maintenance
+@receiver(post_save, sender=Job)
+def refresh_job_search_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    JobSearchDocument.rebuild_for_job(instance)
+
+
+@receiver(m2m_changed, sender=Job.skills_required.through)
+def sync_job_search_document_skills(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        JobSearchDocument.rebuild_for_job(instance)
+        return
+
+    # Changed from the Skill side; on clear pk_set is None and the affected
+    # jobs are those whose document still lists the skill
+    if pk_set is None:
+        jobs = Job.objects.filter(search_document__skills__icontains=instance.name)
+    else:
+        jobs = Job.objects.filter(pk__in=pk_set)
+    for job in jobs.select_related('category'):
+        JobSearchDocument.rebuild_for_job(job)
+
+
+# Reputation summary maintenance
+@receiver(pre_save, sender=Review)
+def remember_previous_review(sender, instance, **kwargs):
+    instance._previous_review = None
+    if instance.pk:
+        instance._previous_review = Review.objects.filter(pk=instance.pk).values_list(
+            'rating', 'recipient_id').first()
+
+
+@receiver(post_save, sender=Review)
+def update_reputation_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_review', None)
+    if created or previous is None:
+        UserReputation.record_review(instance)
+        return
+
+    old_rating, old_recipient_id = previous
+    if old_recipient_id != instance.recipient_id:
+        UserReputation.rebuild_for_user(old_recipient_id)
+        UserReputation.rebuild_for_user(instance.recipient_id)
+    elif old_rating != instance.rating:
+        UserReputation.change_rating(instance, old_rating)
+
+
+@receiver(post_delete, sender=Review)
+def update_reputation_on_review_delete(sender, instance, **kwargs):
+    UserReputation.forget_review(instance)
+
+
+# Chat read state maintenance
+@receiver(post_save, sender=Chat)
+def ensure_chat_participant_states(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ChatParticipantState.ensure_for_chat(instance)
+
+
+@receiver(post_save, sender=Chat)
+@receiver(post_delete, sender=Chat)
+def invalidate_chat_acl_on_change(sender, instance, **kwargs):
+    invalidate_chat_acl([(instance.slug, instance.chat_uuid)])
+
+
+@receiver(post_save, sender=Message)
+def count_unread_on_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ChatParticipantState.record_message(instance)
+
+
 # Reviewed responses logic
 @receiver(m2m_changed, sender=Job.reviewed_responses.through)
 def validate_and_update_reviewed_responses(sender, instance, action, pk_set, **kwargs):
@@ -50,6 +196,7 @@ def handle_selected_freelancers(sender, instance, action, pk_set, **kwargs):
         if action == "post_clear":
             # After full clear: deactivate ALL chats for this job
             Chat.objects.filter(job=job).update(active=False)
+            invalidate_chat_acl_for_job(job)
 
             # Clear assigned_at if no freelancers left (should be true after clear)
             if not job.selected_freelancers.exists():
@@ -90,6 +237,7 @@ def handle_selected_freelancers(sender, instance, action, pk_set, **kwargs):
             job=job,
             freelancer__in=profiles
         ).update(active=False)
+        invalidate_chat_acl_for_job(job)
 
         # If no freelancers remain after removal
         if not job.selected_freelancers.exists():
@@ -104,6 +252,7 @@ def handle_selected_freelancers(sender, instance, action, pk_set, **kwargs):
 def activate_chats_on_payment(sender, instance, created, **kwargs):
     if instance.payment_verified:
         Chat.objects.filter(job=instance).update(active=True)
+        invalidate_chat_acl_for_job(instance)
 
 
 # First chat message helper
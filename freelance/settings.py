@@ -1,6 +1,7 @@
 
 from datetime import timedelta
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 from django.contrib.messages import constants as messages
@@ -307,11 +308,51 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', 'arBuivRB1nmw')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# Channel layer: Redis pub/sub when CHANNEL_REDIS_URLS is set, so chat and
+# notification fan-out reaches consumers on every ASGI worker. Several
+# comma-separated URLs shard groups across Redis servers; each shard keeps
+# a connection pool of CHANNEL_REDIS_MAX_CONNECTIONS. Without it (and always
+# under `manage.py test`) the in-process layer is used.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CHANNEL_REDIS_URLS = [url.strip() for url in os.getenv('CHANNEL_REDIS_URLS', '').split(',') if url.strip()]
+
+if CHANNEL_REDIS_URLS and not TESTING:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+            "CONFIG": {
+                "hosts": [
+                    {
+                        "address": url,
+                        "max_connections": int(os.getenv('CHANNEL_REDIS_MAX_CONNECTIONS', '50')),
+                    }
+                    for url in CHANNEL_REDIS_URLS
+                ],
+                "prefix": "freelance",
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
+    }
+
+# Shared cache: dashboard snapshots and chat presence are read by every
+# worker, so a deployment running several of them needs CACHE_REDIS_URL
+# (the api.E001 system check enforces this once CHANNEL_REDIS_URLS is set).
+# Without it (and always under `manage.py test`) the per-process default is used.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+if CACHE_REDIS_URL and not TESTING:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            "KEY_PREFIX": "freelance",
+        }
     }
-}
 
 # for attachment files
 # DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
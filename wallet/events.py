@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent after commit when a payout batch settles, with ``batch``,
+# ``sent_user_ids`` and ``failed_user_ids``. Subscribers outside the wallet
+# app (notifications) hook in here instead of being imported by it.
+batch_settled = Signal()
+
+# Sent with ``user_ids`` after a bulk write to WalletTransaction, which
+# skips the post_save receivers that normally react to changes.
+transactions_bulk_updated = Signal()
@@ -0,0 +1,52 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from wallet.models import WebhookEvent
+from wallet.webhook.inbox import replay
+
+
+class Command(BaseCommand):
+    help = "Re-run stored webhook events (failed ones by default) through the inbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider', choices=['paystack', 'paypal'],
+            help='Only events from this provider'
+        )
+        parser.add_argument(
+            '--status', action='append', choices=['pending', 'processed', 'failed', 'rejected'],
+            help='Statuses to replay; repeat for several (default: failed)'
+        )
+        parser.add_argument(
+            '--id', action='append', type=int, dest='ids',
+            help='Replay these event ids regardless of status; repeat for several'
+        )
+        parser.add_argument(
+            '--hours', type=int,
+            help='Only events received in the last N hours'
+        )
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='Process here instead of queuing on the task cluster'
+        )
+
+    def handle(self, *args, **options):
+        events = WebhookEvent.objects.all()
+        if options['ids']:
+            events = events.filter(pk__in=options['ids'])
+        else:
+            events = events.filter(status__in=options['status'] or ['failed'])
+        if options['provider']:
+            events = events.filter(provider=options['provider'])
+        if options['hours']:
+            events = events.filter(received_at__gte=timezone.now() - timedelta(hours=options['hours']))
+
+        count = events.count()
+        if not count:
+            raise CommandError("No matching webhook events.")
+
+        references = replay(events, sync=options['sync'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {count} events across {references} references"
+            f"{'' if options['sync'] else ' (queued)'}."))
@@ -0,0 +1,93 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from wallet.models import WebhookEvent
+from wallet.webhook import inbox
+
+PROVIDER = 'benchmark'
+
+
+def _noop(payload, headers):
+    pass
+
+
+def _is_test_database():
+    name = str(connection.settings_dict['NAME'])
+    return name.startswith('test_') or name == ':memory:' or 'mode=memory' in name
+
+
+def _drain(references):
+    close_old_connections()
+    try:
+        return sum(inbox.process_reference(PROVIDER, reference, handler=_noop) for reference in references)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures webhook inbox throughput: inserts (including duplicate "
+        "redeliveries) and in-order processing with a no-op handler. "
+        "Benchmark rows are deleted afterwards, even when the run fails. "
+        "Refuses to write to a database that is not a test database "
+        "without --force."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000, help='Distinct events to ingest.')
+        parser.add_argument('--references', type=int, default=200, help='References the events spread over.')
+        parser.add_argument('--duplicates', type=float, default=0.1, help='Share of events delivered twice.')
+        parser.add_argument('--workers', type=int, default=4, help='Threads draining references.')
+        parser.add_argument('--force', action='store_true',
+                            help='Run against a database that is not a test database.')
+
+    def handle(self, *args, **options):
+        database = connection.settings_dict['NAME']
+        if not _is_test_database():
+            if not options['force']:
+                raise CommandError(
+                    f"{database} is not a test database; pass --force to write benchmark rows to it.")
+            self.stdout.write(self.style.WARNING(
+                f"Writing provider='{PROVIDER}' webhook events to {database}; they are deleted afterwards."))
+
+        events, references = options['events'], max(1, options['references'])
+        run = uuid.uuid4().hex[:8]
+        deliveries = [(f'{run}-{i}', f'{run}-ref-{i % references}') for i in range(events)]
+        deliveries += deliveries[:int(events * options['duplicates'])]
+
+        try:
+            # Queue nothing during ingest; the drain below is what is measured
+            enqueue, inbox.enqueue = inbox.enqueue, lambda provider, reference: None
+            try:
+                started = time.perf_counter()
+                stored = sum(
+                    inbox.record_event(PROVIDER, event_id, 'benchmark', reference, {'n': event_id}) is not None
+                    for event_id, reference in deliveries)
+                ingest = time.perf_counter() - started
+            finally:
+                inbox.enqueue = enqueue
+
+            refs = sorted({reference for _, reference in deliveries})
+            workers = max(1, options['workers'])
+            if workers > 1 and connection.vendor == 'sqlite':
+                # SQLite allows one writer at a time; concurrent drains only time out
+                self.stdout.write(self.style.WARNING("SQLite: draining with 1 worker."))
+                workers = 1
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                processed = sum(pool.map(_drain, [refs[i::workers] for i in range(workers)]))
+            drain = time.perf_counter() - started
+        finally:
+            WebhookEvent.objects.filter(provider=PROVIDER, event_id__startswith=run).delete()
+
+        self.stdout.write(
+            f"ingest:  {len(deliveries)} deliveries, {stored} stored, "
+            f"{len(deliveries) - stored} duplicates dropped in {ingest:.2f}s "
+            f"({len(deliveries) / ingest:.0f}/s)")
+        self.stdout.write(
+            f"process: {processed} events over {len(refs)} references with {workers} workers "
+            f"in {drain:.2f}s ({processed / drain if drain else 0:.0f}/s)")
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0012_webhook_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentbatch',
+            name='provider_references',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
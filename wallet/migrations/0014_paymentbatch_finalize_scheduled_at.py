@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0013_paymentbatch_provider_references'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentbatch',
+            name='finalize_scheduled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
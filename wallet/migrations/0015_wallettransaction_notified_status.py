@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+def mark_settled_batches_notified(apps, schema_editor):
+    # Batches that settled before this field existed were already announced
+    WalletTransaction = apps.get_model('wallet', 'WalletTransaction')
+    WalletTransaction.objects.filter(
+        batch__status__in=['completed', 'partial', 'failed'],
+        status__in=['completed', 'failed', 'cancelled'],
+    ).update(notified_status=models.F('status'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0014_paymentbatch_finalize_scheduled_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='notified_status',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(mark_settled_batches_notified, migrations.RunPython.noop),
+    ]
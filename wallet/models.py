@@ -108,6 +108,8 @@ class WalletTransaction(models.Model):
                                 null=True, blank=True, related_name='transactions')
     provider_reference = models.CharField(
         max_length=255, blank=True, null=True)
+    # Status the user was last notified of when the batch settled
+    notified_status = models.CharField(max_length=20, blank=True, default='')
 
     def __str__(self):
         return f"{self.user.username} - {self.transaction_type} - {self.transaction_id or 'N/A'}"
@@ -262,6 +264,9 @@ class PaymentBatch(models.Model):
         PaymentPeriod, on_delete=models.CASCADE, related_name='batches', null=True, blank=True)
     provider_reference = models.CharField(
         max_length=255, blank=True, null=True)
+    # Every provider batch code when the payout went out in several requests;
+    # provider_reference holds the first
+    provider_references = models.JSONField(default=list, blank=True)
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='payment_batches')
     total_amount = models.DecimalField(
@@ -271,6 +276,8 @@ class PaymentBatch(models.Model):
         ('pending', 'Pending'), ('processing', 'Processing'),('late','Late'),
         ('completed', 'Completed'), ('partial', 'Partial'), ('failed', 'Failed')])
     note = models.TextField(blank=True, null=True)
+    # Set while a deferred finalize run is scheduled; shared by every worker
+    finalize_scheduled_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
@@ -304,3 +311,43 @@ class PayoutLog(models.Model):
 
     def __str__(self):
         return f"PayoutLog {self.provider} {self.endpoint} [{self.id}]"
+
+
+class WebhookEvent(models.Model):
+    """
+    Inbox of provider webhooks, stored as received before any processing.
+    (provider, event_id) is unique, so redeliveries are dropped on insert.
+    Events of one reference are processed in arrival order.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+        ('rejected', 'Rejected'),
+    )
+
+    provider = models.CharField(max_length=20)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100, blank=True)
+    # Ordering key: the transfer code / invoice the event is about
+    reference = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField()
+    # Delivery headers the handler needs, e.g. signatures verified on the worker
+    headers = models.JSONField(default=dict, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['provider', 'reference', 'status'], name='webhook_event_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"WebhookEvent {self.provider} {self.event_type} [{self.event_id}]"
@@ -0,0 +1,59 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+
+from wallet.models import PaymentBatch, WalletTransaction
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows claimed per transaction; each chunk commits and releases its locks
+BATCH_ASSEMBLY_CHUNK_SIZE = 1000
+
+
+def eligible_transactions(provider: str, period_id=None):
+    """Pending, unbatched payouts of completed jobs for ``provider``."""
+    qs = WalletTransaction.objects.filter(
+        status="pending",
+        batch__isnull=True,
+        payment_type=provider,
+        payment_period__isnull=False,
+        job__status="completed",
+    )
+    if period_id is not None:
+        qs = qs.filter(payment_period_id=period_id)
+    return qs
+
+
+def claim_transactions(batch: PaymentBatch, chunk_size: int = BATCH_ASSEMBLY_CHUNK_SIZE) -> int:
+    """
+    Attaches the eligible transactions of the batch's provider and period
+    to it, ``chunk_size`` rows per transaction: lock a chunk with SKIP LOCKED,
+    one UPDATE setting batch_id, one SUM added to the batch total. Rows a
+    concurrent worker holds are skipped rather than waited on.
+    Returns the number of transactions claimed.
+    """
+    claimed = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                eligible_transactions(batch.provider, batch.period_id)
+                .select_for_update(skip_locked=True, of=("self",))
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not ids:
+                return claimed
+
+            count = WalletTransaction.objects.filter(
+                id__in=ids, batch__isnull=True).update(batch=batch)
+            total = WalletTransaction.objects.filter(
+                id__in=ids, batch=batch).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
+            PaymentBatch.objects.filter(pk=batch.pk).update(
+                total_amount=F("total_amount") + total)
+
+        claimed += count
+        logger.info("Batch %s claimed %d transactions (%s)", batch.reference, count, total)
+        if len(ids) < chunk_size:
+            return claimed
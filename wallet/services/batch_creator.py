@@ -1,11 +1,9 @@
-from decimal import Decimal
-from django.db import transaction
 from django.contrib.auth.models import User
 
-from wallet.models import PaymentBatch, WalletTransaction, PaymentPeriod
+from wallet.models import PaymentBatch, PaymentPeriod
+from wallet.services.batch_assembly import eligible_transactions, claim_transactions
 
 
-@transaction.atomic
 def create_payment_batch(
     *,
     admin_user: User,
@@ -14,21 +12,11 @@ def create_payment_batch(
 ) -> PaymentBatch:
     """
     Create a PaymentBatch and attach eligible WalletTransactions.
+    Transactions are claimed in committed chunks (see claim_transactions),
+    so a large period never holds all of its row locks at once.
     """
 
-    txs = (
-        WalletTransaction.objects
-        .select_for_update()
-        .filter(
-            status="pending",
-            batch__isnull=True,
-            payment_period=period,
-            payment_type=provider,
-            job__status="completed",
-        )
-    )
-
-    if not txs.exists():
+    if not eligible_transactions(provider, period.pk).exists():
         raise ValueError("No eligible transactions for this period")
 
     batch = PaymentBatch.objects.create(
@@ -38,14 +26,10 @@ def create_payment_batch(
         status="pending",
     )
 
-    total = Decimal("0.00")
-
-    for tx in txs:
-        tx.batch = batch
-        tx.save(update_fields=["batch"])
-        total += tx.amount or Decimal("0.00")
-
-    batch.total_amount = total
-    batch.save(update_fields=["total_amount"])
+    if not claim_transactions(batch):
+        # Another worker claimed them between the check and the claim
+        batch.delete()
+        raise ValueError("No eligible transactions for this period")
 
+    batch.refresh_from_db(fields=["total_amount"])
     return batch
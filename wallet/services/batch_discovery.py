@@ -2,32 +2,15 @@ from decimal import Decimal
 from django.contrib.auth import get_user_model
 from django.db import transaction
 
-from wallet.models import WalletTransaction, PaymentBatch
+from wallet.models import PaymentBatch
+from wallet.services.batch_assembly import eligible_transactions, claim_transactions
 
 User = get_user_model()
 
 
-@transaction.atomic
-def auto_discover_batches(provider="paystack"):
-    system_user = (
-        User.objects.filter(is_superuser=True).first()
-        or User.objects.filter(is_staff=True).first()
-    )
-
-    base_qs = (
-        WalletTransaction.objects
-        .select_for_update()
-        .filter(
-            status="pending",
-            batch__isnull=True,
-            payment_period__isnull=False,
-            job__status="completed",
-        )
-    )
-
-    period_ids = base_qs.values_list("payment_period_id", flat=True).distinct()
-
-    for period_id in period_ids:
+def _open_batch(provider, period_id, system_user):
+    """The batch new transactions of the period go into, and whether it was just created."""
+    with transaction.atomic():
         # Find the most recent batch for this period/provider
         last_batch = (
             PaymentBatch.objects
@@ -40,46 +23,55 @@ def auto_discover_batches(provider="paystack"):
         # Decide whether we reuse or create a new one
         if last_batch and last_batch.provider_reference and last_batch.status == "completed":
             # Period already paid → create a new "late" batch
-            batch = PaymentBatch.objects.create(
+            return PaymentBatch.objects.create(
                 provider=provider,
                 period_id=period_id,
                 user=system_user,
                 status="late",
                 note="Late jobs completed after initial batch was paid.",
                 total_amount=Decimal("0.00"),
-            )
-        else:
-            # Reuse existing open batch or create a normal one
-            batch = last_batch
-            if not batch:
-                batch = PaymentBatch.objects.create(
-                    provider=provider,
-                    period_id=period_id,
-                    user=system_user,
-                    status="pending",
-                    total_amount=Decimal("0.00"),
-                )
+            ), True
 
-        txs = (
-            WalletTransaction.objects
-            .select_for_update()
-            .filter(
-                status="pending",
-                batch__isnull=True,
-                payment_period_id=period_id,
-                job__status="completed",
-            )
-        )
+        # Reuse existing open batch or create a normal one
+        if last_batch:
+            return last_batch, False
+        return PaymentBatch.objects.create(
+            provider=provider,
+            period_id=period_id,
+            user=system_user,
+            status="pending",
+            total_amount=Decimal("0.00"),
+        ), True
 
-        if not txs.exists():
-            continue
 
-        total = batch.total_amount or Decimal("0.00")
+def auto_discover_batches(provider="paystack"):
+    """
+    Assigns every eligible transaction of ``provider`` to a batch of its
+    period. The eligibility query runs once for the periods, then each
+    period is claimed in chunks with SKIP LOCKED, so several workers can
+    run discovery at the same time and split the rows between them.
+    Returns the batches that received transactions.
+    """
+    system_user = (
+        User.objects.filter(is_superuser=True).first()
+        or User.objects.filter(is_staff=True).first()
+    )
 
-        for tx in txs:
-            tx.batch = batch
-            tx.save(update_fields=["batch"])
-            total += tx.amount or Decimal("0.00")
+    period_ids = list(
+        eligible_transactions(provider)
+        .order_by()
+        .values_list("payment_period_id", flat=True)
+        .distinct()
+    )
+
+    batches = []
+    for period_id in period_ids:
+        batch, created = _open_batch(provider, period_id, system_user)
+        if claim_transactions(batch):
+            batch.refresh_from_db(fields=["total_amount"])
+            batches.append(batch)
+        elif created:
+            # Everything went to a concurrent worker
+            batch.delete()
 
-        batch.total_amount = total
-        batch.save(update_fields=["total_amount"])
+    return batches
@@ -1,17 +1,59 @@
+from datetime import timedelta
 from decimal import Decimal
+from django.conf import settings
 from django.db import models
 from django.db import transaction
+from django.utils import timezone
+from wallet.events import batch_settled
 from wallet.models import PaymentBatch,WalletTransaction
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Webhooks for a batch arrive in bursts; finalize once the burst settles.
+# A scheduled run older than ten delays counts as lost, so it does not keep
+# later webhooks from scheduling another.
+BATCH_FINALIZE_DELAY = getattr(settings, "BATCH_FINALIZE_DELAY", 30)
+
+
+# Statuses a batch settles in; freelancers are notified of their transactions then
+SETTLED_BATCH_STATUSES = ("completed", "partial", "failed")
+
+
+def announce_batch_outcome(batch: PaymentBatch) -> None:
+    """
+    Sends batch_settled after commit with the freelancers whose settled
+    transactions they have not been told about yet, then records what they
+    were told. Finalizing again, or a partial batch completing later, only
+    announces transactions whose status changed since. Runs inside the
+    caller's transaction, which the row locks belong to.
+    """
+    if batch.status not in SETTLED_BATCH_STATUSES:
+        return
+
+    rows = list(
+        WalletTransaction.objects.select_for_update()
+        .filter(batch=batch, status__in=["completed", "failed", "cancelled"])
+        .exclude(notified_status=models.F("status"))
+        .values_list("id", "user_id", "status")
+    )
+    if not rows:
+        return
+    WalletTransaction.objects.filter(id__in=[row[0] for row in rows]).update(
+        notified_status=models.F("status"))
+
+    sent = {user_id for _, user_id, status in rows if status == "completed"}
+    failed = {user_id for _, user_id, status in rows if status != "completed"}
+    transaction.on_commit(lambda: batch_settled.send(
+        sender=PaymentBatch, batch=batch, sent_user_ids=sent, failed_user_ids=failed))
+
 
 def finalize_batch_status(batch: PaymentBatch) -> None:
     """
     Checks current state of transactions in the batch and updates batch status.
-    Call this after every individual tx update (from webhook).
+    Counts and total come from one conditional aggregation. Webhooks call
+    mark_batch_dirty instead, so this runs once per burst of transfers.
     """
     if not batch:
         return
@@ -26,13 +68,20 @@ def finalize_batch_status(batch: PaymentBatch) -> None:
 
         qs = WalletTransaction.objects.filter(batch=batch)
 
-        total_tx = qs.count()
-        if total_tx == 0:
+        counts = qs.aggregate(
+            total_tx=models.Count("id"),
+            # Sent transfers stay in_progress until their webhook arrives
+            pending=models.Count("id", filter=models.Q(status__in=["pending", "in_progress"])),
+            completed=models.Count("id", filter=models.Q(status="completed")),
+            failed=models.Count("id", filter=models.Q(status__in=["failed", "cancelled"])),
+            amount=models.Sum("amount"),
+        )
+        if counts["total_tx"] == 0:
             return
 
-        pending = qs.filter(status="pending").count()
-        completed = qs.filter(status="completed").count()
-        failed = qs.filter(status__in=["failed", "cancelled"]).count()
+        pending = counts["pending"]
+        completed = counts["completed"]
+        failed = counts["failed"]
 
         # Update batch status
         if pending == 0:
@@ -53,13 +102,45 @@ def finalize_batch_status(batch: PaymentBatch) -> None:
 
         # update total_amount if not already set
         if batch.total_amount == Decimal("0.00"):
-            batch.total_amount = qs.aggregate(
-                total=models.Sum("amount")
-            )["total"] or Decimal("0.00")
-
-        # store the batch reference from Paystack if available
+            batch.total_amount = counts["amount"] or Decimal("0.00")
 
         batch.save(update_fields=["status", "total_amount"])
 
+        announce_batch_outcome(batch)
+
         logger.info("Batch %s finalized to status=%s (pending=%d, completed=%d, failed=%d)",
                     batch.reference, batch.status, pending, completed, failed)
+
+
+def mark_batch_dirty(batch_id) -> bool:
+    """
+    Asks for the batch to be finalized once BATCH_FINALIZE_DELAY seconds
+    from now. Calls while a run is already pending coalesce into it, so a
+    burst of webhooks costs one finalize instead of one per transfer.
+    The pending run is claimed with a conditional UPDATE of
+    finalize_scheduled_at, so workers in any process agree on it.
+    Returns True if this call scheduled the run.
+    """
+    now = timezone.now()
+    claimed = PaymentBatch.objects.filter(pk=batch_id).filter(
+        models.Q(finalize_scheduled_at__isnull=True)
+        | models.Q(finalize_scheduled_at__lt=now - timedelta(seconds=BATCH_FINALIZE_DELAY * 10))
+    ).update(finalize_scheduled_at=now)
+    if not claimed:
+        return False
+
+    from django_q.tasks import schedule
+    schedule(
+        "wallet.services.batch_finalizer.finalize_dirty_batch",
+        str(batch_id),
+        next_run=timezone.now() + timedelta(seconds=BATCH_FINALIZE_DELAY),
+    )
+    return True
+
+
+def finalize_dirty_batch(batch_id) -> None:
+    """The deferred run scheduled by mark_batch_dirty."""
+    # Cleared first: webhooks landing during this run schedule the next one
+    PaymentBatch.objects.filter(pk=batch_id).update(finalize_scheduled_at=None)
+    batch = PaymentBatch.objects.filter(pk=batch_id).first()
+    finalize_batch_status(batch)
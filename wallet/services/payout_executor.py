@@ -39,10 +39,16 @@ def execute_batch_payout(batch: PaymentBatch):
     # ---- COMMIT SUCCESS STATE ----
     with transaction.atomic():
         batch.provider_reference = result["bulk_code"]
+        batch.provider_references = result.get("bulk_codes") or [result["bulk_code"]]
         batch.status = "processing"
-        batch.save(update_fields=["provider_reference", "status"])
-
-        batch.transactions.filter(id__in=tx_ids).update(status="in_progress")
+        batch.save(update_fields=["provider_reference", "provider_references", "status"])
+
+        # Only what Paystack accepted is in flight; the rest was never sent
+        queued = result.get("queued_tx_ids", tx_ids)
+        batch.transactions.filter(id__in=queued).update(status="in_progress")
+        failed = result.get("failed_tx_ids")
+        if failed:
+            batch.transactions.filter(id__in=failed).update(status="failed")
 
     # CREATE PAYOULOG
     PayoutLog.objects.create(
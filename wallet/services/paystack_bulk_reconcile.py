@@ -1,40 +1,50 @@
 import logging
 from django.db import transaction
+from wallet.events import transactions_bulk_updated
 from wallet.models import WalletTransaction, PaymentBatch
-from accounts.models import Profile
+from wallet.services.batch_finalizer import announce_batch_outcome
 
 
 logger = logging.getLogger(__name__)
 
 
-def find_transfer_by_recipient(recipient, transfers):
+def index_transfers(transfers):
     """
-    Search for a transfer dictionary by recipient in the nested transfers dictionary.
-    
-    Args:
-        recipient (str): The recipient value to search for.
-        transfers (dict): The nested dictionary containing transfer data.
-        
-    Returns:
-        dict or None: The dictionary for the matching recipient, or None if not found.
+    Indexes a bulk transfer response by recipient and by reference
+    (``batch.reference:tx.id``). The first transfer wins for a recipient.
     """
+    by_recipient = {}
+    by_reference = {}
     for transfer in transfers.get("data", []):
-        if transfer.get("recipient") == recipient:
-            return transfer
-    return None
+        recipient = transfer.get("recipient")
+        if recipient is not None:
+            by_recipient.setdefault(recipient, transfer)
+        reference = transfer.get("reference")
+        if reference is not None:
+            by_reference[reference] = transfer
+    return by_recipient, by_reference
 
 
 def reconcile_paystack_batch(batch: PaymentBatch, paystack_response: dict):
+    """
+    Marks the batch's transactions completed from a transfer/bulk response.
+    Transactions and profiles load in one query, each is matched against
+    the indexed response and all changes are written with one bulk_update.
+    Transfers are matched on their reference; only a response without any
+    references falls back to the user's recipient code. Transactions that
+    already failed are left alone.
+    """
     logger.info(
         "[PaystackReconcile] Starting | batch_id=%s",
         batch.id
     )
 
-    qs = WalletTransaction.objects.select_related(
-        "user", "user__profile"
-    ).filter(batch=batch)
+    txs = list(
+        WalletTransaction.objects.select_related("user__profile")
+        .filter(batch=batch).order_by("id")
+    )
 
-    if not qs.exists():
+    if not txs:
         logger.error(
             "[PaystackReconcile] No transactions found | batch_id=%s",
             batch.id
@@ -45,60 +55,77 @@ def reconcile_paystack_batch(batch: PaymentBatch, paystack_response: dict):
             "errors": ["No WalletTransactions found for this batch."]
         }
 
+    by_recipient, by_reference = index_transfers(paystack_response)
+    # A response with references is authoritative: a transaction whose
+    # reference is missing was not paid, even if its recipient was
+    if by_reference:
+        by_recipient = {}
+
+    by_user = {}
+    for tx in txs:
+        by_user.setdefault(tx.user_id, []).append(tx)
+
     updated = 0
     skipped = 0
     errors = []
-
-    users = set(qs.values_list("user_id", flat=True))
-
-    with transaction.atomic():
-        for user_id in users:
-            user_txs = qs.filter(user_id=user_id)
-            user = user_txs.first().user
-            profile = getattr(user, "profile", None)
-
-            if not profile or not profile.paystack_recipient:
-                msg = f"User {user_id} missing paystack_recipient"
-                logger.warning("[PaystackReconcile] %s", msg)
-                skipped += user_txs.count()
-                errors.append(msg)
+    changed = []
+
+    for user_id, user_txs in by_user.items():
+        profile = getattr(user_txs[0].user, "profile", None)
+
+        if not profile or not profile.paystack_recipient:
+            msg = f"User {user_id} missing paystack_recipient"
+            logger.warning("[PaystackReconcile] %s", msg)
+            skipped += len(user_txs)
+            errors.append(msg)
+            continue
+
+        recipient_transfer = by_recipient.get(profile.paystack_recipient)
+        if not recipient_transfer and not any(
+                f"{batch.reference}:{tx.id}" in by_reference for tx in user_txs):
+            msg = f"No transfer for recipient {profile.paystack_recipient}"
+            logger.warning("[PaystackReconcile] %s", msg)
+            skipped += len(user_txs)
+            errors.append(msg)
+            continue
+
+        for tx in user_txs:
+            if tx.status == "failed":
+                skipped += 1
+                errors.append(f"Transaction {tx.id} already failed")
                 continue
 
-            transfer = find_transfer_by_recipient(
-                profile.paystack_recipient,
-                paystack_response
-            )
-
+            transfer = by_reference.get(f"{batch.reference}:{tx.id}") or recipient_transfer
             if not transfer:
-                msg = f"No transfer for recipient {profile.paystack_recipient}"
-                logger.warning("[PaystackReconcile] %s", msg)
-                skipped += user_txs.count()
-                errors.append(msg)
+                skipped += 1
+                errors.append(f"No transfer for transaction {tx.id}")
                 continue
 
-            for tx in user_txs:
-                tx.transaction_type = "payment_received"
-                tx.status = "completed"
-                tx.completed = True
-
-                tx.provider_reference = transfer.get("transfer_code")
-                tx.extra_data = transfer
-
-                tx.save(update_fields=[
-                    "transaction_type",
-                    "status",
-                    "completed",
-                    "provider_reference",
-                    "extra_data",
-                ])
+            tx.transaction_type = "payment_received"
+            tx.status = "completed"
+            tx.completed = True
+            tx.provider_reference = transfer.get("transfer_code")
+            tx.extra_data = transfer
+            changed.append(tx)
+            updated += 1
 
-                updated += 1
+        logger.info(
+            "[PaystackReconcile] User reconciled | user_id=%s tx_count=%s",
+            user_id,
+            len(user_txs)
+        )
 
-            logger.info(
-                "[PaystackReconcile] User reconciled | user_id=%s tx_count=%s",
-                user_id,
-                user_txs.count()
-            )
+    with transaction.atomic():
+        WalletTransaction.objects.bulk_update(changed, [
+            "transaction_type",
+            "status",
+            "completed",
+            "provider_reference",
+            "extra_data",
+        ], batch_size=500)
+        # bulk_update sends no post_save
+        transactions_bulk_updated.send(
+            sender=WalletTransaction, user_ids={tx.user_id for tx in changed})
 
         # Batch status
         if updated and skipped == 0:
@@ -108,10 +135,14 @@ def reconcile_paystack_batch(batch: PaymentBatch, paystack_response: dict):
         else:
             batch.status = "failed"
 
-        batch.provider_reference = paystack_response.get(
-            "meta", {}).get("batch_code")
+        meta = paystack_response.get("meta", {})
+        batch.provider_reference = meta.get("batch_code")
+        # Merged multi-chunk responses carry every code in batch_codes
+        batch.provider_references = meta.get("batch_codes") or (
+            [batch.provider_reference] if batch.provider_reference else [])
 
-        batch.save(update_fields=["status", "provider_reference"])
+        batch.save(update_fields=["status", "provider_reference", "provider_references"])
+        announce_batch_outcome(batch)
 
         logger.info(
             "[PaystackReconcile] Batch finalized | batch_id=%s status=%s updated=%s skipped=%s",
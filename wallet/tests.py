@@ -1,3 +1,530 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import Profile, User
+from api.payments.views import capture_paypal_payment
+from api.wallet.gateways.paystack import PaystackGateway
+from core.models import Job, JobCategory
+from payments.models import PaypalPayments
+from wallet.models import PaymentBatch, PaymentPeriod, PayoutLog, WalletTransaction, WebhookEvent
+from wallet.services.batch_assembly import claim_transactions
+from wallet.services.batch_creator import create_payment_batch
+from wallet.services.batch_discovery import auto_discover_batches
+from wallet.services.batch_finalizer import (
+    BATCH_FINALIZE_DELAY, finalize_batch_status, finalize_dirty_batch, mark_batch_dirty)
+from wallet.services.paystack_bulk_reconcile import reconcile_paystack_batch
+from wallet.webhook.inbox import process_reference, record_event
+
+
+class WalletFixturesBase(APITestCase):
+    """A client, a freelancer and completed jobs to hang wallet transactions on."""
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = User.objects.create_user(username='client', password='testpass')
+        self.freelancer_user = User.objects.create_user(username='freelancer', password='testpass')
+        self.category = JobCategory.objects.create(name='web_dev')
+
+    def make_job(self, title, status='completed'):
+        return Job.objects.create(
+            title=title,
+            description=f'{title} description',
+            category=self.category,
+            price=100,
+            deadline_date=timezone.now() + timedelta(days=30),
+            client=self.client_user.profile,
+            status=status,
+        )
+
+
+class BatchAssemblyTest(WalletFixturesBase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.now().date()
+        self.period = PaymentPeriod.objects.create(
+            name='Current', start_date=today - timedelta(days=3), end_date=today + timedelta(days=3))
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.txs = [
+            WalletTransaction.objects.create(
+                user=self.freelancer_user, job=self.make_job(f'Paid job {i}'),
+                transaction_type='payment_received',
+                payment_type='paystack', amount=Decimal(amount), payment_period=self.period)
+            for i, amount in enumerate(('10.00', '20.00', '30.50', '5.25', '4.25'))
+        ]
+        self.paypal_tx = WalletTransaction.objects.create(
+            user=self.freelancer_user, job=self.make_job('PayPal job'),
+            transaction_type='payment_received',
+            payment_type='paypal', amount=Decimal('99.00'), payment_period=self.period)
+
+    def test_claims_in_chunks_with_set_based_updates(self):
+        batch = PaymentBatch.objects.create(provider='paystack', period=self.period, user=self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            claimed = claim_transactions(batch, chunk_size=2)
+        self.assertEqual(claimed, 5)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "wallet_wallettransaction"')]
+        self.assertEqual(len(updates), 3)
+        batch.refresh_from_db()
+        self.assertEqual(batch.total_amount, Decimal('70.00'))
+        self.paypal_tx.refresh_from_db()
+        self.assertIsNone(self.paypal_tx.batch_id)
+
+    def test_create_and_discover(self):
+        batch = create_payment_batch(admin_user=self.admin, provider='paystack', period=self.period)
+        self.assertEqual(batch.total_amount, Decimal('70.00'))
+        self.assertEqual(batch.transactions.count(), 5)
+        with self.assertRaises(ValueError):
+            create_payment_batch(admin_user=self.admin, provider='paystack', period=self.period)
+
+        discovered = auto_discover_batches(provider='paypal')
+        self.assertEqual(len(discovered), 1)
+        self.assertEqual(discovered[0].total_amount, Decimal('99.00'))
+        self.assertEqual(auto_discover_batches(provider='paypal'), [])
+        self.assertEqual(PaymentBatch.objects.filter(provider='paypal').count(), 1)
+
+
+class PaystackBulkPayoutTest(WalletFixturesBase):
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.batch = PaymentBatch.objects.create(provider='paystack', user=admin)
+        self.txs = []
+        for i in range(5):
+            user = User.objects.create_user(username=f'payee{i}', password='x')
+            Profile.objects.filter(user=user).update(
+                phone=f'07{i:08d}', paystack_recipient=f'RCP_{i}' if i else None)
+            self.txs.append(WalletTransaction.objects.create(
+                user=user, job=self.make_job(f'Payout job {i}'),
+                transaction_type='payment_received', payment_type='paystack',
+                amount=Decimal('10.00'), batch=self.batch))
+
+    def fake_post(self, url, json=None, headers=None, timeout=None):
+        response = MagicMock()
+        if url.endswith('/transferrecipient'):
+            response.status_code = 201
+            response.json.return_value = {'status': True, 'data': {'recipient_code': 'RCP_NEW'}}
+        elif any(t['reference'].endswith(f':{self.txs[4].id}') for t in json['transfers']):
+            response.status_code = 400
+            response.json.return_value = {'status': False, 'message': 'Insufficient balance'}
+        else:
+            response.status_code = 200
+            response.json.return_value = {
+                'status': True,
+                'data': [{'reference': t['reference'], 'recipient': t['recipient']} for t in json['transfers']],
+                'meta': {'batch_code': headers['Idempotency-Key']},
+            }
+        return response
+
+    def test_chunks_in_parallel_and_logs_in_bulk(self):
+        gateway = PaystackGateway()
+        gateway.bulk_transfer_limit = 2
+        with patch.object(gateway.session, 'post', side_effect=self.fake_post) as post:
+            result = gateway.bulk_payout_batch(self.batch)
+
+        urls = [call.args[0] for call in post.call_args_list]
+        self.assertEqual(sum(url.endswith('/transferrecipient') for url in urls), 1)
+        self.assertEqual(sum(url.endswith('/transfer/bulk') for url in urls), 3)
+        self.assertEqual(Profile.objects.get(user=self.txs[0].user).paystack_recipient, 'RCP_NEW')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['queued_tx_ids'], [tx.id for tx in self.txs[:4]])
+        self.assertEqual(result['failed_tx_ids'], [self.txs[4].id])
+        self.assertEqual(len(result['raw']['data']), 4)
+        self.assertEqual(len(result['bulk_codes']), 2)
+        self.assertEqual(result['raw']['meta']['batch_codes'], result['bulk_codes'])
+
+        # Keys follow the chunk's transactions, not its position
+        ids = [tx.id for tx in self.txs]
+        keys = set(PayoutLog.objects.filter(batch=self.batch).values_list('idempotency_key', flat=True))
+        self.assertEqual(keys, {
+            gateway._idempotency_key_for_batch(self.batch, chunk)
+            for chunk in (ids[0:2], ids[2:4], ids[4:5])
+        })
+        self.assertEqual(
+            gateway._idempotency_key_for_batch(self.batch, [ids[1], ids[0]]),
+            gateway._idempotency_key_for_batch(self.batch, ids[0:2]))
+        self.assertNotEqual(
+            gateway._idempotency_key_for_batch(self.batch, ids[1:3]),
+            gateway._idempotency_key_for_batch(self.batch, ids[0:2]))
+
+
+class PaystackReconcileTest(WalletFixturesBase):
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.batch = PaymentBatch.objects.create(provider='paystack', user=admin)
+        self.txs = []
+        for i in range(6):
+            user = User.objects.create_user(username=f'payee{i}', password='x')
+            Profile.objects.filter(user=user).update(paystack_recipient=f'RCP_{i}' if i else None)
+            self.txs.append(WalletTransaction.objects.create(
+                user=user, job=self.make_job(f'Payout job {i}'),
+                transaction_type='payment_processing', payment_type='paystack',
+                amount=Decimal('10.00'), batch=self.batch, status='in_progress'))
+
+    def test_indexed_match_and_bulk_update(self):
+        response = {
+            'status': True,
+            'meta': {'batch_code': 'BCH_1'},
+            'data': [
+                {'recipient': f'RCP_{i}', 'reference': f'{self.batch.reference}:{self.txs[i].id}',
+                 'transfer_code': f'TRF_{i}'}
+                for i in range(1, 5)
+            ],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            report = reconcile_paystack_batch(self.batch, response)
+        self.assertEqual(report, {
+            'updated': 4, 'skipped': 2,
+            'errors': [f'User {self.txs[0].user_id} missing paystack_recipient', 'No transfer for recipient RCP_5'],
+        })
+        # Load, bulk update, batch save, notification recipients and marker:
+        # independent of the number of users
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+
+        self.txs[3].refresh_from_db()
+        self.assertEqual((self.txs[3].status, self.txs[3].provider_reference), ('completed', 'TRF_3'))
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.status, self.batch.provider_reference), ('partial', 'BCH_1'))
+        self.assertEqual(self.batch.provider_references, ['BCH_1'])
+
+    def test_recipient_fallback_only_without_references(self):
+        payee = self.txs[1].user
+        second, failed = [
+            WalletTransaction.objects.create(
+                user=payee, job=self.make_job(f'{status} payout'), transaction_type='payment_processing',
+                payment_type='paystack', amount=Decimal('10.00'), batch=self.batch, status=status)
+            for status in ('in_progress', 'failed')
+        ]
+        transfer = {'recipient': 'RCP_1', 'reference': f'{self.batch.reference}:{self.txs[1].id}',
+                    'transfer_code': 'TRF_1'}
+
+        report = reconcile_paystack_batch(self.batch, {'status': True, 'data': [transfer]})
+        self.assertEqual(report['updated'], 1)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'in_progress')
+
+        # Older responses without references still match on the recipient
+        del transfer['reference']
+        report = reconcile_paystack_batch(self.batch, {'status': True, 'data': [transfer]})
+        self.assertEqual(report['updated'], 2)
+        self.assertIn(f'Transaction {failed.id} already failed', report['errors'])
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.provider_reference), ('completed', 'TRF_1'))
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, 'failed')
+
+    def test_settling_notifies_once(self):
+        response = {
+            'status': True,
+            'data': [{'recipient': f'RCP_{i}', 'reference': f'{self.batch.reference}:{self.txs[i].id}',
+                      'transfer_code': f'TRF_{i}'} for i in range(1, 6)],
+        }
+        with patch('api.signals.notify_many') as notify, \
+                self.captureOnCommitCallbacks(execute=True):
+            reconcile_paystack_batch(self.batch, response)
+            reconcile_paystack_batch(self.batch, response)
+        sent = notify.call_args_list[0]
+        self.assertEqual(notify.call_count, 1)
+        self.assertEqual((sent.args[1], sent.args[2]), ('payout_completed', {'reference': self.batch.reference}))
+        self.assertEqual(sent.args[0], {tx.user_id for tx in self.txs[1:]})
+
+
+class BatchFinalizeTest(WalletFixturesBase):
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.batch = PaymentBatch.objects.create(provider='paystack', user=admin, status='processing')
+        for i, status in enumerate(['completed', 'completed', 'failed', 'in_progress']):
+            WalletTransaction.objects.create(
+                user=self.freelancer_user, job=self.make_job(f'Batch job {i}'),
+                transaction_type='payment_received', payment_type='paystack',
+                amount=Decimal('10.00'), batch=self.batch, status=status)
+
+    def test_single_aggregate_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            finalize_batch_status(self.batch)
+        wallet_reads = [q for q in ctx.captured_queries if 'FROM "wallet_wallettransaction"' in q['sql']]
+        self.assertEqual(len(wallet_reads), 1)
+        self.batch.refresh_from_db()
+        # The in-flight transfer keeps the batch open
+        self.assertEqual(self.batch.status, 'processing')
+        self.assertEqual(self.batch.total_amount, Decimal('40.00'))
+
+        WalletTransaction.objects.filter(status='in_progress').update(status='completed')
+        with patch('django_q.tasks.async_task'), self.captureOnCommitCallbacks(execute=True):
+            finalize_batch_status(self.batch)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'partial')
+
+    def test_notifies_only_when_the_batch_settles(self):
+        WalletTransaction.objects.filter(status='in_progress').update(status='completed')
+        with patch('api.signals.notify_many') as notify, \
+                self.captureOnCommitCallbacks(execute=True):
+            finalize_batch_status(self.batch)
+            finalize_batch_status(self.batch)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'partial')
+        self.assertEqual([c.args[1] for c in notify.call_args_list], ['payout_completed', 'payout_failed'])
+
+    def test_late_completion_notifies_only_the_changed_payout(self):
+        paid, retried = (User.objects.create_user(username=name, password='x') for name in ('paid', 'retried'))
+        batch = PaymentBatch.objects.create(provider='paystack', user=self.client_user, status='processing')
+        WalletTransaction.objects.create(
+            user=paid, job=self.make_job('Paid job'), transaction_type='payment_received',
+            payment_type='paystack', amount=Decimal('10.00'), batch=batch, status='completed')
+        late = WalletTransaction.objects.create(
+            user=retried, job=self.make_job('Retried job'), transaction_type='payment_received',
+            payment_type='paystack', amount=Decimal('10.00'), batch=batch, status='failed')
+
+        with patch('api.signals.notify_many') as notify, \
+                self.captureOnCommitCallbacks(execute=True):
+            finalize_batch_status(batch)
+        self.assertEqual([c.args[:2] for c in notify.call_args_list],
+                         [({paid.id}, 'payout_completed'), ({retried.id}, 'payout_failed')])
+
+        late.status = 'completed'
+        late.save(update_fields=['status'])
+        with patch('api.signals.notify_many') as notify, \
+                self.captureOnCommitCallbacks(execute=True):
+            finalize_batch_status(batch)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'completed')
+        self.assertEqual([c.args[:2] for c in notify.call_args_list], [({retried.id}, 'payout_completed')])
+
+    def test_webhooks_coalesce_into_one_deferred_run(self):
+        with patch('django_q.tasks.schedule') as schedule:
+            self.assertTrue(mark_batch_dirty(self.batch.pk))
+            self.assertFalse(mark_batch_dirty(self.batch.pk))
+            self.assertFalse(mark_batch_dirty(self.batch.pk))
+        schedule.assert_called_once()
+        self.assertEqual(schedule.call_args.args,
+                         ('wallet.services.batch_finalizer.finalize_dirty_batch', str(self.batch.pk)))
+
+        finalize_dirty_batch(str(self.batch.pk))
+        with patch('django_q.tasks.schedule') as schedule:
+            self.assertTrue(mark_batch_dirty(self.batch.pk))
+
+    def test_scheduled_run_is_seen_by_every_process(self):
+        with patch('django_q.tasks.schedule'):
+            self.assertTrue(mark_batch_dirty(self.batch.pk))
+
+        # A webhook on another worker, whose local cache knows nothing
+        cache.clear()
+        with patch('django_q.tasks.schedule') as schedule:
+            self.assertFalse(mark_batch_dirty(self.batch.pk))
+        schedule.assert_not_called()
+
+        # The run in the Django-Q cluster clears it for everyone
+        finalize_dirty_batch(str(self.batch.pk))
+        with patch('django_q.tasks.schedule') as schedule:
+            self.assertTrue(mark_batch_dirty(self.batch.pk))
+        schedule.assert_called_once()
+
+        # A run that never happened stops blocking after ten delays
+        PaymentBatch.objects.filter(pk=self.batch.pk).update(
+            finalize_scheduled_at=timezone.now() - timedelta(seconds=BATCH_FINALIZE_DELAY * 11))
+        with patch('django_q.tasks.schedule') as schedule:
+            self.assertTrue(mark_batch_dirty(self.batch.pk))
+
+
+class WebhookInboxTest(WalletFixturesBase):
+    def setUp(self):
+        super().setUp()
+        self.tx = WalletTransaction.objects.create(
+            user=self.freelancer_user, job=self.make_job('Webhook job'),
+            transaction_type='payment_processing', payment_type='paystack',
+            amount=Decimal('10.00'), status='in_progress', provider_reference='TRF_1')
+
+    def paystack_post(self, event):
+        body = {'event': event, 'data': {'id': 77, 'transfer_code': 'TRF_1', 'status': 'success'}}
+        with patch('api.wallet.gateways.paystack.PaystackGateway.verify_webhook', return_value=True):
+            return self.client.post('/bulk/webhooks/paystack/', body, format='json')
+
+    def test_paystack_webhook_is_stored_once_and_processed_later(self):
+        with patch('django_q.tasks.async_task') as async_task, self.captureOnCommitCallbacks(execute=True):
+            first = self.paystack_post('transfer.success')
+            again = self.paystack_post('transfer.success')
+        self.assertEqual((first.status_code, again.status_code), (200, 200))
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        async_task.assert_called_once_with('wallet.webhook.inbox.process_reference', 'paystack', 'TRF_1')
+        self.tx.refresh_from_db()
+        self.assertEqual(self.tx.status, 'in_progress')
+
+        self.assertEqual(process_reference('paystack', 'TRF_1'), 1)
+        self.tx.refresh_from_db()
+        self.assertEqual(self.tx.status, 'completed')
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+        # Nothing left for a second worker on the same reference
+        self.assertEqual(process_reference('paystack', 'TRF_1'), 0)
+
+    def test_events_run_in_order_and_failures_replay(self):
+        for i in range(3):
+            record_event('paystack', f'evt-{i}', 'transfer.success', 'TRF_9', {'n': i})
+        seen = []
+
+        def handler(payload, headers):
+            seen.append(payload['n'])
+            if payload['n'] == 1:
+                raise ValueError('boom')
+
+        self.assertEqual(process_reference('paystack', 'TRF_9', handler=handler), 2)
+        self.assertEqual(seen, [0, 1])
+        failed = WebhookEvent.objects.get(event_id='evt-1')
+        self.assertEqual((failed.status, failed.error), ('failed', 'boom'))
+        # Later events wait behind the failed one
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt-2').status, 'pending')
+        self.assertEqual(process_reference('paystack', 'TRF_9', handler=handler), 0)
+
+        with patch('django_q.tasks.async_task') as async_task:
+            call_command('replay_webhooks', stdout=StringIO())
+        async_task.assert_called_once_with('wallet.webhook.inbox.process_reference', 'paystack', 'TRF_9')
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt-1').status, 'pending')
+
+        self.assertEqual(process_reference('paystack', 'TRF_9', handler=lambda p, h: seen.append(p['n'])), 2)
+        self.assertEqual(seen, [0, 1, 1, 2])
+
+    def test_paypal_webhook_answers_without_processing(self):
+        event = {'id': 'WH-1', 'event_type': 'PAYMENT.CAPTURE.COMPLETED', 'resource': {'invoice_id': 'INV-404'}}
+        with patch('django_q.tasks.async_task'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/paypal/webhook/', event, format='json',
+                                        HTTP_PAYPAL_TRANSMISSION_ID='T-1', HTTP_PAYPAL_TRANSMISSION_SIG='sig')
+        self.assertEqual(response.status_code, 200)
+        stored = WebhookEvent.objects.get(provider='paypal')
+        self.assertEqual((stored.event_id, stored.reference), ('WH-1', 'INV-404'))
+        self.assertEqual(stored.headers, {'PAYPAL-TRANSMISSION-ID': 'T-1', 'PAYPAL-TRANSMISSION-SIG': 'sig'})
+
+        with patch('api.payments.views.PayPalGateway.verify_webhook', return_value=True) as verify:
+            process_reference('paypal', 'INV-404')
+        verify.assert_called_once_with(stored.headers, event)
+        stored.refresh_from_db()
+        self.assertEqual(stored.status, 'failed')
+        self.assertIn('No payment found', stored.error)
+
+    def test_paypal_event_without_id_dedups_on_the_body(self):
+        event = {'event_type': 'PAYMENT.CAPTURE.PENDING', 'resource': {'invoice_id': 'INV-1'}}
+        with patch('django_q.tasks.async_task'), self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post('/paypal/webhook/', event, format='json')
+            again = self.client.post('/paypal/webhook/', event, format='json')
+        self.assertEqual((first.status_code, again.status_code), (200, 200))
+        self.assertTrue(WebhookEvent.objects.get(provider='paypal').event_id.startswith('sha256:'))
+
+    def test_unverified_paypal_event_is_rejected_without_blocking(self):
+        job = self.make_job('PayPal job', status='draft')
+        payment = PaypalPayments.objects.create(
+            job=job, invoice='INV-2', amount=Decimal('50.00'), email='c@example.com', user=self.client_user)
+        forged = {'id': 'WH-F', 'event_type': 'PAYMENT.CAPTURE.COMPLETED', 'resource': {'invoice_id': 'INV-2'}}
+        pending = {'id': 'WH-P', 'event_type': 'PAYMENT.CAPTURE.PENDING', 'resource': {'invoice_id': 'INV-2'}}
+        for event in (forged, pending):
+            record_event('paypal', event['id'], event['event_type'], 'INV-2', event)
+
+        with patch('api.payments.views.PayPalGateway.verify_webhook',
+                   side_effect=lambda headers, event: event['id'] != 'WH-F'):
+            self.assertEqual(process_reference('paypal', 'INV-2'), 2)
+        rejected = WebhookEvent.objects.get(event_id='WH-F')
+        self.assertEqual((rejected.status, rejected.error),
+                         ('rejected', 'PayPal webhook signature verification failed'))
+        self.assertEqual(WebhookEvent.objects.get(event_id='WH-P').status, 'processed')
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.verified), ('pending', False))
+
+
+class PaypalCaptureTest(WalletFixturesBase):
+    capture_url = 'https://api-m.sandbox.paypal.com/v2/checkout/orders/ORD-1/capture'
+
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job('PayPal job', status='draft')
+        self.payment = PaypalPayments.objects.create(
+            job=self.job, invoice='INV-1', amount=Decimal('50.00'), email='c@example.com',
+            user=self.client_user, extra_data={'id': 'ORD-1'})
+        verify = patch('api.payments.views.PayPalGateway.verify_webhook', return_value=True)
+        verify.start()
+        self.addCleanup(verify.stop)
+
+    def response(self, status_code, data):
+        response = MagicMock(status_code=status_code)
+        response.json.return_value = data
+        return response
+
+    def approve(self):
+        event = {'id': 'WH-A', 'event_type': 'CHECKOUT.ORDER.APPROVED', 'resource': {
+            'id': 'ORD-1', 'purchase_units': [{'invoice_id': 'INV-1'}],
+            'links': [{'rel': 'capture', 'href': self.capture_url}]}}
+        record_event('paypal', event['id'], event['event_type'], 'INV-1', event)
+        with patch('django_q.tasks.async_task') as async_task, self.captureOnCommitCallbacks(execute=True):
+            process_reference('paypal', 'INV-1')
+        return async_task
+
+    def capture(self, *responses, get=None):
+        with patch('api.payments.views.get_paypal_access_token', return_value='token'), \
+                patch('api.payments.views.requests.post', side_effect=responses) as post, \
+                patch('api.payments.views.requests.get', return_value=get) as get_order:
+            capture_paypal_payment(self.payment.pk, self.capture_url)
+        self.payment.refresh_from_db()
+        return post, get_order
+
+    def test_capture_is_queued_outside_the_event_transaction(self):
+        async_task = self.approve()
+        async_task.assert_called_once_with(
+            'api.payments.views.capture_paypal_payment', self.payment.pk, self.capture_url)
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+
+        post, _ = self.capture(self.response(201, {'id': 'ORD-1', 'status': 'COMPLETED'}))
+        self.assertEqual(post.call_count, 1)
+        self.assertTrue(self.payment.verified)
+        self.assertEqual(self.payment.extra_data['capture']['status'], 'COMPLETED')
+        self.job.refresh_from_db()
+        self.assertTrue(self.job.payment_verified)
+
+    def test_replay_finishes_from_the_stored_capture(self):
+        # Captured, but the worker died before the payment was updated
+        self.payment.extra_data = {**self.payment.extra_data, 'capture': {'status': 'COMPLETED'}}
+        self.payment.save()
+        post, _ = self.capture()
+        post.assert_not_called()
+        self.assertTrue(self.payment.verified)
+
+    def test_already_captured_order_counts_as_success(self):
+        already = self.response(422, {'name': 'UNPROCESSABLE_ENTITY',
+                                      'details': [{'issue': 'ORDER_ALREADY_CAPTURED'}]})
+        order = self.response(200, {'id': 'ORD-1', 'status': 'COMPLETED'})
+        _, get_order = self.capture(already, get=order)
+        get_order.assert_called_once()
+        self.assertEqual(get_order.call_args.args[0], 'https://api-m.sandbox.paypal.com/v2/checkout/orders/ORD-1')
+        self.assertTrue(self.payment.verified)
+
+    def test_failed_capture_fails_the_event_for_replay(self):
+        self.approve()
+        declined = self.response(422, {'name': 'UNPROCESSABLE_ENTITY',
+                                       'details': [{'issue': 'INSTRUMENT_DECLINED'}]})
+        with self.assertRaises(ValueError):
+            self.capture(declined)
+        self.assertFalse(self.payment.verified)
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, 'failed')
+        self.assertIn('INSTRUMENT_DECLINED', event.error)
+
+        # A body that is not JSON fails the same way
+        garbled = self.response(502, None)
+        garbled.json.side_effect = ValueError('Expecting value')
+        with self.assertRaises(ValueError):
+            self.capture(garbled)
+        event.refresh_from_db()
+        self.assertEqual(event.error, 'Capture request failed: Expecting value')
+
+        # Replaying the event queues the capture again
+        with patch('django_q.tasks.async_task') as async_task, self.captureOnCommitCallbacks(execute=True):
+            call_command('replay_webhooks', stdout=StringIO())
+            process_reference('paypal', 'INV-1')
+        self.assertEqual(async_task.call_args.args[0], 'api.payments.views.capture_paypal_payment')
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
 
-# Create your tests here.
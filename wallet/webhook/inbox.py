@@ -0,0 +1,123 @@
+import hashlib
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from wallet.models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+# provider -> handler(payload, headers); raising marks the event failed
+HANDLERS = {
+    "paystack": "wallet.webhook.paystack.process_event",
+    "paypal": "api.payments.views.process_paypal_event",
+}
+
+
+def body_event_id(body: bytes) -> str:
+    """Dedup id for providers whose payload carries none: redeliveries repeat the body."""
+    return "sha256:" + hashlib.sha256(body).hexdigest()
+
+
+class RejectedEvent(Exception):
+    """
+    Raised by a handler for an event that must never be applied, such as
+    one failing its signature check. The event is kept as rejected and
+    does not hold up the events after it.
+    """
+
+
+def record_event(provider: str, event_id: str, event_type: str, reference: str, payload: dict,
+                 headers: dict = None):
+    """
+    Stores a webhook with the ``headers`` its handler needs and queues its
+    reference for processing once the insert commits. Returns the event,
+    or None for a redelivery.
+    """
+    try:
+        with transaction.atomic():
+            event = WebhookEvent.objects.create(
+                provider=provider,
+                event_id=event_id,
+                event_type=event_type or "",
+                reference=reference or "",
+                payload=payload,
+                headers=headers or {},
+            )
+    except IntegrityError:
+        logger.info("Duplicate %s webhook event_id=%s", provider, event_id)
+        return None
+
+    transaction.on_commit(lambda: enqueue(provider, event.reference))
+    return event
+
+
+def enqueue(provider: str, reference: str) -> None:
+    from django_q.tasks import async_task
+    async_task("wallet.webhook.inbox.process_reference", provider, reference)
+
+
+def process_reference(provider: str, reference: str, handler=None) -> int:
+    """
+    Processes the pending events of one reference, oldest first, each in
+    its own transaction holding the event row lock. Workers given the same
+    reference wait on that lock, find the event done and move on, so the
+    order holds with any number of workers. A failed event blocks the
+    events after it until it is replayed. Returns the number processed.
+    """
+    handler = handler or import_string(HANDLERS[provider])
+    done = 0
+    while True:
+        with transaction.atomic():
+            event = (
+                WebhookEvent.objects.select_for_update()
+                .filter(provider=provider, reference=reference, status__in=["pending", "failed"])
+                .order_by("id")
+                .first()
+            )
+            if event is None:
+                return done
+            if event.status == "failed":
+                logger.warning(
+                    "Webhook events for %s %s wait on failed event %s",
+                    provider, reference, event.pk)
+                return done
+
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    handler(event.payload, event.headers)
+            except RejectedEvent as exc:
+                logger.warning("Webhook event %s rejected: %s", event.pk, exc)
+                event.status = "rejected"
+                event.error = str(exc)
+            except Exception as exc:
+                logger.exception("Webhook event %s failed", event.pk)
+                event.status = "failed"
+                event.error = str(exc)
+            else:
+                event.status = "processed"
+                event.error = None
+            event.processed_at = timezone.now()
+            event.save(update_fields=["status", "attempts", "error", "processed_at"])
+        done += 1
+
+
+def replay(events, sync=False) -> int:
+    """
+    Puts ``events`` (a WebhookEvent queryset) back to pending and processes
+    their references again, queued or inline with ``sync``.
+    Returns the number of references replayed.
+    """
+    with transaction.atomic():
+        references = set(events.values_list("provider", "reference"))
+        events.update(status="pending", error=None)
+
+    for provider, reference in sorted(references):
+        if sync:
+            process_reference(provider, reference)
+        else:
+            enqueue(provider, reference)
+    return len(references)
@@ -8,20 +8,18 @@ from django.db import transaction
 
 from api.wallet.gateways import get_payout_gateway
 from wallet.models import WalletTransaction, PaymentBatch, PayoutLog
-from wallet.services.batch_finalizer import finalize_batch_status
+from wallet.services.batch_finalizer import mark_batch_dirty
+from wallet.webhook.inbox import body_event_id, record_event
 
 logger = logging.getLogger(__name__)
 
 
-logger.info("Webhook hit at %s", timezone.now())
-
-
 @csrf_exempt
 def paystack_webhook(request):
-    logger.info("=== PAYSTACK WEBHOOK HIT === Time: %s", timezone.now())
-    logger.info("Headers: %s", dict(request.headers))
-    logger.info("Raw body: %s", request.body.decode('utf-8', errors='replace'))
-    
+    """
+    Verifies the signature, stores the event in the webhook inbox and
+    returns 200 at once; wallet.webhook.inbox processes it on a worker.
+    """
     gateway = get_payout_gateway("paystack")
 
     # Verify signature first
@@ -36,20 +34,32 @@ def paystack_webhook(request):
         return HttpResponseBadRequest("Invalid JSON")
 
     event = payload.get("event")
-    data = payload.get("data", {})
+    data = payload.get("data") or {}
 
     logger.info("Paystack webhook received | event=%s | reference=%s",
                 event, data.get("reference"))
 
-    if event in ("transfer.success", "transfer.failed", "transfer.reversed"):
-        _handle_transfer_event(event, data)
+    # Paystack sends no event id; the transfer id and event name identify a delivery
+    event_id = (
+        f"{event}:{data['id']}" if data.get("id") is not None
+        else body_event_id(request.body)
+    )
+    record_event(
+        "paystack", event_id, event,
+        data.get("transfer_code") or data.get("reference"), payload)
 
     return JsonResponse({"status": "ok"})
 
 
+def process_event(payload: dict, headers: dict) -> None:
+    """Inbox handler for stored Paystack events, verified on receipt."""
+    event = payload.get("event")
+    if event in ("transfer.success", "transfer.failed", "transfer.reversed"):
+        _handle_transfer_event(event, payload.get("data") or {})
+
+
 def _handle_transfer_event(event: str, data: dict):
     transfer_code = data.get("transfer_code")
-    print(data)
     if not transfer_code:
         logger.warning("Webhook missing transfer_code")
         return
@@ -103,5 +113,7 @@ def _handle_transfer_event(event: str, data: dict):
             idempotency_key=transfer_code,
         )
 
-        if tx.batch:
-            finalize_batch_status(tx.batch)
+        if tx.batch_id:
+            # Finalized by one deferred run per burst, not per transfer
+            batch_id = tx.batch_id
+            transaction.on_commit(lambda: mark_batch_dirty(batch_id))